@@ -3,6 +3,8 @@ from django.utils.html import format_html, mark_safe
 from django.contrib import admin
 from django.utils.html import format_html
 from .models import Booking, SeatReservation, BookingHistory
+from .seat_status import record_seat_status, record_reservations_status
+from .read_model import write_booking_snapshots_on_commit
 from django.contrib import admin
 from django.utils.safestring import mark_safe
 import json
@@ -32,7 +34,8 @@ class BookingAdmin(admin.ModelAdmin):
         'created_at',
         'updated_at',
         'expires_at',
-        'paid_at'
+        'paid_at',
+        'snapshot'
     ]
     inlines = [SeatReservationInline]
     date_hierarchy = 'created_at'
@@ -57,6 +60,7 @@ class BookingAdmin(admin.ModelAdmin):
 
     def mark_as_paid(self, request, queryset):
         queryset.update(status='paid')
+        write_booking_snapshots_on_commit(queryset.values_list('id', flat=True))
         self.message_user(request, f"{queryset.count()} đơn đã được đánh dấu là đã thanh toán.")
     mark_as_paid.short_description = "Đánh dấu đã thanh toán"
 
@@ -64,7 +68,10 @@ class BookingAdmin(admin.ModelAdmin):
         queryset.update(status='cancelled')
         # Release seats
         for booking in queryset:
+            seat_ids = list(booking.seat_reservations.values_list('seat_id', flat=True))
             booking.seat_reservations.update(status='available')
+            record_seat_status(booking.performance_id, seat_ids, 'available')
+        write_booking_snapshots_on_commit(queryset.values_list('id', flat=True))
         self.message_user(request, f"{queryset.count()} đơn đã được hủy.")
     mark_as_cancelled.short_description = "Hủy đơn đặt vé"
 
@@ -79,8 +86,14 @@ class SeatReservationAdmin(admin.ModelAdmin):
 
     actions = ['release_seats']
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        record_seat_status(obj.performance_id, [obj.seat_id], obj.status)
+
     def release_seats(self, request, queryset):
+        released = list(queryset.values_list('performance_id', 'seat_id'))
         queryset.update(status='available', session_id='', expires_at=None)
+        record_reservations_status(released, 'available')
         self.message_user(request, f"{queryset.count()} ghế đã được giải phóng.")
     release_seats.short_description = "Giải phóng ghế"
 
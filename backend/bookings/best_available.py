@@ -0,0 +1,259 @@
+"""
+Best-available seat allocation.
+
+Rows are cut into adjacency segments: seats in physical order (`position_x`,
+or `position_y` for `vertical` rows) that sit next to each other, i.e. no
+`spacing_after`, no hidden seat of `Row.gaps` between their numbers, no
+center aisle between the odd and even side of a `center_out` row, no jump
+in position and the same price category. Segments only depend on the
+layout, so they are memoized on the geometry like the columnar tables.
+
+Per performance, each segment keeps the runs of free seats it contains. The
+index lives in process memory and follows the status change log
+(`seat_status.get_seat_status_changes`): only the segments of changed seats
+are recomputed, a resync (or an index older than `INDEX_MAX_AGE`) rebuilds
+it from the status bitmap. A search walks
+the segments front to back and only looks at runs long enough for the
+request, never at single seats.
+"""
+import statistics
+import time
+
+from .seat_status import STATUS_CODES, get_seat_status_changes, get_seat_status_snapshot
+
+AVAILABLE = STATUS_CODES['available']
+TAKEN = STATUS_CODES['reserved']
+
+DEFAULT_SEAT_PITCH = 22
+# A step this many pitches wide between two seats is an aisle
+AISLE_PITCHES = 1.5
+# Score weights, in position units: distance to the row center counts half
+# as much as distance to the stage, a single seat left over next to a block
+# costs as much as one row further back
+CENTER_WEIGHT = 0.5
+ORPHAN_PENALTY = 30
+
+# Rebuild the index from the bitmap this often, so seats marked taken
+# locally by `mark_taken` cannot stay hidden when the claim failed elsewhere
+INDEX_MAX_AGE = 60
+
+# performance_id -> free run index, see `get_free_run_index`
+_free_run_indexes = {}
+
+
+def _seat_number(seat):
+    try:
+        return int(seat['number'])
+    except (TypeError, ValueError):
+        return None
+
+
+def _are_adjacent(previous, seat, info, axis, pitch):
+    if previous['spacing_after'] or previous['price_category'] != seat['price_category']:
+        return False
+    if seat[axis] - previous[axis] > pitch * AISLE_PITCHES:
+        return False
+
+    first, second = _seat_number(previous), _seat_number(seat)
+    if first is None or second is None:
+        return True
+    low, high = sorted((first, second))
+
+    if info.get('numbering_style') == 'center_out':
+        if low % 2 != high % 2:
+            # Seat 1 and 2 face each other across the middle of the row
+            return not info.get('has_center_aisle', True)
+        between = range(low + 2, high, 2)
+    else:
+        between = range(low + 1, high)
+
+    gaps = info['gap_numbers']
+    return not any(number in gaps for number in between)
+
+
+def build_segments(geometry):
+    seats = geometry['seats']
+    rows = {}
+    for ordinal, seat in enumerate(seats):
+        rows.setdefault((seat['section_id'], seat['row']), []).append(ordinal)
+
+    segments = []
+    for (section_id, row_label), ordinals in rows.items():
+        info = dict(geometry['numbering_info'].get(f'{section_id}-{row_label}', {}))
+        info['gap_numbers'] = {int(gap) for gap in info.get('gaps') or [] if str(gap).isdigit()}
+        axis = 'position_y' if info.get('numbering_style') == 'vertical' else 'position_x'
+        ordinals.sort(key=lambda ordinal: seats[ordinal][axis])
+
+        steps = [
+            seats[current][axis] - seats[previous][axis]
+            for previous, current in zip(ordinals, ordinals[1:])
+            if seats[current][axis] > seats[previous][axis]
+        ]
+        pitch = statistics.median(steps) if steps else DEFAULT_SEAT_PITCH
+
+        current = [ordinals[0]]
+        for previous, ordinal in zip(ordinals, ordinals[1:]):
+            if _are_adjacent(seats[previous], seats[ordinal], info, axis, pitch):
+                current.append(ordinal)
+            else:
+                segments.append(current)
+                current = [ordinal]
+        segments.append(current)
+
+    def describe(ordinals):
+        first = seats[ordinals[0]]
+        info = geometry['numbering_info'].get(f"{first['section_id']}-{first['row']}", {})
+        return {
+            'ordinals': ordinals,
+            'category': first['price_category'],
+            'depth': min(seats[ordinal]['position_y'] for ordinal in ordinals),
+            'center_x': info.get('center_x', geometry['venue']['width'] // 2),
+            'offsets': [seats[ordinal]['position_x'] for ordinal in ordinals],
+        }
+
+    described = sorted((describe(ordinals) for ordinals in segments), key=lambda segment: segment['depth'])
+    front = described[0]['depth'] if described else 0
+    for segment in described:
+        segment['depth'] -= front
+
+    return {
+        'segments': described,
+        # ordinal -> index of its segment
+        'seat_segments': {
+            ordinal: index
+            for index, segment in enumerate(described)
+            for ordinal in segment['ordinals']
+        },
+    }
+
+
+def get_segments(geometry):
+    """Adjacency segments of a geometry, memoized on it"""
+    segments = geometry.get('segments')
+    if segments is None:
+        segments = build_segments(geometry)
+        geometry['segments'] = segments
+    return segments
+
+
+def _free_runs(segment, codes):
+    """(start, length) of the free stretches of a segment"""
+    runs = []
+    start = None
+    for position, ordinal in enumerate(segment['ordinals']):
+        if codes[ordinal] == AVAILABLE:
+            if start is None:
+                start = position
+        elif start is not None:
+            runs.append((start, position - start))
+            start = None
+    if start is not None:
+        runs.append((start, len(segment['ordinals']) - start))
+    return runs
+
+
+def _build_index(performance_id, geometry):
+    codes, version = get_seat_status_snapshot(performance_id, geometry)
+    segments = get_segments(geometry)['segments']
+    runs = [_free_runs(segment, codes) for segment in segments]
+    return {
+        'layout_version': geometry['layout_version'],
+        'status_version': version,
+        'built_at': time.monotonic(),
+        'codes': codes,
+        'runs': runs,
+        'longest': [max((length for _, length in segment_runs), default=0) for segment_runs in runs],
+    }
+
+
+def _update_index(index, geometry, seat_codes):
+    """Apply seat_id -> status code changes, recomputing the touched segments"""
+    layout = get_segments(geometry)
+    ordinals = geometry['seat_ordinals']
+    touched = set()
+    for seat_id, code in seat_codes.items():
+        ordinal = ordinals.get(seat_id)
+        if ordinal is None:
+            continue
+        index['codes'][ordinal] = code
+        touched.add(layout['seat_segments'][ordinal])
+
+    for segment_index in touched:
+        runs = _free_runs(layout['segments'][segment_index], index['codes'])
+        index['runs'][segment_index] = runs
+        index['longest'][segment_index] = max((length for _, length in runs), default=0)
+
+
+def get_free_run_index(performance_id, geometry):
+    """Free runs of a performance, brought up to date with the status change log"""
+    index = _free_run_indexes.get(performance_id)
+    if (
+        index is not None and
+        index['layout_version'] == geometry['layout_version'] and
+        time.monotonic() - index['built_at'] < INDEX_MAX_AGE
+    ):
+        changes = get_seat_status_changes(performance_id, index['status_version'])
+        if not changes['resync']:
+            _update_index(index, geometry, {
+                change['id']: STATUS_CODES[change['status']] for change in changes['changes']
+            })
+            index['status_version'] = changes['version']
+            return index
+
+    index = _build_index(performance_id, geometry)
+    _free_run_indexes[performance_id] = index
+    return index
+
+
+def mark_taken(performance_id, geometry, seat_ids):
+    """Take seats out of the local index before the change log reports them"""
+    index = _free_run_indexes.get(performance_id)
+    if index is not None and index['layout_version'] == geometry['layout_version']:
+        _update_index(index, geometry, {seat_id: TAKEN for seat_id in seat_ids})
+
+
+def _best_window(segment, start, length, count):
+    """Best placement of `count` seats inside a free run: (score, position)"""
+    offsets = segment['offsets']
+    best = None
+    for position in range(start, start + length - count + 1):
+        middle = (offsets[position] + offsets[position + count - 1]) / 2
+        orphans = (position - start == 1) + (start + length - position - count == 1)
+        score = (
+            segment['depth'] +
+            CENTER_WEIGHT * abs(middle - segment['center_x']) +
+            ORPHAN_PENALTY * orphans
+        )
+        if best is None or score < best[0]:
+            best = (score, position)
+    return best
+
+
+def find_best_blocks(performance_id, geometry, count, category=None, limit=3):
+    """
+    Up to `limit` blocks of `count` adjacent free seats, best first, as
+    lists of seat IDs. `category` restricts them to a price category code.
+    """
+    segments = get_segments(geometry)['segments']
+    index = get_free_run_index(performance_id, geometry)
+    seats = geometry['seats']
+
+    candidates = []
+    for segment_index, segment in enumerate(segments):
+        # Segments are sorted front to back and a score is never below the depth
+        if len(candidates) >= limit and segment['depth'] > candidates[limit - 1][0]:
+            break
+        if index['longest'][segment_index] < count:
+            continue
+        if category and segment['category'] != category:
+            continue
+
+        for start, length in index['runs'][segment_index]:
+            if length < count:
+                continue
+            score, position = _best_window(segment, start, length, count)
+            ordinals = segment['ordinals'][position:position + count]
+            candidates.append((score, [seats[ordinal]['id'] for ordinal in ordinals]))
+        candidates.sort(key=lambda candidate: candidate[0])
+
+    return [seat_ids for _, seat_ids in candidates[:limit]]
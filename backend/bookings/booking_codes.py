@@ -0,0 +1,145 @@
+"""
+Booking codes without uniqueness probes.
+
+A code is `BK` + 6 payload characters + 1 check character over A-Z0-9. The
+payload encodes a sequence number through a keyed permutation (a 4 round
+Feistel network on 32 bits, cycle-walked into the 36^6 payload range), so
+consecutive bookings get unrelated codes and distinct numbers always give
+distinct codes.
+
+On PostgreSQL the numbers come from the `bookings_booking_code_seq`
+sequence, which steps by `CODE_BLOCK_SIZE`: every process takes a block of
+numbers with one `nextval` and hands them out from memory, so gunicorn and
+Celery workers never share a number. Other databases (SQLite in dev mode)
+keep the random code with an existence check.
+
+Random codes, including every code from before the allocator, are `BK` + 6
+characters: one character shorter than an allocated code, so the two can
+never collide on the unique index of `Booking.booking_code`.
+"""
+import hashlib
+import hmac
+import os
+import random
+import string
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+ALPHABET = string.ascii_uppercase + string.digits
+PREFIX = 'BK'
+PAYLOAD_LENGTH = 6
+CODE_SPACE = len(ALPHABET) ** PAYLOAD_LENGTH
+# Characters after the prefix of a random code, see `_random_booking_code`
+RANDOM_CODE_LENGTH = 6
+
+HALF_BITS = 16
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+
+SEQUENCE_NAME = 'bookings_booking_code_seq'
+# Must match the INCREMENT of the sequence, see migration 0008
+CODE_BLOCK_SIZE = 100
+
+
+class BookingCodeSpaceExhausted(Exception):
+    """The sequence went past the numbers the payload can encode"""
+
+
+def _permutation_key():
+    secret = getattr(settings, 'BOOKING_CODE_SECRET', '') or settings.SECRET_KEY
+    return hashlib.sha256(f'booking-code:{secret}'.encode()).digest()
+
+
+def _round(key, round_number, half):
+    digest = hmac.new(key, f'{round_number}:{half}'.encode(), hashlib.sha256).digest()
+    return int.from_bytes(digest[:4], 'big') & HALF_MASK
+
+
+def _feistel(value, key):
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for round_number in range(ROUNDS):
+        left, right = right, left ^ _round(key, round_number, right)
+    return (left << HALF_BITS) | right
+
+
+def permute(number, key=None):
+    """Bijection of [0, CODE_SPACE), cycle-walking the 32 bit Feistel network"""
+    key = key or _permutation_key()
+    value = _feistel(number, key)
+    while value >= CODE_SPACE:
+        value = _feistel(value, key)
+    return value
+
+
+def check_character(payload):
+    """Weighted sum mod 36, catches a mistyped character or a swap of neighbours"""
+    total = sum((position + 1) * ALPHABET.index(char) for position, char in enumerate(payload))
+    return ALPHABET[total % len(ALPHABET)]
+
+
+def encode_booking_code(number):
+    if not 0 <= number < CODE_SPACE:
+        raise BookingCodeSpaceExhausted(f'Booking code number {number} out of range')
+
+    value = permute(number)
+    payload = ''
+    for _ in range(PAYLOAD_LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        payload = ALPHABET[digit] + payload
+    return PREFIX + payload + check_character(payload)
+
+
+def is_valid_booking_code(code):
+    """Whether `code` has the shape and check character of an allocated code"""
+    code = (code or '').upper()
+    if len(code) != len(PREFIX) + PAYLOAD_LENGTH + 1 or not code.startswith(PREFIX):
+        return False
+    payload = code[len(PREFIX):-1]
+    return all(char in ALPHABET for char in payload) and check_character(payload) == code[-1]
+
+
+class BlockAllocator:
+    """Numbers from a block of the PostgreSQL sequence, per process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.next_number = 0
+        self.block_end = 0
+
+    def _reserve_block(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [SEQUENCE_NAME])
+            start = cursor.fetchone()[0]
+        self.next_number = start
+        self.block_end = start + CODE_BLOCK_SIZE
+
+    def allocate(self):
+        with self.lock:
+            # A block taken before a fork must not be shared with the children
+            if self.pid != os.getpid() or self.next_number >= self.block_end:
+                self._reserve_block()
+                self.pid = os.getpid()
+            number = self.next_number
+            self.next_number += 1
+            return number
+
+
+_allocator = BlockAllocator()
+
+
+def _random_booking_code():
+    from .models import Booking
+
+    while True:
+        code = PREFIX + ''.join(random.choice(ALPHABET) for _ in range(RANDOM_CODE_LENGTH))
+        if not Booking.objects.filter(booking_code=code).exists():
+            return code
+
+
+def allocate_booking_code():
+    if connection.vendor != 'postgresql':
+        return _random_booking_code()
+    return encode_booking_code(_allocator.allocate())
@@ -0,0 +1,139 @@
+"""
+Asynchronous booking submission.
+
+With `BOOKING_ASYNC_SUBMISSION` enabled, `BookingViewSet.create` only runs
+the serializer validation, then `submit_booking` stores a ticket in Redis
+and enqueues `tasks.process_booking_ticket` on the queue of the performance
+(`bookings-{performance_id % BOOKING_QUEUE_PARTITIONS}`). The API answers
+202 with the ticket; the client polls `bookings/tickets/<ticket>/` until the
+ticket is `done` (with the booking) or `failed` (with the error message).
+
+Every partition queue is consumed by one worker process with concurrency 1
+(see docker-compose-prod.yml), so the bookings of a performance are created
+one after the other: no row lock contention between them, and no gunicorn
+worker waiting on a transaction. A partition worker that is down only
+delays its performances: a ticket not picked up within
+`SUBMISSION_TIMEOUT` is failed instead of booked late. The task and the
+polling endpoint both move the ticket out of `queued` with a
+compare-and-set (`start_ticket` / `expire_ticket`), so a late booking and a
+timeout answer can never both happen.
+
+When the ticket cannot be stored or the task cannot be enqueued (Redis
+unavailable), `submit_booking` returns None and the booking is created
+synchronously as before.
+"""
+import json
+import secrets
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from kombu.exceptions import OperationalError
+from logzero import logger
+from redis.exceptions import RedisError
+
+TICKET_TIMEOUT = 60 * 15
+# Below the 60s the frontend polls for (TICKET_POLL_TIMEOUT in api/booking.js),
+# a client that gave up never gets a booking created behind its back
+SUBMISSION_TIMEOUT = 50
+SUBMISSION_EXPIRED_ERRORS = {
+    'error': 'Hệ thống đang quá tải, yêu cầu đặt vé chưa được xử lý. Vui lòng thử lại.'
+}
+
+# KEYS[1] ticket. ARGV: expected state, new state JSON, ttl. Replaces the
+# ticket only while it is in the expected state
+TRANSITION_TICKET_SCRIPT = """
+local raw = redis.call('GET', KEYS[1])
+if not raw or cjson.decode(raw)['state'] ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+# Request headers kept for `BookingHistory.log_action`
+REQUEST_META_KEYS = ('HTTP_X_FORWARDED_FOR', 'REMOTE_ADDR', 'HTTP_USER_AGENT')
+
+
+def get_redis():
+    return get_redis_connection('default')
+
+
+def async_submission_enabled():
+    return getattr(settings, 'BOOKING_ASYNC_SUBMISSION', False)
+
+
+def booking_queue_name(performance_id):
+    return f'bookings-{performance_id % settings.BOOKING_QUEUE_PARTITIONS}'
+
+
+def ticket_key(ticket):
+    return f'booking:ticket:{ticket}'
+
+
+def set_ticket(ticket, **state):
+    get_redis().set(ticket_key(ticket), json.dumps(state), ex=TICKET_TIMEOUT)
+
+
+def get_ticket(ticket):
+    """State of `ticket`, None when unknown or expired"""
+    raw = get_redis().get(ticket_key(ticket))
+    return json.loads(raw) if raw else None
+
+
+def _transition_ticket(ticket, expected, state):
+    return bool(get_redis().register_script(TRANSITION_TICKET_SCRIPT)(
+        keys=[ticket_key(ticket)],
+        args=[expected, json.dumps(state), TICKET_TIMEOUT]
+    ))
+
+
+def is_ticket_late(state):
+    return time.time() - state['submitted_at'] > SUBMISSION_TIMEOUT
+
+
+def start_ticket(ticket, state):
+    """
+    Move a queued ticket to `processing`, False when it is late (it is
+    failed then) or was already failed by `expire_ticket`
+    """
+    if is_ticket_late(state):
+        expire_ticket(ticket, state)
+        return False
+    return _transition_ticket(ticket, 'queued', {**state, 'state': 'processing'})
+
+
+def expire_ticket(ticket, state):
+    """Fail a ticket still queued, returns whether it was"""
+    return _transition_ticket(ticket, 'queued', {**state, 'state': 'failed', 'errors': SUBMISSION_EXPIRED_ERRORS})
+
+
+def submit_booking(validated_data, request=None):
+    """
+    Enqueue the creation of a booking from `BookingCreateSerializer`
+    data, returns the ticket or None when it could not be queued
+    """
+    from .tasks import process_booking_ticket
+
+    ticket = secrets.token_urlsafe(16)
+    performance_id = validated_data['performance_id']
+    request_meta = {key: request.META[key] for key in REQUEST_META_KEYS if request and key in request.META}
+
+    state = {
+        'performance_id': performance_id,
+        'session_id': validated_data['session_id'],
+        'submitted_at': time.time(),
+    }
+
+    try:
+        set_ticket(ticket, state='queued', **state)
+        process_booking_ticket.apply_async(
+            args=[ticket, validated_data, request_meta, state],
+            queue=booking_queue_name(performance_id),
+            # Dropped by the worker when it comes too late, `start_ticket` checks again
+            expires=SUBMISSION_TIMEOUT
+        )
+    except (RedisError, OperationalError) as e:
+        logger.warning(f"Cannot queue booking of performance {performance_id}, creating it directly: {e}")
+        return None
+    return ticket
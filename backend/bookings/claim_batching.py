@@ -0,0 +1,209 @@
+"""
+Group commit of seat claims.
+
+With `SEAT_CLAIM_BATCHING` enabled, `reserve_seats` does not claim its seats
+itself: `submit_claim` appends the claim to a Redis stream and waits for the
+reply of the claim coordinator (`run_claim_coordinator` management command).
+The coordinator reads the claims that arrive within
+`SEAT_CLAIM_BATCH_WINDOW_MS`, settles conflicts between them in memory
+(first come, first served), writes the winners of each performance in one
+transaction and replies to every caller on its own list key. Many claims per
+commit and no two transactions fighting over the same rows, for a few ms of
+latency.
+
+The coordinator is an optimization, never a dependency: a caller that gets
+no reply within `SEAT_CLAIM_BATCH_TIMEOUT` seconds claims its seats directly.
+The coordinator skips claims past that deadline, and a claim it still wrote
+belongs to the same session, which `claim_and_persist` accepts again.
+The rows are committed by the coordinator before it replies, like
+`claim_and_persist` commits them before `hold_seats` opens its own
+transaction: the caller never keeps a transaction open while it waits, and
+a caller failing after the reply leaves the hold to expire.
+"""
+import json
+import secrets
+import time
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+from logzero import logger
+from redis.exceptions import RedisError, ResponseError
+
+from .claims import claim_and_persist, release_claims
+
+STREAM_KEY = 'booking:claim_requests'
+STREAM_MAXLEN = 10000
+CONSUMER_GROUP = 'claim-coordinator'
+REPLY_TIMEOUT = 60
+
+
+def get_redis():
+    return get_redis_connection('default')
+
+
+def reply_key(request_id):
+    return f'booking:claim_reply:{request_id}'
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def batching_enabled():
+    return getattr(settings, 'SEAT_CLAIM_BATCHING', False)
+
+
+def submit_claim(performance_id, session_id, seat_prices, expires_at, client_ip=None):
+    """
+    Same contract as `claim_and_persist`, through the coordinator. Returns
+    the seats that could not be taken (empty on success).
+    """
+    timeout = getattr(settings, 'SEAT_CLAIM_BATCH_TIMEOUT', 2)
+    request_id = secrets.token_hex(8)
+    payload = {
+        'id': request_id,
+        'performance_id': performance_id,
+        'session_id': session_id,
+        'seats': [[seat_id, str(price)] for seat_id, price in seat_prices.items()],
+        'expires_at': int(expires_at.timestamp() * 1000),
+        'client_ip': client_ip,
+        'deadline': _now_ms() + timeout * 1000,
+    }
+
+    reply = None
+    try:
+        redis = get_redis()
+        redis.xadd(STREAM_KEY, {'payload': json.dumps(payload)}, maxlen=STREAM_MAXLEN, approximate=True)
+        reply = redis.blpop(reply_key(request_id), timeout=timeout)
+    except RedisError as e:
+        logger.warning(f"Cannot submit seat claim for performance {performance_id}: {e}")
+
+    if reply is None:
+        logger.warning(f"No reply from the claim coordinator for {session_id}, claiming directly")
+        return claim_and_persist(performance_id, session_id, seat_prices, expires_at, client_ip)
+    return json.loads(reply[1])['conflicts']
+
+
+def _claim_arguments(claim):
+    return (
+        claim['performance_id'],
+        claim['session_id'],
+        {seat_id: Decimal(price) for seat_id, price in claim['seats']},
+        datetime.fromtimestamp(claim['expires_at'] / 1000, tz=dt_timezone.utc),
+        claim['client_ip'],
+    )
+
+
+def resolve_batch(claims):
+    """
+    First come, first served between the claims of one batch: a claim loses
+    when an earlier claim of another session took one of its seats.
+    Returns (winning claims, {request_id: conflicting seats} of the losers).
+    """
+    holders = {}
+    winners = []
+    losers = {}
+    for claim in claims:
+        seat_ids = [seat_id for seat_id, _ in claim['seats']]
+        conflicts = [
+            seat_id for seat_id in seat_ids
+            if holders.get(seat_id, claim['session_id']) != claim['session_id']
+        ]
+        if conflicts:
+            losers[claim['id']] = conflicts
+            continue
+        for seat_id in seat_ids:
+            holders[seat_id] = claim['session_id']
+        winners.append(claim)
+    return winners, losers
+
+
+def apply_batch(claims):
+    """Write the claims of one performance in one transaction, {request_id: conflicts}"""
+    results = {}
+    try:
+        with transaction.atomic():
+            for claim in claims:
+                # Each claim gets its own savepoint inside `claim_and_persist`
+                results[claim['id']] = claim_and_persist(*_claim_arguments(claim))
+        return results
+    except Exception as e:
+        logger.error(f"Claim batch failed, retrying {len(claims)} claims one by one: {e}")
+
+    for claim in claims:
+        performance_id, session_id, seat_prices, expires_at, client_ip = _claim_arguments(claim)
+        release_claims(performance_id, seat_prices, session_id)
+        try:
+            results[claim['id']] = claim_and_persist(performance_id, session_id, seat_prices, expires_at, client_ip)
+        except Exception as e:
+            logger.error(f"Claim {claim['id']} of {session_id} failed: {e}")
+            release_claims(performance_id, seat_prices, session_id)
+            results[claim['id']] = list(seat_prices)
+    return results
+
+
+def process_batch(claims):
+    """Settle, write and answer a batch of claims, returns {request_id: conflicts}"""
+    by_performance = {}
+    now = _now_ms()
+    for claim in claims:
+        if claim['deadline'] <= now:
+            # The caller has given up and claims directly
+            continue
+        by_performance.setdefault(claim['performance_id'], []).append(claim)
+
+    results = {}
+    for performance_id, performance_claims in by_performance.items():
+        winners, losers = resolve_batch(performance_claims)
+        results.update(losers)
+        results.update(apply_batch(winners))
+
+    if results:
+        pipe = get_redis().pipeline()
+        for request_id, conflicts in results.items():
+            pipe.rpush(reply_key(request_id), json.dumps({'conflicts': conflicts}))
+            pipe.expire(reply_key(request_id), REPLY_TIMEOUT)
+        pipe.execute()
+    return results
+
+
+def ensure_consumer_group(redis):
+    try:
+        redis.xgroup_create(STREAM_KEY, CONSUMER_GROUP, id='$', mkstream=True)
+    except ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def run_claim_coordinator(consumer, window_ms=None, batch_size=500, should_stop=lambda: False):
+    """Read, settle and write claim batches until `should_stop()`"""
+    if window_ms is None:
+        window_ms = getattr(settings, 'SEAT_CLAIM_BATCH_WINDOW_MS', 5)
+    redis = get_redis()
+    ensure_consumer_group(redis)
+
+    while not should_stop():
+        entries = redis.xreadgroup(CONSUMER_GROUP, consumer, {STREAM_KEY: '>'}, count=batch_size, block=1000)
+        if not entries:
+            continue
+        messages = entries[0][1]
+
+        if window_ms and len(messages) < batch_size:
+            # Let the rest of the burst arrive
+            time.sleep(window_ms / 1000)
+            more = redis.xreadgroup(CONSUMER_GROUP, consumer, {STREAM_KEY: '>'}, count=batch_size - len(messages))
+            if more:
+                messages.extend(more[0][1])
+
+        claims = [json.loads(fields[b'payload']) for _, fields in messages]
+        started = time.monotonic()
+        results = process_batch(claims)
+        redis.xack(STREAM_KEY, CONSUMER_GROUP, *[message_id for message_id, _ in messages])
+        logger.info(
+            f"Claim batch: {len(claims)} received, {len(results)} answered "
+            f"in {(time.monotonic() - started) * 1000:.1f}ms"
+        )
@@ -0,0 +1,372 @@
+"""
+All-or-nothing seat claims.
+
+A per-performance Redis hash maps each held seat to its holder
+(`session_id|expires_ms`) or to `sold`/`blocked`. `claim_seats` checks and
+takes all requested seats in one Lua script, so two sessions can never both
+pass the gate for the same seat and a contended request fails before it
+touches the database.
+
+The durable `SeatReservation` rows are written right after a successful
+claim by `persist_claim`, in one conditional upsert that only takes seats
+that are still free in the database. The database stays the arbiter:
+when Redis is unavailable or out of date the conditional write refuses the
+seats and the hash is dropped, to be seeded again from `SeatReservation` on
+the next claim.
+
+Committed writes keep the hash in step (`sync_claims`, called after commit
+by `seat_status.record_seat_status`): seats made available lose their entry
+whoever held them, sold/blocked seats are marked. Seats attached to a
+booking are held by its session with `BOOKED_EXPIRES_MS`, they stay taken
+until the booking is paid, cancelled or expired, like in `holding()`.
+`release_claims` only drops the claims of one session, for a claim whose
+transaction rolled back.
+"""
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import Case, Q, Value, When
+from django.utils import timezone
+from django_redis import get_redis_connection
+from logzero import logger
+from redis.exceptions import RedisError
+
+CLAIMS_TIMEOUT = 60 * 60 * 24
+# Expiry of the seats of a booking, they are freed by a committed status write
+BOOKED_EXPIRES_MS = 9999999999999
+
+# KEYS[1] claims hash. ARGV: session, now_ms, expires_ms, ttl, seat ids...
+# Returns -1 when the hash has not been seeded yet, otherwise the seats held
+# by someone else (nothing is written unless that list is empty)
+CLAIM_SEATS_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], '_seeded') == 0 then
+    return -1
+end
+local now = tonumber(ARGV[2])
+local conflicts = {}
+for i = 5, #ARGV do
+    local holder = redis.call('HGET', KEYS[1], ARGV[i])
+    if holder then
+        local session, expires = string.match(holder, '^(.*)|(%d+)$')
+        if not session or (session ~= ARGV[1] and tonumber(expires) > now) then
+            conflicts[#conflicts + 1] = ARGV[i]
+        end
+    end
+end
+if #conflicts > 0 then
+    return conflicts
+end
+local holder = ARGV[1] .. '|' .. ARGV[3]
+for i = 5, #ARGV do
+    redis.call('HSET', KEYS[1], ARGV[i], holder)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return conflicts
+"""
+
+# KEYS[1] claims hash. ARGV: ttl, then (seat_id, holder) pairs
+SEED_CLAIMS_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], '_seeded') == 1 then
+    return 0
+end
+for i = 2, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('HSET', KEYS[1], '_seeded', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# KEYS[1] claims hash. ARGV: session ('' for any), now_ms, seat ids...
+# Drops finished claims: sold/blocked markers, expired holds and, when
+# `session` is given, the live holds of that session
+RELEASE_CLAIMS_SCRIPT = """
+local now = tonumber(ARGV[2])
+local released = 0
+for i = 3, #ARGV do
+    local holder = redis.call('HGET', KEYS[1], ARGV[i])
+    if holder then
+        local session, expires = string.match(holder, '^(.*)|(%d+)$')
+        if not session or session == ARGV[1] or tonumber(expires) <= now then
+            released = released + redis.call('HDEL', KEYS[1], ARGV[i])
+        end
+    end
+end
+return released
+"""
+
+# KEYS[1] claims hash. ARGV: holder (status or `session|expires_ms`), seat
+# ids... Only once seeded, a fresh hash reads the statuses from the database
+# anyway
+MARK_CLAIMS_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], '_seeded') == 0 then
+    return 0
+end
+for i = 2, #ARGV do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[1])
+end
+return 1
+"""
+
+
+class SeatClaimConflict(Exception):
+    """Some of the claimed seats are held by another session or sold"""
+
+    def __init__(self, message='', seat_ids=()):
+        super().__init__(message)
+        self.seat_ids = list(seat_ids)
+
+
+def get_redis():
+    return get_redis_connection('default')
+
+
+def claims_key(performance_id):
+    return f'booking:seat_claims:{performance_id}'
+
+
+def _timestamp_ms(value):
+    return int(value.timestamp() * 1000)
+
+
+def seed_claims(performance_id):
+    """Load the current holders of a performance from `SeatReservation`"""
+    from .models import SeatReservation
+
+    args = [CLAIMS_TIMEOUT]
+    reservations = SeatReservation.objects.holding().filter(
+        performance_id=performance_id
+    ).values_list('seat_id', 'status', 'session_id', 'expires_at', 'booking_id')
+
+    for seat_id, seat_status, session_id, expires_at, booking_id in reservations:
+        if seat_status == 'reserved' and booking_id is not None:
+            holder = f'{session_id}|{BOOKED_EXPIRES_MS}'
+        elif seat_status == 'reserved' and expires_at is not None:
+            holder = f'{session_id}|{_timestamp_ms(expires_at)}'
+        else:
+            # A reservation without expiry never frees itself
+            holder = seat_status if seat_status != 'reserved' else 'blocked'
+        args.extend([seat_id, holder])
+
+    get_redis().register_script(SEED_CLAIMS_SCRIPT)(keys=[claims_key(performance_id)], args=args)
+
+
+def claim_seats(performance_id, session_id, seat_ids, expires_at):
+    """
+    Take all `seat_ids` for `session_id` until `expires_at`, or none of them.
+    Returns the seats held by someone else (empty on success), or None when
+    Redis is unavailable and only the database can decide.
+    """
+    script = get_redis().register_script(CLAIM_SEATS_SCRIPT)
+    args = [session_id, _timestamp_ms(timezone.now()), _timestamp_ms(expires_at), CLAIMS_TIMEOUT, *seat_ids]
+
+    try:
+        result = script(keys=[claims_key(performance_id)], args=args)
+        if result == -1:
+            seed_claims(performance_id)
+            result = script(keys=[claims_key(performance_id)], args=args)
+    except RedisError as e:
+        logger.warning(f"Cannot claim seats in Redis for performance {performance_id}: {e}")
+        return None
+
+    if result == -1:
+        # Dropped again between seeding and claiming, let the database decide
+        return None
+    return [int(seat_id) for seat_id in result]
+
+
+def release_claims(performance_id, seat_ids, session_id=''):
+    """
+    Drop the claims of `seat_ids` that are over: sold/blocked markers, expired
+    holds and the holds of `session_id`. Live holds of others are kept, for
+    seats freed in the database use `drop_claims`.
+    """
+    seat_ids = list(seat_ids)
+    if not seat_ids:
+        return
+    try:
+        get_redis().register_script(RELEASE_CLAIMS_SCRIPT)(
+            keys=[claims_key(performance_id)],
+            args=[session_id, _timestamp_ms(timezone.now()), *seat_ids]
+        )
+    except RedisError as e:
+        logger.warning(f"Cannot release seat claims for performance {performance_id}: {e}")
+
+
+def reset_claims(performance_id):
+    """Forget the claims hash, the next claim seeds it from the database"""
+    try:
+        get_redis().delete(claims_key(performance_id))
+    except RedisError as e:
+        logger.warning(f"Cannot reset seat claims for performance {performance_id}: {e}")
+
+
+def drop_claims(performance_id, seat_ids):
+    """Forget the claims of seats the database made available, whoever held them"""
+    seat_ids = list(seat_ids)
+    if not seat_ids:
+        return
+    try:
+        get_redis().hdel(claims_key(performance_id), *seat_ids)
+    except RedisError as e:
+        logger.warning(f"Cannot drop seat claims for performance {performance_id}: {e}")
+
+
+def mark_claims(performance_id, seat_ids, holder):
+    seat_ids = list(seat_ids)
+    if not seat_ids:
+        return
+    try:
+        get_redis().register_script(MARK_CLAIMS_SCRIPT)(
+            keys=[claims_key(performance_id)],
+            args=[holder, *seat_ids]
+        )
+    except RedisError as e:
+        logger.warning(f"Cannot mark seat claims for performance {performance_id}: {e}")
+
+
+def hold_booked_claims_on_commit(performance_id, session_id, seat_ids):
+    """Keep the seats attached to a booking claimed by its session, see `BOOKED_EXPIRES_MS`"""
+    seat_ids = list(seat_ids)
+    transaction.on_commit(
+        lambda: mark_claims(performance_id, seat_ids, f'{session_id}|{BOOKED_EXPIRES_MS}')
+    )
+
+
+def sync_claims(performance_id, seat_ids, seat_status):
+    """Follow a committed `SeatReservation` status write, see `seat_status`"""
+    if seat_status == 'available':
+        drop_claims(performance_id, seat_ids)
+    elif seat_status in ('sold', 'blocked'):
+        mark_claims(performance_id, seat_ids, seat_status)
+
+
+# One statement claim on PostgreSQL: rows are inserted as reserved, existing
+# rows only updated while free, `RETURNING` tells which seats were taken
+CLAIM_SEATS_SQL = """
+INSERT INTO {table} AS reservation
+    (performance_id, seat_id, status, price, session_id, reserved_at, expires_at, client_ip, booking_id)
+SELECT %s, claim.seat_id, 'reserved', claim.price, %s, now(), %s, %s::inet, NULL
+FROM unnest(%s::bigint[], %s::numeric[]) AS claim(seat_id, price)
+ON CONFLICT (performance_id, seat_id) DO UPDATE SET
+    status = EXCLUDED.status,
+    price = EXCLUDED.price,
+    session_id = EXCLUDED.session_id,
+    expires_at = EXCLUDED.expires_at,
+    client_ip = EXCLUDED.client_ip,
+    booking_id = NULL
+WHERE reservation.status = 'available'
+    OR (reservation.status = 'reserved' AND reservation.session_id = EXCLUDED.session_id)
+    OR (reservation.status = 'reserved' AND reservation.expires_at < now() AND reservation.booking_id IS NULL)
+RETURNING seat_id
+"""
+
+
+def _persist_claim_postgresql(performance_id, session_id, seat_prices, expires_at, client_ip):
+    from .models import SeatReservation
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            CLAIM_SEATS_SQL.format(table=connection.ops.quote_name(SeatReservation._meta.db_table)),
+            [
+                performance_id,
+                session_id,
+                expires_at,
+                client_ip,
+                list(seat_prices),
+                list(seat_prices.values()),
+            ]
+        )
+        return len(cursor.fetchall())
+
+
+def _persist_claim_fallback(performance_id, session_id, seat_prices, expires_at, client_ip):
+    """
+    SQLite (dev mode): one conditional UPDATE of the inventory rows (see
+    `inventory`), seats without a row yet are inserted and claimed after
+    """
+    from .models import SeatReservation
+
+    def claim(seat_ids):
+        return SeatReservation.objects.filter(
+            performance_id=performance_id,
+            seat_id__in=seat_ids
+        ).filter(
+            Q(status='available') |
+            Q(status='reserved', session_id=session_id) |
+            Q(status='reserved', expires_at__lt=timezone.now(), booking__isnull=True)
+        ).update(
+            status='reserved',
+            session_id=session_id,
+            price=Case(
+                *[When(seat_id=seat_id, then=Value(seat_prices[seat_id])) for seat_id in seat_ids],
+                output_field=models.DecimalField(max_digits=10, decimal_places=0)
+            ),
+            expires_at=expires_at,
+            client_ip=client_ip,
+            booking=None
+        )
+
+    claimed = claim(list(seat_prices))
+    if claimed == len(seat_prices):
+        return claimed
+
+    missing = set(seat_prices) - set(
+        SeatReservation.objects.filter(
+            performance_id=performance_id,
+            seat_id__in=list(seat_prices)
+        ).values_list('seat_id', flat=True)
+    )
+    if missing:
+        SeatReservation.objects.bulk_create(
+            [
+                SeatReservation(performance_id=performance_id, seat_id=seat_id, status='available', price=seat_prices[seat_id])
+                for seat_id in missing
+            ],
+            ignore_conflicts=True
+        )
+        claimed += claim(list(missing))
+    return claimed
+
+
+def persist_claim(performance_id, session_id, seat_prices, expires_at, client_ip=None):
+    """
+    Write the `SeatReservation` rows of a claim, taking only seats that are
+    free (or already held by `session_id`). A single
+    `INSERT ... ON CONFLICT DO UPDATE ... WHERE ... RETURNING` on PostgreSQL,
+    relying on the (performance, seat) unique constraint. Raises
+    `SeatClaimConflict` unless all seats were taken; call it inside a
+    transaction so a partial claim is rolled back.
+    """
+    if connection.vendor == 'postgresql':
+        claimed = _persist_claim_postgresql(performance_id, session_id, seat_prices, expires_at, client_ip)
+    else:
+        claimed = _persist_claim_fallback(performance_id, session_id, seat_prices, expires_at, client_ip)
+
+    if claimed != len(seat_prices):
+        raise SeatClaimConflict(f'{len(seat_prices) - claimed} of {len(seat_prices)} seats are taken')
+    return claimed
+
+
+def claim_and_persist(performance_id, session_id, seat_prices, expires_at, client_ip=None):
+    """
+    `claim_seats` then `persist_claim`. Returns the seats that could not be
+    taken (empty on success). If the caller's transaction rolls back later it
+    must `release_claims` for the session, Redis does not roll back.
+    """
+    seat_ids = list(seat_prices)
+    conflicts = None
+    if getattr(settings, 'SEAT_CLAIM_ENGINE', 'redis') == 'redis':
+        conflicts = claim_seats(performance_id, session_id, seat_ids, expires_at)
+    if conflicts:
+        return conflicts
+
+    try:
+        with transaction.atomic():
+            persist_claim(performance_id, session_id, seat_prices, expires_at, client_ip)
+    except SeatClaimConflict as e:
+        logger.warning(f"Seat claim of {session_id} refused by the database for performance {performance_id}: {e}")
+        if conflicts is not None:
+            # Redis let a held seat through, drop the hash so it is seeded again
+            reset_claims(performance_id)
+        return seat_ids
+    return []
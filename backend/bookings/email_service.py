@@ -2,13 +2,44 @@ from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
-from datetime import timedelta
+from datetime import datetime, timedelta
+from types import SimpleNamespace
 from logzero import logger
 from venues.models import ContactInfo
+from .read_model import has_snapshot
 from django.utils import timezone
 import pytz
 
 
+def get_confirmation_details(booking):
+    """
+    Show, venue, performance datetime and seats (section, label, price
+    category) of a booking, from its snapshot when it has one
+    """
+    if has_snapshot(booking):
+        snapshot = booking.snapshot
+        seats = [
+            (seat['section_name'], seat['full_label'], category)
+            for seat, category in zip(snapshot['selectedSeats'], snapshot['seat_categories'])
+        ]
+        return (
+            SimpleNamespace(**snapshot['show']),
+            SimpleNamespace(**snapshot['venue']),
+            datetime.fromisoformat(snapshot['performance_at']),
+            seats
+        )
+
+    show = booking.performance.show
+    seats = []
+    for reservation in booking.seat_reservations.select_related(
+        'seat__row__section', 'seat__price_category', 'seat__row__price_category'
+    ):
+        seat = reservation.seat
+        category = seat.effective_price_category
+        seats.append((seat.row.section.name, f"{seat.row.label}{seat.display_label}", category.name if category else None))
+    return show, show.venue, booking.performance.datetime, seats
+
+
 def send_booking_confirmation(booking):
     """Send booking confirmation email using template"""
     try:
@@ -16,21 +47,13 @@ def send_booking_confirmation(booking):
         contact = ContactInfo.get_instance()
 
         # Get booking details
-        show = booking.performance.show
-        venue = show.venue
-        performance = booking.performance
-
-        # Format seat numbers
-        seats = booking.seat_reservations.all()
+        show, venue, performance_datetime, seats = get_confirmation_details(booking)
 
         # Group seats by section for better readability
         from collections import defaultdict
         seats_by_section = defaultdict(list)
 
-        for reservation in seats:
-            seat = reservation.seat
-            section_name = seat.row.section.name
-            seat_label = f"{seat.row.label}{seat.display_label}"
+        for section_name, seat_label, _ in seats:
             seats_by_section[section_name].append(seat_label)
 
         section_names = list(seats_by_section.keys())
@@ -49,13 +72,12 @@ def send_booking_confirmation(booking):
 
         # Get ticket class from first seat
         ticket_class = ""  # Default
-        if seats.exists():
-            first_seat = seats.first()
-            ticket_class = first_seat.seat.row.price_category.name
+        if seats:
+            ticket_class = seats[0][2] or ""
 
         # Calculate check-in time
         vietnam_tz = pytz.timezone('Asia/Ho_Chi_Minh')
-        performance_datetime_vn = performance.datetime.astimezone(vietnam_tz)
+        performance_datetime_vn = performance_datetime.astimezone(vietnam_tz)
         checkin_minutes = getattr(venue, 'checkin_minutes_before', 45)
         checkin_time = performance_datetime_vn - timedelta(minutes=checkin_minutes)
         checkin_time_str = f"{checkin_time.strftime('%H:%M')} ngày {checkin_time.strftime('%d/%m/%Y')}"
@@ -87,7 +109,7 @@ def send_booking_confirmation(booking):
             'phone': booking.customer_phone,
             'address': getattr(booking, 'customer_address', 'Hà Nội, Việt Nam'),
             'booking_code': booking.booking_code,
-            'ticket_count': seats.count(),
+            'ticket_count': len(seats),
             'ticket_class': ticket_class,
             'seat_numbers': seat_numbers,
             'total_amount': f"{booking.final_amount:,.0f}",
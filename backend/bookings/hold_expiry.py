@@ -0,0 +1,200 @@
+"""
+Hold expiry driven by per-hold deadlines.
+
+Every hold schedules its deadline in a Redis sorted set (member
+`{performance_id}:{session_id}`, score the expiry in ms). The
+`run_hold_expiry` management command pops the due members about twice a
+second and releases their seats with `expire_holds`: one bulk UPDATE per
+batch, one bulk `BookingHistory` insert, and the status bitmap, seat claims
+and session registry updated after commit. Seats are free again within a
+second of their expiry instead of up to a minute later.
+
+The UPDATE repeats the status, expiry and `booking IS NULL` conditions of
+the select, so a hold that was extended, released or turned into a booking
+in between is left alone (the rows are locked on PostgreSQL, not on
+SQLite). Only the rows it actually released are logged and synced. The minute
+`cleanup_expired_seat_reservations` task runs the same sweep over all
+performances, for holds whose deadline was lost (Redis flushed, consumer
+down).
+"""
+import time
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_redis import get_redis_connection
+from logzero import logger
+from redis.exceptions import RedisError
+
+from .seat_map import get_venue_geometry
+from .seat_status import get_performance_venue_id, record_reservations_status
+
+DEADLINES_KEY = 'booking:hold_deadlines'
+EXPIRY_BATCH_SIZE = 500
+POLL_INTERVAL = 0.5
+
+# KEYS[1] deadlines. ARGV: now_ms, limit. Pops the members that are due
+POP_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+
+def get_redis():
+    return get_redis_connection('default')
+
+
+def schedule_hold_expiry(performance_id, session_id, expires_at):
+    # Rounded up, a deadline must not come due before the row expires
+    deadline = int(expires_at.timestamp() * 1000) + 1
+    try:
+        get_redis().zadd(DEADLINES_KEY, {f'{performance_id}:{session_id}': deadline})
+    except RedisError as e:
+        logger.warning(f"Cannot schedule the hold expiry of session {session_id}: {e}")
+
+
+def schedule_hold_expiry_on_commit(performance_id, session_id, expires_at):
+    transaction.on_commit(lambda: schedule_hold_expiry(performance_id, session_id, expires_at))
+
+
+def pop_due_holds(limit=EXPIRY_BATCH_SIZE):
+    """(performance_id, session_id) of the holds whose deadline passed"""
+    due = get_redis().register_script(POP_DUE_SCRIPT)(
+        keys=[DEADLINES_KEY],
+        args=[int(time.time() * 1000), limit]
+    )
+    holds = []
+    for member in due:
+        performance_id, session_id = member.decode().split(':', 1)
+        holds.append((int(performance_id), session_id))
+    return holds
+
+
+def _seats_snapshot(rows, geometry):
+    """`BookingHistory.seats_snapshot` of released (seat_id, price) rows, from the cached geometry"""
+    snapshot = []
+    for seat_id, price in rows:
+        ordinal = geometry['seat_ordinals'].get(seat_id)
+        seat = geometry['seats'][ordinal] if ordinal is not None else {}
+        snapshot.append({
+            'seat_id': seat_id,
+            'row': seat.get('row'),
+            'number': seat.get('display_number'),
+            'price': float(price),
+            'status': 'reserved',
+        })
+    return snapshot
+
+
+def expire_holds(holds=None, batch_size=EXPIRY_BATCH_SIZE, task='hold_expiry'):
+    """
+    Release expired holds that are not part of a booking, restricted to the
+    (performance_id, session_id) pairs of `holds` when given. Returns the
+    number of released seats.
+    """
+    from .models import BookingHistory, SeatReservation
+
+    def expired_holds():
+        return SeatReservation.objects.filter(
+            status='reserved',
+            booking__isnull=True,
+            expires_at__lte=timezone.now()
+        )
+
+    expired = expired_holds()
+    if holds is not None:
+        if not holds:
+            return 0
+        pairs = Q()
+        for performance_id, session_id in holds:
+            pairs |= Q(performance_id=performance_id, session_id=session_id)
+        expired = expired.filter(pairs)
+
+    released = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                expired.select_for_update(skip_locked=True).values_list(
+                    'id', 'performance_id', 'seat_id', 'session_id', 'price'
+                )[:batch_size]
+            )
+            if not rows:
+                break
+
+            ids = [row[0] for row in rows]
+            updated = expired_holds().filter(id__in=ids).update(
+                status='available',
+                session_id='',
+                expires_at=None,
+                booking=None,
+                client_ip=None
+            )
+            if updated != len(rows):
+                # Some holds changed since the select, keep the ones released here
+                still_held = set(SeatReservation.objects.filter(id__in=ids).exclude(
+                    status='available'
+                ).values_list('id', flat=True))
+                rows = [row for row in rows if row[0] not in still_held]
+
+            by_session = {}
+            for _, performance_id, seat_id, session_id, price in rows:
+                by_session.setdefault((performance_id, session_id), []).append((seat_id, price))
+            # Once per performance, not per row
+            geometries = {
+                performance_id: get_venue_geometry(get_performance_venue_id(performance_id))
+                for performance_id, _ in by_session
+            }
+
+            BookingHistory.objects.bulk_create([
+                BookingHistory(
+                    booking=None,
+                    booking_code='N/A',
+                    action='seat_released',
+                    seats_snapshot=_seats_snapshot(session_rows, geometries[performance_id]),
+                    session_id=session_id,
+                    extra_data={
+                        'reason': 'expired_reservation',
+                        'task': task,
+                        'performance_id': performance_id,
+                    },
+                )
+                for (performance_id, session_id), session_rows in by_session.items()
+            ])
+
+            record_reservations_status([(row[1], row[2]) for row in rows], 'available')
+
+        released += len(rows)
+        if len(ids) < batch_size:
+            break
+
+    return released
+
+
+def run_hold_expiry(batch_size=EXPIRY_BATCH_SIZE, poll_interval=POLL_INTERVAL, should_stop=lambda: False):
+    """Release holds as their deadlines pass until `should_stop()`"""
+    while not should_stop():
+        try:
+            holds = pop_due_holds(batch_size)
+        except RedisError as e:
+            logger.warning(f"Cannot read hold deadlines: {e}")
+            time.sleep(poll_interval * 4)
+            continue
+
+        if not holds:
+            time.sleep(poll_interval)
+            continue
+
+        started = time.monotonic()
+        try:
+            released = expire_holds(holds, batch_size=batch_size)
+        except Exception as e:
+            # The minute cleanup task picks these holds up
+            logger.error(f"Cannot expire {len(holds)} holds: {e}")
+            continue
+        logger.info(
+            f"Expired {len(holds)} holds, {released} seats released "
+            f"in {(time.monotonic() - started) * 1000:.1f}ms"
+        )
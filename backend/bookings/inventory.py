@@ -0,0 +1,86 @@
+"""
+Pre-materialized seat inventory of a performance.
+
+Every active seat of an on-sale performance gets an `available`
+`SeatReservation` row with its resolved price, so a reservation is a
+conditional UPDATE of an existing row (see `claims`) and availability is a
+plain indexed count over `(performance, seat, status)`.
+
+The rows are created when a performance goes on sale and re-synced when
+its prices or the venue layout change (see `shows.signals` and
+`venues.signals`). The `sync_inventory` management command does the same
+for existing performances. The claim path still inserts a missing row, so
+an inventory that lags behind a layout change is never a correctness issue.
+"""
+from django.core.cache import cache
+from logzero import logger
+
+from .pricing import get_price_table
+from .seat_map import get_venue_geometry
+from .seat_status import get_performance_venue_id
+
+INVENTORY_BATCH_SIZE = 1000
+INVENTORY_LOCK_TIMEOUT = 60
+
+
+def inventory_lock_key(performance_id):
+    return f'seat_inventory_lock:{performance_id}'
+
+
+def sync_inventory(performance_id, batch_size=INVENTORY_BATCH_SIZE):
+    """
+    Create the missing `available` rows of a performance, reprice the
+    available rows whose price changed and drop the available rows of seats
+    that are no longer active. Held and sold rows are left alone.
+    """
+    from .models import SeatReservation
+
+    geometry = get_venue_geometry(get_performance_venue_id(performance_id))
+    seat_prices = dict(zip(
+        (seat['id'] for seat in geometry['seats']),
+        get_price_table(performance_id, geometry)['seat_prices']
+    ))
+
+    existing = SeatReservation.objects.filter(performance_id=performance_id).only('id', 'seat_id', 'status', 'price')
+    existing_seat_ids = set()
+    repriced = []
+    removed_ids = []
+
+    for reservation in existing.iterator(chunk_size=batch_size):
+        existing_seat_ids.add(reservation.seat_id)
+        if reservation.status != 'available':
+            continue
+        price = seat_prices.get(reservation.seat_id)
+        if price is None:
+            removed_ids.append(reservation.id)
+        elif reservation.price != price:
+            reservation.price = price
+            repriced.append(reservation)
+
+    created = SeatReservation.objects.bulk_create(
+        [
+            SeatReservation(performance_id=performance_id, seat_id=seat_id, status='available', price=price)
+            for seat_id, price in seat_prices.items()
+            if seat_id not in existing_seat_ids
+        ],
+        batch_size=batch_size,
+        ignore_conflicts=True
+    )
+    SeatReservation.objects.bulk_update(repriced, ['price'], batch_size=batch_size)
+    for start in range(0, len(removed_ids), batch_size):
+        SeatReservation.objects.filter(
+            id__in=removed_ids[start:start + batch_size],
+            status='available'
+        ).delete()
+
+    result = {'created': len(created), 'repriced': len(repriced), 'removed': len(removed_ids)}
+    logger.info(f"Seat inventory of performance {performance_id} synced: {result}")
+    return result
+
+
+def schedule_inventory_sync(performance_id):
+    """Queue an inventory sync unless one is already queued"""
+    from .tasks import sync_inventory_task
+
+    if cache.add(inventory_lock_key(performance_id), 1, INVENTORY_LOCK_TIMEOUT):
+        sync_inventory_task.delay(performance_id)
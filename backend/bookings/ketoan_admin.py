@@ -10,6 +10,7 @@ from datetime import timedelta, datetime
 import re
 
 from .models import Booking, SeatReservation
+from .read_model import has_snapshot, performance_summary, prefetch_missing_snapshots
 from shows.models import Performance, Show
 from venues.models import Seat, PriceCategory, Row
 
@@ -52,6 +53,27 @@ def extract_clean_notes(notes):
     return notes.strip()
 
 
+def get_accounting_details(booking):
+    """Hạng vé, số ghế và thanh toán 9Pay của booking, từ snapshot nếu có"""
+    if has_snapshot(booking):
+        snapshot = booking.snapshot
+        categories = {name for name in snapshot['seat_categories'] if name}
+        seat_numbers = [seat['full_label'] for seat in snapshot['selectedSeats']]
+        return categories, seat_numbers, snapshot['payment_method'] == '9pay'
+
+    categories = set()
+    seat_numbers = []
+    for reservation in booking.seat_reservations.all():
+        pc = reservation.seat.effective_price_category
+        if pc:
+            categories.add(pc.name)
+        seat_numbers.append(reservation.seat.full_display_label)
+
+    successful_payment = next((p for p in booking.payments.all() if p.status == 'success'), None)
+    is_9pay = bool(successful_payment and successful_payment.payment_method == '9pay')
+    return categories, seat_numbers, is_9pay
+
+
 class KeToanAdminSite(AdminSite):
     site_header = '📊 Hệ Thống Kế Toán'
     site_title = 'Kế Toán'
@@ -100,39 +122,19 @@ class KeToanAdminSite(AdminSite):
         elif show_id:
             bookings_query = bookings_query.filter(performance__show_id=show_id)
 
-        recent_bookings = bookings_query.select_related(
-            'performance__show'
-        ).prefetch_related(
-            'seat_reservations__seat__row__section',
-            'seat_reservations__seat__price_category',
-            'seat_reservations__seat__row__price_category',
-            'payments'
-        ).order_by('-paid_at')[:100]
+        # Đọc từ snapshot, chỉ booking chưa có snapshot mới truy vấn quan hệ
+        recent_bookings = prefetch_missing_snapshots(bookings_query.order_by('-paid_at')[:100], 'payments')
 
         for booking in recent_bookings:
             booking.invoice_info = parse_invoice_from_notes(booking.notes)
             booking.clean_notes = extract_clean_notes(booking.notes)
+            booking.show_name, booking.performance_datetime = performance_summary(booking)
 
-            seats = booking.seat_reservations.all()
-            booking.seat_count = len(seats)
-
-            categories = set()
-            seat_numbers = []
-            for seat in seats:
-                pc = seat.seat.effective_price_category
-                if pc:
-                    categories.add(pc.name)
-                seat_numbers.append(seat.seat.full_display_label)
-
+            categories, seat_numbers, booking.is_9pay = get_accounting_details(booking)
+            booking.seat_count = len(seat_numbers)
             booking.ticket_classes = ', '.join(sorted(categories)) if categories else '—'
             booking.seat_numbers = ', '.join(seat_numbers)
 
-            # Check payment method (9Pay)
-            booking.is_9pay = False
-            successful_payment = booking.payments.filter(status='success').first()
-            if successful_payment and successful_payment.payment_method == '9pay':
-                booking.is_9pay = True
-
         # ===== STATS THEO FILTER =====
         total_bookings = bookings_query.count()
         total_with_invoice = bookings_query.filter(
@@ -272,13 +274,7 @@ class KeToanAdminSite(AdminSite):
         elif show_id:
             queryset = queryset.filter(performance__show_id=show_id)
 
-        queryset = queryset.select_related(
-            'performance__show'
-        ).prefetch_related(
-            'seat_reservations__seat__row__section',
-            'seat_reservations__seat__price_category',
-            'payments'
-        ).order_by('-paid_at')
+        queryset = queryset.order_by('-paid_at')
 
         filename = 'booking_filtered'
         return export_bookings_to_excel(queryset, filename)
@@ -359,10 +355,11 @@ class BookingKeToanAdmin(admin.ModelAdmin):
     actions = ['export_selected']
 
     def performance_info(self, obj):
+        show_name, performance_datetime = performance_summary(obj)
         return format_html(
             '<strong>{}</strong><br><small>{}</small>',
-            obj.performance.show.name,
-            obj.performance.datetime.strftime('%d/%m/%Y %H:%M')
+            show_name,
+            performance_datetime.strftime('%d/%m/%Y %H:%M')
         )
     performance_info.short_description = 'Suất diễn'
 
@@ -376,6 +373,8 @@ class BookingKeToanAdmin(admin.ModelAdmin):
     status_badge.short_description = 'Trạng thái'
 
     def total_seats(self, obj):
+        if has_snapshot(obj):
+            return len(obj.snapshot['selectedSeats'])
         return obj.seat_reservations.count()
     total_seats.short_description = 'Số vé'
 
@@ -453,19 +452,12 @@ def export_bookings_to_excel(queryset, filename_prefix):
         cell.border = border
 
     row_num = 2
-    for booking in queryset:
+    for booking in prefetch_missing_snapshots(queryset, 'payments'):
         inv = parse_invoice_from_notes(booking.notes)
         clean_notes = extract_clean_notes(booking.notes)
+        show_name, performance_datetime = performance_summary(booking)
 
-        seats = booking.seat_reservations.all()
-        categories = set()
-        seat_nums = []
-
-        for s in seats:
-            pc = s.seat.effective_price_category
-            if pc:
-                categories.add(pc.name)
-            seat_nums.append(s.seat.full_display_label)
+        categories, seat_nums, paid_with_9pay = get_accounting_details(booking)
 
         hang_ve = ', '.join(sorted(categories)) if categories else '—'
         so_ghe = ', '.join(seat_nums)
@@ -477,21 +469,18 @@ def export_bookings_to_excel(queryset, filename_prefix):
             invoice_text = 'Không có'
 
         # Check 9Pay
-        is_9pay = 'Không'
-        successful_payment = booking.payments.filter(status='success').first()
-        if successful_payment and successful_payment.payment_method == '9pay':
-            is_9pay = 'Có'
+        is_9pay = 'Có' if paid_with_9pay else 'Không'
 
         row_data = [
             booking.booking_code,
             booking.customer_name,
             booking.customer_phone,
             booking.customer_address,
-            booking.performance.show.name,
-            booking.performance.datetime.strftime('%d/%m/%Y %H:%M'),
+            show_name,
+            performance_datetime.strftime('%d/%m/%Y %H:%M'),
             hang_ve,
             so_ghe,
-            len(seats),
+            len(seat_nums),
             float(booking.final_amount),
             is_9pay,
             invoice_text,
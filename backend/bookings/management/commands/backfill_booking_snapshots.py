@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from bookings.models import Booking
+from bookings.read_model import (
+    build_booking_snapshot,
+    has_snapshot,
+    snapshot_queryset,
+)
+
+
+class Command(BaseCommand):
+    help = 'Write the read model snapshot of bookings that have no current one (see bookings.read_model)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true', help='Rebuild every snapshot, current ones included')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        written = 0
+        last_id = 0
+
+        while True:
+            bookings = list(
+                snapshot_queryset().filter(id__gt=last_id).prefetch_related('payments').order_by('id')[:batch_size]
+            )
+            if not bookings:
+                break
+            last_id = bookings[-1].id
+
+            for booking in bookings:
+                if has_snapshot(booking) and not options['all']:
+                    continue
+                payment = next((p for p in booking.payments.all() if p.status == 'success'), None)
+                snapshot = build_booking_snapshot(booking, payment.payment_method if payment else None)
+                # Only the snapshot column, a concurrent status change rebuilds it after commit
+                Booking.objects.filter(id=booking.id, status=booking.status).update(snapshot=snapshot)
+                written += 1
+
+            self.stdout.write(f'Up to booking {last_id}: {written} snapshots written')
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} booking snapshots'))
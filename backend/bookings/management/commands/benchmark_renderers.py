@@ -0,0 +1,85 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from shows.models import Performance, Show
+from shows.serializers import ShowListSerializer, show_list_data
+from bookings.views import get_performance_seat_map
+from core.renderers import ORJSONRenderer
+
+
+class Command(BaseCommand):
+    help = 'Compare the DRF serializer/JSONRenderer path with the raw orjson path of hot read endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--performance', type=int, help='Performance ID for the seat map (default: latest)')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def measure(self, func, iterations):
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(iterations):
+                started = time.perf_counter()
+                content = func()
+                timings.append((time.perf_counter() - started) * 1000)
+        return {
+            'median_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(sorted(timings)[int(len(timings) * 0.95) - 1], 3),
+            'queries_per_call': len(queries) / iterations,
+            'bytes': len(content),
+        }
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        performances = Performance.objects.select_related('show')
+        if options['performance']:
+            performance = performances.filter(id=options['performance']).first()
+        else:
+            performance = performances.order_by('-datetime').first()
+        if performance is None:
+            raise CommandError('No performance to benchmark')
+
+        drf_renderer = JSONRenderer()
+        fast_renderer = ORJSONRenderer()
+        seat_map_data = get_performance_seat_map(performance)
+        shows = Show.objects.filter(is_active=True)
+
+        results = {
+            'performance_id': performance.id,
+            'seat_count': len(seat_map_data['seats']),
+            'seat_map': {
+                'drf_json': self.measure(lambda: drf_renderer.render(seat_map_data), iterations),
+                'orjson': self.measure(lambda: fast_renderer.render(seat_map_data), iterations),
+                'build_and_orjson': self.measure(
+                    lambda: fast_renderer.render(get_performance_seat_map(performance)), iterations
+                ),
+            },
+            'show_list': {
+                'serializer_drf_json': self.measure(
+                    lambda: drf_renderer.render(ShowListSerializer(shows, many=True).data), iterations
+                ),
+                'raw_orjson': self.measure(
+                    lambda: fast_renderer.render(show_list_data(shows.select_related('venue'))), iterations
+                ),
+            },
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f'Performance {performance.id}: {results["seat_count"]} seats, {iterations} iterations')
+        for endpoint in ('seat_map', 'show_list'):
+            for path, result in results[endpoint].items():
+                self.stdout.write(
+                    f'{endpoint:<10} {path:<22} median {result["median_ms"]:>9.3f} ms  '
+                    f'p95 {result["p95_ms"]:>9.3f} ms  {result["queries_per_call"]:>5.1f} queries  '
+                    f'{result["bytes"]:>9} bytes'
+                )
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,305 @@
+import io
+import json
+import random
+import statistics
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models.signals import post_save, post_delete
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from shows.models import Show, Performance, PerformancePrice
+from shows.views import PerformanceViewSet
+from venues import signals as venue_signals
+from venues.management.commands.create_venue_from_template import Command as CreateVenueCommand
+from venues.models import Venue, Row, Seat, PriceCategory
+from venues.venue_templates import STANDARD_THEATER_TEMPLATE
+from bookings import seat_map, views as booking_views
+from bookings.claims import release_claims
+from bookings.models import SeatReservation
+from bookings.seat_map import bump_layout_version
+from bookings.seat_status import rebuild_status_bitmap, record_seat_status
+
+SEATS_PER_ROW = 40
+ROWS_PER_SECTION = 25
+
+
+def row_label(index):
+    """A..Z, AA..ZZ, ... like printed row labels"""
+    label = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        label = chr(65 + remainder) + label
+    return label
+
+
+def synthetic_template(seat_count):
+    """Venue template (see `venue_templates`) with `seat_count` seats"""
+    categories = list(STANDARD_THEATER_TEMPLATE['price_categories'])
+    sections = []
+    remaining = seat_count
+    row_index = 0
+
+    while remaining > 0:
+        rows = []
+        while remaining > 0 and len(rows) < ROWS_PER_SECTION:
+            seats = min(SEATS_PER_ROW, remaining)
+            rows.append({
+                'label': row_label(row_index),
+                'seats': seats,
+                'numbering': 'left_to_right' if row_index % 2 else 'center_out',
+                'category': categories[row_index % len(categories)],
+                'position_y': 40 + row_index * 30,
+            })
+            remaining -= seats
+            row_index += 1
+        sections.append({
+            'id': f'S{len(sections) + 1}',
+            'name': f'Khu {len(sections) + 1}',
+            'rows': rows,
+        })
+
+    return dict(
+        STANDARD_THEATER_TEMPLATE,
+        name=f'Benchmark {seat_count}',
+        floors=[{'id': 'main_floor', 'name': 'Tầng chính', 'level': 1, 'sections': sections}],
+    )
+
+
+class SyntheticVenueBuilder(CreateVenueCommand):
+    """`create_venue_from_template` with seats inserted in bulk"""
+
+    def create_seats_for_row(self, row):
+        Seat.objects.bulk_create([
+            Seat(row=row, number=seat_num, position_x=pos['x'], position_y=pos['y'], status='active')
+            for seat_num, pos in row.actual_seat_positions.items()
+        ])
+
+
+@contextmanager
+def layout_signals_disconnected():
+    """Per-seat layout signals would bump the layout once per seat"""
+    receivers = [
+        (venue_signals.row_layout_changed, Row),
+        (venue_signals.seat_layout_changed, Seat),
+    ]
+    for receiver, sender in receivers:
+        post_save.disconnect(receiver, sender=sender)
+        post_delete.disconnect(receiver, sender=sender)
+    try:
+        yield
+    finally:
+        for receiver, sender in receivers:
+            post_save.connect(receiver, sender=sender)
+            post_delete.connect(receiver, sender=sender)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark seat map, reserve and performance endpoints on synthetic venues of growing size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='500,2000,10000,50000', help='Seat counts, comma separated')
+        parser.add_argument('--densities', default='0,0.5,0.9', help='Share of seats taken, comma separated')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--output', default='benchmark_seat_map.json', help='JSON results file')
+        parser.add_argument('--keep', action='store_true', help='Keep the synthetic venues and shows')
+        parser.add_argument('--force', action='store_true', help='Run even when DEBUG is off')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('Benchmark writes synthetic data, run it on a local database (or pass --force)')
+
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        densities = [float(density) for density in options['densities'].split(',')]
+        iterations = options['iterations']
+        self.factory = APIRequestFactory()
+
+        results = []
+        # Every call comes from one client, the write throttles would answer 429
+        with override_settings(BOOKING_THROTTLES={}):
+            self.run_sizes(sizes, densities, iterations, options['keep'], results)
+
+        report = {
+            'database': connection.vendor,
+            'generated_at': timezone.now().isoformat(),
+            'iterations': iterations,
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+    def run_sizes(self, sizes, densities, iterations, keep, results):
+        for size in sizes:
+            self.stdout.write(f'Creating venue with {size} seats...')
+            venue, performance = self.create_fixture(size)
+            try:
+                for density in densities:
+                    self.fill_reservations(performance, density)
+                    for endpoint, call in self.endpoints(performance).items():
+                        result = self.measure(call, iterations)
+                        result.update({'seats': size, 'density': density, 'endpoint': endpoint})
+                        results.append(result)
+                        self.stdout.write(
+                            f'{size:>6} seats  {density:>4.0%}  {endpoint:<22} '
+                            f'p50 {result["p50_ms"]:>9.2f} ms  p95 {result["p95_ms"]:>9.2f} ms  '
+                            f'p99 {result["p99_ms"]:>9.2f} ms  {result["queries"]:>5.1f} q  '
+                            f'{result["peak_memory_kb"]:>9.1f} KB  {result["payload_bytes"]:>9} B'
+                        )
+            finally:
+                if not keep:
+                    self.delete_fixture(venue)
+
+    def create_fixture(self, size):
+        template = synthetic_template(size)
+        builder = SyntheticVenueBuilder(stdout=io.StringIO())
+        suffix = uuid.uuid4().hex[:6]
+
+        with layout_signals_disconnected():
+            builder.create_price_categories(template['price_categories'])
+            venue = Venue.objects.create(
+                name=f'Benchmark {size} {suffix}',
+                address='Benchmark',
+                venue_type=template['type']
+            )
+            builder.create_venue_layout(venue, template)
+        bump_layout_version(venue.id)
+
+        show = Show.objects.create(
+            name=f'Benchmark {size}',
+            slug=f'benchmark-{size}-{suffix}',
+            category='Benchmark',
+            duration_minutes=120,
+            description='Benchmark',
+            venue=venue,
+        )
+        performance = Performance.objects.create(
+            show=show,
+            datetime=timezone.now() + timedelta(days=30),
+            status='on_sale',
+        )
+        for category in PriceCategory.objects.filter(code__in=template['price_categories']):
+            PerformancePrice.objects.create(
+                performance=performance,
+                price_category=category,
+                price=category.base_price
+            )
+        return venue, performance
+
+    def delete_fixture(self, venue):
+        with layout_signals_disconnected():
+            venue.delete()
+
+    def fill_reservations(self, performance, density):
+        """Take `density` of the seats: 70% sold, 30% held by other sessions"""
+        SeatReservation.objects.filter(performance=performance).delete()
+        seat_ids = list(
+            Seat.objects.filter(row__section__venue=performance.show.venue).values_list('id', flat=True)
+        )
+        taken = random.sample(seat_ids, int(len(seat_ids) * density))
+        expires_at = timezone.now() + timedelta(hours=1)
+
+        SeatReservation.objects.bulk_create([
+            SeatReservation(
+                performance=performance,
+                seat_id=seat_id,
+                status='sold' if index % 10 < 7 else 'reserved',
+                session_id='' if index % 10 < 7 else f'benchmark-{index}',
+                expires_at=None if index % 10 < 7 else expires_at,
+                price=0,
+            )
+            for index, seat_id in enumerate(taken)
+        ], batch_size=1000)
+        rebuild_status_bitmap(performance.id, force=True)
+
+        self.free_seat_ids = list(set(seat_ids) - set(taken))
+
+    def endpoints(self, performance):
+        performance_id = performance.id
+        seat_map_url = f'/api/performances/{performance_id}/seat-map/'
+        detail_view = PerformanceViewSet.as_view({'get': 'retrieve'})
+        list_view = PerformanceViewSet.as_view({'get': 'list'})
+
+        def seat_map_cold():
+            # Drop the per-process caches, Redis still holds geometry and statuses
+            seat_map._local_geometry.clear()
+            booking_views._rendered_seat_maps.clear()
+            return booking_views.performance_seat_map(self.factory.get(seat_map_url), performance_id=performance_id)
+
+        def seat_map_warm():
+            return booking_views.performance_seat_map(self.factory.get(seat_map_url), performance_id=performance_id)
+
+        def seat_map_columnar():
+            booking_views._rendered_seat_maps.clear()
+            request = self.factory.get(seat_map_url, {'format': 'columnar'})
+            return booking_views.performance_seat_map(request, performance_id=performance_id)
+
+        def reserve():
+            session_id = f'benchmark-{uuid.uuid4().hex}'
+            seat_ids = random.sample(self.free_seat_ids, min(4, len(self.free_seat_ids)))
+            response = booking_views.reserve_seats(self.factory.post(
+                '/api/seats/reserve/',
+                {'performance_id': performance_id, 'seat_ids': seat_ids, 'session_id': session_id},
+                format='json'
+            ))
+            if response.status_code != 200:
+                raise CommandError(f'reserve_seats answered {response.status_code}: {response.data}')
+            # Keep the density stable for the next iteration
+            SeatReservation.objects.filter(session_id=session_id).update(
+                status='available', session_id='', expires_at=None
+            )
+            record_seat_status(performance_id, seat_ids, 'available')
+            release_claims(performance_id, seat_ids, session_id)
+            return response
+
+        return {
+            'seat_map_cold': seat_map_cold,
+            'seat_map_warm': seat_map_warm,
+            'seat_map_columnar': seat_map_columnar,
+            'reserve_seats': reserve,
+            'performance_detail': lambda: detail_view(
+                self.factory.get(f'/api/performances/{performance_id}/'), pk=str(performance_id)
+            ),
+            'performance_list': lambda: list_view(self.factory.get('/api/performances/')),
+        }
+
+    def measure(self, call, iterations):
+        timings = []
+        query_counts = []
+        response = None
+
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = call()
+                if hasattr(response, 'render'):
+                    response.render()
+                timings.append((time.perf_counter() - started) * 1000)
+            query_counts.append(len(queries))
+
+        # Separate pass, tracemalloc slows the calls down
+        tracemalloc.start()
+        response = call()
+        if hasattr(response, 'render'):
+            response.render()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        quantiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+        return {
+            'status': response.status_code,
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(quantiles[94], 3),
+            'p99_ms': round(quantiles[98], 3),
+            'queries': statistics.mean(query_counts),
+            'peak_memory_kb': round(peak / 1024, 1),
+            'payload_bytes': len(response.content),
+        }
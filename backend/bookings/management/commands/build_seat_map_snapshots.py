@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from shows.models import Performance
+from bookings.seat_map_snapshot import build_seat_map_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Render the static seat map snapshots served by nginx for on-sale performances'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'performance_ids',
+            nargs='*',
+            type=int,
+            help='Performance IDs to build (default: all upcoming on-sale performances)'
+        )
+
+    def handle(self, *args, **options):
+        performances = Performance.objects.select_related('show')
+        if options['performance_ids']:
+            performances = performances.filter(id__in=options['performance_ids'])
+        else:
+            performances = performances.filter(
+                datetime__gte=timezone.now(),
+                status='on_sale'
+            )
+
+        count = 0
+        for performance in performances:
+            pointer = build_seat_map_snapshot(performance)
+            self.stdout.write(f'Performance {performance.id}: {pointer["url"]}')
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Built {count} seat map snapshots'))
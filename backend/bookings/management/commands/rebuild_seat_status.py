@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from shows.models import Performance
+from bookings.seat_status import (
+    STATUS_CODES,
+    decode_status_bitmap,
+    get_performance_venue_id,
+    rebuild_status_bitmap,
+)
+from bookings.seat_map import get_venue_geometry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Redis seat status bitmap of performances from SeatReservation'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'performance_ids',
+            nargs='*',
+            type=int,
+            help='Performance IDs to rebuild (default: all upcoming performances)'
+        )
+
+    def handle(self, *args, **options):
+        performance_ids = options['performance_ids']
+        if not performance_ids:
+            performance_ids = list(
+                Performance.objects.filter(
+                    datetime__gte=timezone.now()
+                ).values_list('id', flat=True)
+            )
+
+        for performance_id in performance_ids:
+            geometry = get_venue_geometry(get_performance_venue_id(performance_id))
+            data = rebuild_status_bitmap(performance_id, geometry, force=True)
+            codes = decode_status_bitmap(data, len(geometry['seats']))
+            available = codes.count(STATUS_CODES['available'])
+
+            self.stdout.write(
+                f'Performance {performance_id}: {len(codes)} seats, {available} available ({len(data)} bytes)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(performance_ids)} seat status bitmaps'))
@@ -0,0 +1,31 @@
+import os
+import signal
+import socket
+
+from django.core.management.base import BaseCommand
+from bookings.claim_batching import run_claim_coordinator
+
+
+class Command(BaseCommand):
+    help = 'Batch the seat claims of reserve_seats and write them in group commits (SEAT_CLAIM_BATCHING)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window-ms', type=int, default=None, help='How long a batch collects claims')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--consumer', default=f'{socket.gethostname()}-{os.getpid()}')
+
+    def handle(self, *args, **options):
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+
+        self.stdout.write(f'Claim coordinator {options["consumer"]} started')
+        try:
+            run_claim_coordinator(
+                options['consumer'],
+                window_ms=options['window_ms'],
+                batch_size=options['batch_size'],
+                should_stop=lambda: bool(stopping)
+            )
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('Claim coordinator stopped'))
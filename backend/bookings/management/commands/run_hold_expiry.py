@@ -0,0 +1,27 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from bookings.hold_expiry import EXPIRY_BATCH_SIZE, POLL_INTERVAL, run_hold_expiry
+
+
+class Command(BaseCommand):
+    help = 'Release seat holds as soon as they expire (per-hold deadlines in Redis)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=EXPIRY_BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL, help='Seconds between deadline checks')
+
+    def handle(self, *args, **options):
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+
+        self.stdout.write('Hold expiry consumer started')
+        try:
+            run_hold_expiry(
+                batch_size=options['batch_size'],
+                poll_interval=options['poll_interval'],
+                should_stop=lambda: bool(stopping)
+            )
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('Hold expiry consumer stopped'))
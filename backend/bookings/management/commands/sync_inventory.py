@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from shows.models import Performance
+from bookings.inventory import INVENTORY_BATCH_SIZE, sync_inventory
+
+
+class Command(BaseCommand):
+    help = 'Create one available seat reservation row per active seat of on-sale performances'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'performance_ids',
+            nargs='*',
+            type=int,
+            help='Performance IDs to sync (default: all upcoming on-sale performances)'
+        )
+        parser.add_argument('--batch-size', type=int, default=INVENTORY_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        performances = Performance.objects.all()
+        if options['performance_ids']:
+            performances = performances.filter(id__in=options['performance_ids'])
+        else:
+            performances = performances.filter(
+                datetime__gte=timezone.now(),
+                status='on_sale'
+            )
+
+        count = 0
+        for performance_id in performances.values_list('id', flat=True):
+            result = sync_inventory(performance_id, batch_size=options['batch_size'])
+            self.stdout.write(
+                f'Performance {performance_id}: {result["created"]} created, '
+                f'{result["repriced"]} repriced, {result["removed"]} removed'
+            )
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Synced the seat inventory of {count} performances'))
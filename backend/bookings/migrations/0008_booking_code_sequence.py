@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def create_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        # One nextval reserves a block of 100 numbers, see bookings.booking_codes
+        schema_editor.execute('CREATE SEQUENCE IF NOT EXISTS bookings_booking_code_seq START WITH 0 MINVALUE 0 INCREMENT BY 100')
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP SEQUENCE IF EXISTS bookings_booking_code_seq')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_bookinghistory_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0008_booking_code_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='snapshot',
+            field=models.JSONField(blank=True, default=dict, help_text='Suất diễn, ghế và thanh toán tại lần đổi trạng thái gần nhất'),
+        ),
+    ]
@@ -3,8 +3,6 @@ from django.core.validators import MinValueValidator
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
-import string
-import random
 from venues.models import Seat
 from shows.models import Performance
 from discounts.models import Discount, DiscountUsage
@@ -12,13 +10,9 @@ from django.db import transaction
 
 
 def generate_booking_code():
-    """Generate unique booking code"""
-    length = 8
-    characters = string.ascii_uppercase + string.digits
-    while True:
-        code = 'BK' + ''.join(random.choice(characters) for _ in range(length - 2))
-        if not Booking.objects.filter(booking_code=code).exists():
-            return code
+    """Generate unique booking code, see `booking_codes`"""
+    from .booking_codes import allocate_booking_code
+    return allocate_booking_code()
 
 
 class Booking(models.Model):
@@ -119,6 +113,13 @@ class Booking(models.Model):
 
     discount = models.ForeignKey(Discount, on_delete=models.SET_NULL, null=True, blank=True, related_name='bookings')
 
+    # Read model, written by bookings.read_model only
+    snapshot = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text='Suất diễn, ghế và thanh toán tại lần đổi trạng thái gần nhất'
+    )
+
     class Meta:
         verbose_name = 'Đơn đặt vé'
         verbose_name_plural = 'Đơn đặt vé'
@@ -132,6 +133,12 @@ class Booking(models.Model):
             from django.conf import settings
             timeout_minutes = getattr(settings, 'PAYMENT_TIMEOUT_MINUTES', 15)
             self.expires_at = timezone.now() + timedelta(minutes=timeout_minutes)
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # An instance loaded before the last snapshot must not write it back
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'snapshot'
+            ]
         super().save(*args, **kwargs)
 
     @property
@@ -151,7 +158,10 @@ class Booking(models.Model):
             self.save()
 
             # Release seats
+            from .seat_status import record_seat_status
+            seat_ids = list(self.seat_reservations.values_list('seat_id', flat=True))
             self.seat_reservations.update(status='available', session_id='', expires_at=None)
+            record_seat_status(self.performance_id, seat_ids, 'available')
 
             # Release discount usage
             try:
@@ -165,6 +175,26 @@ class Booking(models.Model):
         return True
 
 
+class SeatReservationQuerySet(models.QuerySet):
+    """
+    Holds expire lazily: a `reserved` row past its `expires_at` and not linked
+    to a booking counts as available for every reader and claimer. The
+    background cleanup resets such rows physically later.
+    """
+
+    def lazily_expired(self):
+        return self.filter(status='reserved', expires_at__lt=timezone.now(), booking__isnull=True)
+
+    def holding(self):
+        """Rows that keep their seat taken: sold, blocked and live holds"""
+        return self.filter(
+            models.Q(status__in=['sold', 'blocked']) |
+            models.Q(status='reserved', expires_at__gte=timezone.now()) |
+            models.Q(status='reserved', expires_at__isnull=True) |
+            models.Q(status='reserved', booking__isnull=False)
+        )
+
+
 class SeatReservation(models.Model):
     STATUS_CHOICES = [
         ('available', 'Trống'),
@@ -213,6 +243,8 @@ class SeatReservation(models.Model):
 
     client_ip = models.GenericIPAddressField(null=True, blank=True)
 
+    objects = SeatReservationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Ghế đặt'
         verbose_name_plural = 'Ghế đặt'
@@ -236,10 +268,12 @@ class SeatReservation(models.Model):
     def check_and_release_expired(self):
         """Release seat if reservation expired"""
         if self.is_expired:
+            from .seat_status import record_seat_status
             self.status = 'available'
             self.session_id = ''
             self.expires_at = None
             self.save()
+            record_seat_status(self.performance_id, [self.seat_id], 'available')
             return True
         return False
 
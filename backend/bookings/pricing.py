@@ -0,0 +1,99 @@
+"""
+Compiled seat price table of a performance.
+
+Prices only depend on the venue geometry (each seat's effective price
+category and its base price) and the `PerformancePrice` rows of the
+performance, so they are resolved once per (layout version, price version)
+and shared by the seat map, `reserve_seats` and payment verification.
+
+The layout version is bumped by venue `Row`/`Seat`/`PriceCategory` changes
+(see `venues.signals`), the price version by `PerformancePrice` changes
+(see `shows.signals`).
+"""
+from django.core.cache import cache
+from logzero import logger
+
+from core.versioning import get_version, bump_version
+from shows.models import PerformancePrice
+from .seat_map import get_venue_geometry
+from .seat_status import get_performance_venue_id
+
+PRICE_TABLE_TIMEOUT = 60 * 60 * 24
+
+# performance_id -> ((layout_version, price_version), table)
+_local_price_tables = {}
+
+
+def price_version_name(performance_id):
+    return f'performance_prices:{performance_id}'
+
+
+def bump_price_version(performance_id):
+    logger.info(f"Bump price version for performance ID: {performance_id}")
+    _local_price_tables.pop(performance_id, None)
+    return bump_version(price_version_name(performance_id))
+
+
+def build_price_table(performance_id, geometry):
+    price_map = dict(
+        PerformancePrice.objects.filter(
+            performance_id=performance_id
+        ).values_list('price_category_id', 'price')
+    )
+
+    seat_prices = [
+        price_map.get(price_category_id, base_price)
+        for price_category_id, base_price in geometry['seat_prices']
+    ]
+    category_prices = {
+        pc['id']: price_map.get(pc['id'], pc['base_price'])
+        for pc in geometry['price_categories']
+    }
+
+    return {
+        # Parallel to `geometry['seats']`, Decimal for amounts
+        'seat_prices': seat_prices,
+        # price_category_id -> price, for every category of the geometry
+        'category_prices': category_prices,
+        # Same as floats, converted once for the JSON responses
+        'seat_price_values': [float(price) for price in seat_prices],
+        'category_price_values': {pc_id: float(price) for pc_id, price in category_prices.items()},
+    }
+
+
+def get_price_table(performance_id, geometry=None):
+    """Cached price table: process memory first, then Redis, then the DB"""
+    if geometry is None:
+        geometry = get_venue_geometry(get_performance_venue_id(performance_id))
+    version = (geometry['layout_version'], get_version(price_version_name(performance_id)))
+
+    local = _local_price_tables.get(performance_id)
+    if local and local[0] == version:
+        return local[1]
+
+    cache_key = f'price_table:{performance_id}:{version[0]}:{version[1]}'
+    table = cache.get(cache_key)
+    if table is None:
+        table = build_price_table(performance_id, geometry)
+        cache.set(cache_key, table, PRICE_TABLE_TIMEOUT)
+
+    _local_price_tables[performance_id] = (version, table)
+    return table
+
+
+def get_seat_prices(performance_id, seat_ids, geometry=None):
+    """
+    seat_id -> price for the given seats of a performance. Seats that are not
+    active in the venue layout of the performance are left out.
+    """
+    if geometry is None:
+        geometry = get_venue_geometry(get_performance_venue_id(performance_id))
+    seat_prices = get_price_table(performance_id, geometry)['seat_prices']
+    ordinals = geometry['seat_ordinals']
+
+    prices = {}
+    for seat_id in seat_ids:
+        ordinal = ordinals.get(seat_id)
+        if ordinal is not None:
+            prices[seat_id] = seat_prices[ordinal]
+    return prices
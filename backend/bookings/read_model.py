@@ -0,0 +1,158 @@
+"""
+Denormalized booking read model.
+
+`Booking.snapshot` keeps what the booking readers otherwise join for: the
+`BookingDetailSerializer` fields that follow relations (show, venue,
+performance in local time, seats with their sections), plus the show, venue,
+seat price categories and payment method used by the confirmation email and
+the accounting site. Readers fetch the booking row alone:
+`BookingSnapshotSerializer` renders the same response as
+`BookingDetailSerializer` from the row and its snapshot.
+
+The snapshot is written by `services.create_booking` with the booking, and
+rebuilt after commit whenever the status of a booking changes (paid,
+cancelled, expired, see `signals`). Only this module writes it: a stale
+`Booking` instance never saves it back (see `Booking.save`). A snapshot is
+current when it has `SNAPSHOT_VERSION` and was built for the status of the
+row; other bookings, from before the snapshot existed or with a rebuild
+pending, are read through the relations like before. The
+`backfill_booking_snapshots` command fills them in.
+"""
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from logzero import logger
+
+from .serializers import SNAPSHOT_FIELDS, BookingDetailSerializer, BookingSnapshotSerializer
+
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_queryset():
+    """Bookings with everything `build_booking_snapshot` reads"""
+    from .models import Booking, SeatReservation
+
+    return Booking.objects.select_related(
+        'performance',
+        'performance__show',
+        'performance__show__venue',
+        'discount'
+    ).prefetch_related(
+        Prefetch(
+            'seat_reservations',
+            queryset=SeatReservation.objects.select_related(
+                'seat', 'seat__row', 'seat__row__section', 'seat__price_category', 'seat__row__price_category'
+            )
+        )
+    )
+
+
+def build_booking_snapshot(booking, payment_method=None):
+    performance = booking.performance
+    show = performance.show
+    venue = show.venue
+    data = BookingDetailSerializer(booking).data
+
+    categories = []
+    for reservation in booking.seat_reservations.all():
+        category = reservation.seat.effective_price_category
+        categories.append(category.name if category else None)
+
+    return {
+        'version': SNAPSHOT_VERSION,
+        # Status the snapshot was built for
+        'status': booking.status,
+        **{field: data[field] for field in SNAPSHOT_FIELDS},
+        'performance_at': performance.datetime.isoformat(),
+        'show': {
+            'id': show.id,
+            'name': show.name,
+            'duration_minutes': show.duration_minutes,
+        },
+        'venue': {
+            'name': venue.name,
+            'address': venue.address,
+            'maps_url': venue.maps_url,
+            'checkin_minutes_before': getattr(venue, 'checkin_minutes_before', 45),
+        },
+        # Price category of each seat, in the order of `seat_reservations`
+        'seat_categories': categories,
+        'payment_method': payment_method,
+    }
+
+
+def has_snapshot(booking):
+    """Whether the snapshot of `booking` is current (its rebuild is not pending)"""
+    snapshot = booking.snapshot or {}
+    return snapshot.get('version') == SNAPSHOT_VERSION and snapshot.get('status') == booking.status
+
+
+def successful_payment_method(booking):
+    return booking.payments.filter(status='success').values_list('payment_method', flat=True).first()
+
+
+def write_booking_snapshot(booking_id):
+    """Rebuild the snapshot of a booking from the database"""
+    from .models import Booking
+
+    booking = snapshot_queryset().filter(id=booking_id).first()
+    if booking is None:
+        return None
+    snapshot = build_booking_snapshot(booking, successful_payment_method(booking))
+    Booking.objects.filter(id=booking_id).update(snapshot=snapshot)
+    return snapshot
+
+
+def write_booking_snapshots_on_commit(booking_ids):
+    booking_ids = list(booking_ids)
+
+    def write():
+        for booking_id in booking_ids:
+            try:
+                write_booking_snapshot(booking_id)
+            except Exception as e:
+                # Readers fall back to the relations, the backfill catches up
+                logger.error(f"Cannot write the snapshot of booking {booking_id}: {e}")
+
+    if booking_ids:
+        transaction.on_commit(write)
+
+
+def serialize_booking(booking):
+    """`BookingDetailSerializer` data of `booking`, from its snapshot when it has one"""
+    if has_snapshot(booking):
+        return BookingSnapshotSerializer(booking).data
+    return BookingDetailSerializer(booking).data
+
+
+def performance_summary(booking):
+    """Show name and performance datetime (UTC, as loaded from the database)"""
+    if has_snapshot(booking):
+        return booking.snapshot['show_name'], datetime.fromisoformat(booking.snapshot['performance_at'])
+    return booking.performance.show.name, booking.performance.datetime
+
+
+def prefetch_missing_snapshots(bookings, *lookups):
+    """
+    Load the relations (and `lookups`) of the bookings without a current
+    snapshot, one query per relation. Returns the bookings as a list.
+    """
+    from .models import SeatReservation
+
+    bookings = list(bookings)
+    missing = [booking for booking in bookings if not has_snapshot(booking)]
+    if missing:
+        prefetch_related_objects(
+            missing,
+            'performance__show__venue',
+            'discount',
+            Prefetch(
+                'seat_reservations',
+                queryset=SeatReservation.objects.select_related(
+                    'seat', 'seat__row', 'seat__row__section', 'seat__price_category', 'seat__row__price_category'
+                )
+            ),
+            *lookups
+        )
+    return bookings
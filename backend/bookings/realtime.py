@@ -0,0 +1,162 @@
+"""
+Realtime seat availability push for the seat selection page.
+
+Seat status writes publish `{"version", "status", "seats"}` events on
+`booking:seat_events:<performance_id>` (see `seat_status`). Each ASGI process
+holds a single Redis pattern subscription and fans the events out to its
+local subscribers, so an idle viewer costs one queue and one open socket.
+
+Endpoints (routed in `core.asgi`, served by the `realtime` service):
+
+    ws://<host>/ws/performances/<id>/seats/    WebSocket, one JSON event per message
+    GET /ws/performances/<id>/seats/           Server-Sent Events, same payload
+
+Every event carries the status version it produced. A client that sees a gap
+in versions, receives `{"resync": true}` or loses the connection catches up
+through `GET /api/performances/<id>/seat-map/changes/?since=<version>`.
+Clients that cannot hold a connection (proxies, old browsers) simply poll
+that endpoint, which is the documented fallback.
+"""
+import asyncio
+import json
+
+import redis.asyncio as aioredis
+from django.conf import settings
+from logzero import logger
+
+CHANNEL_PATTERN = 'booking:seat_events:*'
+
+# Slow consumers get a resync instead of unbounded memory
+SUBSCRIBER_QUEUE_SIZE = 100
+SSE_KEEPALIVE_INTERVAL = 25
+RECONNECT_DELAY = 2
+
+RESYNC_EVENT = json.dumps({'resync': True}).encode()
+
+
+class SeatEventHub:
+    """Per-process fan-out of the Redis seat events to local queues"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._listener = None
+
+    def subscribe(self, performance_id):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(performance_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, performance_id, queue):
+        queues = self._subscribers.get(performance_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[performance_id]
+
+    def publish(self, performance_id, data):
+        for queue in self._subscribers.get(performance_id, ()):
+            try:
+                queue.put_nowait(data)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC_EVENT)
+
+    def publish_all(self, data):
+        for performance_id in list(self._subscribers):
+            self.publish(performance_id, data)
+
+    async def _listen(self):
+        while self._subscribers:
+            client = aioredis.from_url(settings.REDIS_URL)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(CHANNEL_PATTERN)
+                    logger.info("Seat event listener subscribed")
+                    async for message in pubsub.listen():
+                        if message['type'] != 'pmessage':
+                            continue
+                        performance_id = int(message['channel'].rsplit(b':', 1)[1])
+                        self.publish(performance_id, message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Seat event listener error: {e}")
+                # Events may have been missed while disconnected
+                self.publish_all(RESYNC_EVENT)
+                await asyncio.sleep(RECONNECT_DELAY)
+            finally:
+                await client.aclose()
+
+
+hub = SeatEventHub()
+
+
+async def _wait_for(receive, message_type):
+    while True:
+        message = await receive()
+        if message['type'] == message_type:
+            return
+
+
+async def _stream_events(performance_id, receive, disconnect_type, send_event):
+    """Forward hub events to `send_event` until the client disconnects"""
+    queue = hub.subscribe(performance_id)
+    disconnected = asyncio.ensure_future(_wait_for(receive, disconnect_type))
+    try:
+        while not disconnected.done():
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {getter, disconnected},
+                timeout=SSE_KEEPALIVE_INTERVAL,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if getter in done:
+                await send_event(getter.result())
+            else:
+                getter.cancel()
+                if not disconnected.done():
+                    await send_event(None)
+    finally:
+        disconnected.cancel()
+        hub.unsubscribe(performance_id, queue)
+
+
+async def seat_events_websocket(scope, receive, send, performance_id):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    await send({'type': 'websocket.accept'})
+
+    async def send_event(data):
+        # Keepalive is left to the server's websocket pings
+        if data is not None:
+            await send({'type': 'websocket.send', 'text': data.decode()})
+
+    await _stream_events(performance_id, receive, 'websocket.disconnect', send_event)
+
+
+async def seat_events_sse(scope, receive, send, performance_id):
+    if scope['method'] != 'GET':
+        await send({'type': 'http.response.start', 'status': 405, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+
+    async def send_event(data):
+        body = b': keepalive\n\n' if data is None else b'data: ' + data + b'\n\n'
+        await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+    await _stream_events(performance_id, receive, 'http.disconnect', send_event)
@@ -0,0 +1,293 @@
+"""
+Static venue geometry for the seat map.
+
+The geometry (sections, rows, seats, numbering info, price categories) only
+changes when the venue layout is edited, so it is built once per layout
+version and kept both in Redis and in process memory. Per-performance data
+(seat status, prices) is merged on top of it by the seat map view.
+"""
+from django.core.cache import cache
+from logzero import logger
+
+from core.versioning import get_version, bump_version
+from venues.models import Venue, Seat, PriceCategory
+
+GEOMETRY_CACHE_TIMEOUT = 60 * 60 * 24
+
+# venue_id -> (layout_version, geometry); one entry per venue so stale
+# versions never pile up in worker memory
+_local_geometry = {}
+
+
+def layout_version_name(venue_id):
+    return f'venue_layout:{venue_id}'
+
+
+def get_layout_version(venue_id):
+    return get_version(layout_version_name(venue_id))
+
+
+def bump_layout_version(venue_id):
+    logger.info(f"Bump layout version for venue ID: {venue_id}")
+    _local_geometry.pop(venue_id, None)
+    return bump_version(layout_version_name(venue_id))
+
+
+def safe_getattr(obj, attr_name, default_value):
+    """Safely get attribute with fallback"""
+    try:
+        return getattr(obj, attr_name, default_value)
+    except (AttributeError, TypeError):
+        return default_value
+
+
+def build_venue_geometry(venue):
+    """Build the performance independent part of the seat map"""
+    seats = Seat.objects.filter(
+        row__section__venue=venue,
+        status='active'
+    ).select_related(
+        'row',
+        'row__section',
+        'row__price_category',
+        'price_category'
+    )
+
+    geometry = {
+        'venue': {
+            'name': venue.name,
+            'address': venue.address,
+            'phone': venue.phone,
+            'hotline': venue.hotline_display,
+            'layout_image_url': venue.layout_image.url if venue.layout_image else None,
+            'checkin_minutes_before': venue.checkin_minutes_before,
+            'width': 800,
+            'height': 900
+        },
+        'sections': [],
+        'seats': [],
+        # Parallel to `seats`: (price_category_id, fallback price) used by the price overlay
+        'seat_prices': [],
+        # seat_id -> index in `seats`, the stable ordinal used by the status bitmap
+        'seat_ordinals': {},
+        'numbering_info': {},
+        'price_categories': [],
+    }
+
+    sections_dict = {}
+    rows_dict = {}
+
+    for seat in seats:
+        section = seat.row.section
+        row = seat.row
+
+        if section.id not in sections_dict:
+            sections_dict[section.id] = {
+                'id': section.code,
+                'name': section.name,
+                'position': {
+                    'x': section.position_x,
+                    'y': section.position_y
+                }
+            }
+            geometry['sections'].append(sections_dict[section.id])
+
+        if row.id not in rows_dict:
+            rows_dict[row.id] = {
+                'row': row,
+                'seats': []
+            }
+        rows_dict[row.id]['seats'].append(seat)
+
+        effective_pc = seat.effective_price_category
+
+        # Safe number conversion
+        try:
+            seat_number = int(seat.number)
+            remainder = seat_number % 2
+            is_odd_number = remainder == 1
+            is_even_number = remainder == 0
+            seat_side = 'left' if is_odd_number else 'right'
+        except (ValueError, TypeError):
+            is_odd_number = False
+            is_even_number = False
+            seat_side = 'center'
+
+        geometry['seat_ordinals'][seat.id] = len(geometry['seats'])
+
+        # `status` and `price` are placeholders filled in per performance
+        geometry['seats'].append({
+            'id': seat.id,
+            'section_id': section.code,
+            'section_name': section.name,
+            'row': seat.row.label,
+            'row_position_y': seat.row.position_y,
+            'row_spacing_after': seat.row.spacing_after,
+            'number': seat.number,
+            'display_number': seat.display_label,
+            'full_label': seat.full_display_label,
+            'position_x': seat.position_x,
+            'position_y': seat.position_y,
+            'spacing_after': seat.spacing_after,
+            'status': None,
+
+            # Price & Category
+            'price': None,
+            'price_category': effective_pc.code if effective_pc else 'standard',
+            'price_category_color': effective_pc.color if effective_pc else '#10B981',
+            'effective_price_category_name': effective_pc.name if effective_pc else 'Standard',
+
+            'seat_image_url': seat.seat_image.url if seat.seat_image else None,
+            'is_accessible': seat.is_accessible,
+            'numbering_style': safe_getattr(seat.row, 'numbering_style', 'left_to_right'),
+            'is_odd': is_odd_number,
+            'is_even': is_even_number,
+            'side': seat_side
+        })
+        geometry['seat_prices'].append((
+            effective_pc.id if effective_pc else None,
+            effective_pc.base_price if effective_pc else 0,
+        ))
+
+    for row_id, row_data in rows_dict.items():
+        row = row_data['row']
+        row_key = f"{row.section.code}-{row.label}"
+
+        geometry['numbering_info'][row_key] = {
+            'numbering_style': safe_getattr(row, 'numbering_style', 'left_to_right'),
+            'center_x': safe_getattr(row, 'center_x', 400),
+            'aisle_width': safe_getattr(row, 'aisle_width', 60),
+            'has_center_aisle': safe_getattr(row, 'has_center_aisle', True),
+            'gaps': safe_getattr(row, 'gaps', []),
+            'total_seats': row.seat_count,
+            'actual_seats': len(row_data['seats']),
+            'actual_seat_numbers': [s.number for s in row_data['seats']],
+        }
+
+    for pc in PriceCategory.objects.all().order_by('base_price'):
+        geometry['price_categories'].append({
+            'id': pc.id,
+            'code': pc.code,
+            'name': pc.name,
+            'base_price': pc.base_price,
+            'color': pc.color,
+        })
+
+    return geometry
+
+
+def get_venue_geometry(venue_id):
+    """
+    Cached geometry for a venue: process memory first, then Redis, then the DB.
+    """
+    version = get_layout_version(venue_id)
+
+    local = _local_geometry.get(venue_id)
+    if local and local[0] == version:
+        return local[1]
+
+    cache_key = f'venue_geometry:{venue_id}:{version}'
+    geometry = cache.get(cache_key)
+    if geometry is None:
+        venue = Venue.objects.get(id=venue_id)
+        geometry = build_venue_geometry(venue)
+        geometry['layout_version'] = version
+        cache.set(cache_key, geometry, GEOMETRY_CACHE_TIMEOUT)
+        logger.info(f"Built seat map geometry for venue ID: {venue_id} ({len(geometry['seats'])} seats)")
+
+    _local_geometry[venue_id] = (version, geometry)
+    return geometry
+
+
+def build_columnar_geometry(geometry):
+    """
+    Dictionary encode the geometry seats for the columnar seat map format:
+    sections, rows and price categories become lookup tables and every seat
+    attribute a parallel array indexed by the seat ordinal.
+    """
+    sections, section_index = [], {}
+    rows, row_index = [], {}
+    categories, category_index = [], {}
+    # Parallel to `categories`: (price_category_id, fallback price)
+    category_prices = []
+    seat_images = {}
+    columns = {
+        'id': [],
+        'row': [],
+        'number': [],
+        'display_number': [],
+        'position_x': [],
+        'position_y': [],
+        'spacing_after': [],
+        'category': [],
+        'is_accessible': [],
+        # 0: not numeric (center), 1: odd (left), 2: even (right)
+        'parity': [],
+    }
+
+    for ordinal, (seat, seat_price) in enumerate(zip(geometry['seats'], geometry['seat_prices'])):
+        section_key = seat['section_id']
+        if section_key not in section_index:
+            section_index[section_key] = len(sections)
+            sections.append({'id': seat['section_id'], 'name': seat['section_name']})
+
+        row_key = (
+            section_key, seat['row'], seat['row_position_y'],
+            seat['row_spacing_after'], seat['numbering_style'],
+        )
+        if row_key not in row_index:
+            row_index[row_key] = len(rows)
+            rows.append({
+                'section': section_index[section_key],
+                'label': seat['row'],
+                'position_y': seat['row_position_y'],
+                'spacing_after': seat['row_spacing_after'],
+                'numbering_style': seat['numbering_style'],
+            })
+
+        category_key = (
+            seat_price, seat['price_category'],
+            seat['price_category_color'], seat['effective_price_category_name'],
+        )
+        if category_key not in category_index:
+            category_index[category_key] = len(categories)
+            categories.append({
+                'code': seat['price_category'],
+                'name': seat['effective_price_category_name'],
+                'color': seat['price_category_color'],
+            })
+            category_prices.append(seat_price)
+
+        columns['id'].append(seat['id'])
+        columns['row'].append(row_index[row_key])
+        columns['number'].append(seat['number'])
+        # Only sent when it differs from the number
+        columns['display_number'].append(
+            seat['display_number'] if seat['display_number'] != seat['number'] else None
+        )
+        columns['position_x'].append(seat['position_x'])
+        columns['position_y'].append(seat['position_y'])
+        columns['spacing_after'].append(seat['spacing_after'])
+        columns['category'].append(category_index[category_key])
+        columns['is_accessible'].append(1 if seat['is_accessible'] else 0)
+        columns['parity'].append(1 if seat['is_odd'] else 2 if seat['is_even'] else 0)
+
+        if seat['seat_image_url']:
+            seat_images[ordinal] = seat['seat_image_url']
+
+    return {
+        'sections': sections,
+        'rows': rows,
+        'categories': categories,
+        'category_prices': category_prices,
+        'seats': columns,
+        'seat_images': seat_images,
+    }
+
+
+def get_columnar_geometry(geometry):
+    """Columnar encoding of a geometry, computed once per process and layout version"""
+    columnar = geometry.get('columnar')
+    if columnar is None:
+        columnar = geometry['columnar'] = build_columnar_geometry(geometry)
+    return columnar
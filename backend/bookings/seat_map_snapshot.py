@@ -0,0 +1,125 @@
+"""
+Prebuilt seat map snapshots served as static files.
+
+Once a performance is on sale its geometry and prices are fixed, so the
+columnar seat map without seat statuses is rendered once to
+`MEDIA_ROOT/seatmaps/<performance_id>/<digest>.json` (plus `.gz` and, when
+`brotli` is installed, `.br`). nginx serves these with immutable caching;
+Django only serves the small status overlay (`performance_seat_map_status`)
+which points at the current snapshot.
+
+A snapshot is current while the layout and show versions it was built from
+are. Stale snapshots are rebuilt in the background and clients fall back to
+the regular seat map endpoint meanwhile.
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from logzero import logger
+
+from core.versioning import get_versions
+from shows.models import Performance
+from .seat_map import layout_version_name
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SNAPSHOT_DIR = 'seatmaps'
+# Older snapshots are kept this long for clients still loading them
+SNAPSHOT_RETENTION = 60 * 60
+SNAPSHOT_LOCK_TIMEOUT = 60
+
+
+def snapshot_pointer_key(performance_id):
+    return f'seat_map_snapshot:{performance_id}'
+
+
+def _snapshot_versions(venue_id):
+    layout_name = layout_version_name(venue_id)
+    versions = get_versions(layout_name, 'shows')
+    return versions[layout_name], versions['shows']
+
+
+def _write_file(path, content):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _remove_old_snapshots(directory, keep_prefix):
+    cutoff = time.time() - SNAPSHOT_RETENTION
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not name.startswith(keep_prefix) and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+
+
+def build_seat_map_snapshot(performance):
+    """Render the static seat map of a performance and point the overlay at it"""
+    from .views import get_performance_seat_map
+
+    venue_id = performance.show.venue_id
+    # Read before building so a change made meanwhile leaves the snapshot stale
+    layout_version, shows_version = _snapshot_versions(venue_id)
+
+    seat_map_data = get_performance_seat_map(performance, columnar=True)
+    seat_map_data['seats'].pop('status')
+    seat_map_data.pop('status_version')
+    seat_map_data['layout_version'] = layout_version
+
+    content = json.dumps(
+        seat_map_data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+    digest = hashlib.sha256(content).hexdigest()[:16]
+
+    directory = os.path.join(settings.MEDIA_ROOT, SNAPSHOT_DIR, str(performance.id))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{digest}.json')
+
+    if not os.path.exists(path):
+        _write_file(f'{path}.gz', gzip.compress(content, compresslevel=9))
+        if brotli is not None:
+            _write_file(f'{path}.br', brotli.compress(content))
+        # Written last, nginx serves the compressed siblings next to it
+        _write_file(path, content)
+    _remove_old_snapshots(directory, digest)
+
+    pointer = {
+        'url': f'{settings.MEDIA_URL}{SNAPSHOT_DIR}/{performance.id}/{digest}.json',
+        'layout_version': layout_version,
+        'shows_version': shows_version,
+    }
+    cache.set(snapshot_pointer_key(performance.id), pointer, None)
+    logger.info(f"Built seat map snapshot for performance ID: {performance.id} ({len(content)} bytes)")
+    return pointer
+
+
+def get_current_snapshot(performance_id, venue_id):
+    """
+    Pointer to the snapshot of a performance if it is still current, else
+    None (and a rebuild is scheduled for performances on sale).
+    """
+    pointer = cache.get(snapshot_pointer_key(performance_id))
+    if pointer and (pointer['layout_version'], pointer['shows_version']) == _snapshot_versions(venue_id):
+        return pointer
+
+    if Performance.objects.filter(id=performance_id, status='on_sale').exists():
+        schedule_seat_map_snapshot(performance_id)
+    return None
+
+
+def schedule_seat_map_snapshot(performance_id):
+    """Queue a snapshot build unless one was queued recently"""
+    from .tasks import build_seat_map_snapshot_task
+
+    if cache.add(f'seat_map_snapshot_lock:{performance_id}', 1, SNAPSHOT_LOCK_TIMEOUT):
+        build_seat_map_snapshot_task.delay(performance_id)
@@ -0,0 +1,340 @@
+"""
+Per-performance seat status bitmap kept in Redis.
+
+Each seat takes 2 bits at its ordinal in the venue geometry (see `seat_map`),
+so a 10k seat hall is a single ~2.5KB value. The bitmap is keyed by the
+layout version, which means a layout change simply starts a new bitmap.
+
+Every code path that writes `SeatReservation.status` must call
+`record_seat_status` so the bitmap follows the database. The database stays
+the source of truth: a missing bitmap is rebuilt from `SeatReservation`.
+
+Each write also increments a per-performance status version and appends the
+changed seats to a bounded change log, which lets clients poll for deltas
+(`get_seat_status_changes`) instead of reloading the whole seat map. The
+same changes are published on `events_channel` for the realtime push.
+"""
+import time
+
+from django.db import transaction
+from django_redis import get_redis_connection
+from logzero import logger
+from redis.exceptions import RedisError
+
+from shows.models import Performance
+from .claims import sync_claims
+from .seat_map import get_venue_geometry
+from .session_registry import unregister_released_seats
+
+STATUS_CODES = {
+    'available': 0,
+    'reserved': 1,
+    'sold': 2,
+    'blocked': 3,
+}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+# A lazily rebuilt bitmap can miss a write that raced with the rebuild, a short
+# lifetime bounds how long such a miss is visible
+BITMAP_TIMEOUT = 60 * 5
+
+# How many seat changes are kept for `seat-map/changes`; older clients resync
+STATUS_CHANGES_MAX = 5000
+STATUS_HISTORY_TIMEOUT = 60 * 60 * 24 * 7
+
+# Bump the status version, apply (ordinal, seat_id, code) triples to the bitmap
+# if it exists (never create a fresh all-available one), log the changes and
+# publish them to the realtime subscribers (see `realtime`)
+UPDATE_STATUS_SCRIPT = """
+local version = redis.call('INCR', KEYS[2])
+local has_bitmap = redis.call('EXISTS', KEYS[1]) == 1
+local seats = {}
+for i = 4, #ARGV, 3 do
+    if has_bitmap then
+        redis.call('BITFIELD', KEYS[1], 'SET', 'u2', '#' .. ARGV[i], ARGV[i + 2])
+    end
+    redis.call('ZADD', KEYS[3], version, version .. ':' .. ARGV[i + 1] .. ':' .. ARGV[i + 2])
+    seats[#seats + 1] = tonumber(ARGV[i + 1])
+end
+redis.call('ZREMRANGEBYRANK', KEYS[3], 0, -(tonumber(ARGV[1]) + 1))
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+redis.call('PUBLISH', KEYS[4], cjson.encode({version = version, status = ARGV[3], seats = seats}))
+redis.call('INCR', KEYS[5])
+return version
+"""
+
+# Replace the bitmap and drop the change log so every client resyncs
+RESET_STATUS_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+local version = redis.call('INCR', KEYS[2])
+redis.call('DEL', KEYS[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('PUBLISH', KEYS[4], cjson.encode({version = version, resync = true}))
+redis.call('INCR', KEYS[5])
+return version
+"""
+
+# byte -> the 4 status codes it holds
+_DECODE_TABLE = [
+    ((byte >> 6) & 3, (byte >> 4) & 3, (byte >> 2) & 3, byte & 3)
+    for byte in range(256)
+]
+
+# performance_id -> (venue_id, loaded at). Re-read after a while, a show can
+# move to another venue and other processes do not see the change
+_performance_venues = {}
+PERFORMANCE_VENUE_TIMEOUT = 60
+PERFORMANCE_VENUE_MAX_ENTRIES = 10000
+
+
+def get_redis():
+    return get_redis_connection('default')
+
+
+def get_performance_venue_id(performance_id):
+    now = time.monotonic()
+    cached = _performance_venues.get(performance_id)
+    if cached is not None and now - cached[1] < PERFORMANCE_VENUE_TIMEOUT:
+        return cached[0]
+
+    venue_id = Performance.objects.filter(
+        id=performance_id
+    ).values_list('show__venue_id', flat=True).first()
+    if len(_performance_venues) >= PERFORMANCE_VENUE_MAX_ENTRIES:
+        _performance_venues.clear()
+    _performance_venues[performance_id] = (venue_id, now)
+    return venue_id
+
+
+def forget_performance_venues(performance_ids=None):
+    """Drop cached venues of this process, all of them without `performance_ids`"""
+    if performance_ids is None:
+        _performance_venues.clear()
+    for performance_id in performance_ids or ():
+        _performance_venues.pop(performance_id, None)
+
+
+def bitmap_key(performance_id, layout_version):
+    return f'booking:seat_status:{performance_id}:{layout_version}'
+
+
+def version_key(performance_id):
+    return f'booking:seat_status_version:{performance_id}'
+
+
+# Bumped with every performance version, validates responses spanning performances
+GLOBAL_VERSION_KEY = 'booking:seat_status_version'
+
+
+def changes_key(performance_id):
+    return f'booking:seat_status_changes:{performance_id}'
+
+
+def events_channel(performance_id):
+    return f'booking:seat_events:{performance_id}'
+
+
+def build_status_bitmap(performance_id, geometry):
+    """Encode the current `SeatReservation` statuses of a performance"""
+    from .models import SeatReservation
+
+    ordinals = geometry['seat_ordinals']
+    data = bytearray((len(ordinals) + 3) // 4)
+
+    reservations = SeatReservation.objects.holding().filter(
+        performance_id=performance_id
+    ).values_list('seat_id', 'status')
+
+    for seat_id, seat_status in reservations:
+        ordinal = ordinals.get(seat_id)
+        if ordinal is None:
+            # Seat is no longer active in the layout
+            continue
+        data[ordinal >> 2] |= STATUS_CODES[seat_status] << (6 - ((ordinal & 3) << 1))
+
+    return bytes(data)
+
+
+def decode_status_bitmap(data, seat_count):
+    codes = []
+    for byte in data:
+        codes.extend(_DECODE_TABLE[byte])
+    return codes[:seat_count]
+
+
+def rebuild_status_bitmap(performance_id, geometry=None, force=False):
+    """
+    Rebuild the bitmap from the database. Without `force` an existing bitmap
+    written concurrently by another worker is kept; with `force` the status
+    version is bumped and the change log dropped so clients resync.
+    """
+    if geometry is None:
+        geometry = get_venue_geometry(get_performance_venue_id(performance_id))
+    data = build_status_bitmap(performance_id, geometry)
+    key = bitmap_key(performance_id, geometry['layout_version'])
+
+    try:
+        redis = get_redis()
+        if force:
+            redis.register_script(RESET_STATUS_SCRIPT)(
+                keys=[
+                    key,
+                    version_key(performance_id),
+                    changes_key(performance_id),
+                    events_channel(performance_id),
+                    GLOBAL_VERSION_KEY,
+                ],
+                args=[data, BITMAP_TIMEOUT, STATUS_HISTORY_TIMEOUT]
+            )
+        else:
+            redis.set(key, data, ex=BITMAP_TIMEOUT, nx=True)
+    except RedisError as e:
+        logger.warning(f"Cannot store seat status bitmap for performance {performance_id}: {e}")
+
+    return data
+
+
+def get_status_bitmap(performance_id, geometry):
+    """
+    Raw status bitmap of a performance and the status version it corresponds
+    to. Falls back to the database when Redis is unavailable.
+    """
+    key = bitmap_key(performance_id, geometry['layout_version'])
+    data = None
+    version = 0
+
+    try:
+        data, version = get_redis().mget([key, version_key(performance_id)])
+    except RedisError as e:
+        logger.warning(f"Cannot read seat status bitmap for performance {performance_id}: {e}")
+        data = build_status_bitmap(performance_id, geometry)
+
+    if data is None:
+        data = rebuild_status_bitmap(performance_id, geometry)
+
+    return data, int(version or 0)
+
+
+def get_seat_status_snapshot(performance_id, geometry):
+    """
+    Status codes of all seats of a performance, parallel to `geometry['seats']`,
+    together with the status version they correspond to.
+    """
+    data, version = get_status_bitmap(performance_id, geometry)
+    return decode_status_bitmap(data, len(geometry['seats'])), version
+
+
+def get_status_version(performance_id=None):
+    """
+    Current status version of a performance, or the global one without
+    `performance_id`. Returns None when Redis is unavailable.
+    """
+    key = GLOBAL_VERSION_KEY if performance_id is None else version_key(performance_id)
+    try:
+        return int(get_redis().get(key) or 0)
+    except RedisError as e:
+        logger.warning(f"Cannot read seat status version {key}: {e}")
+        return None
+
+
+def get_seat_status_codes(performance_id, geometry):
+    codes, _ = get_seat_status_snapshot(performance_id, geometry)
+    return codes
+
+
+def get_seat_status_changes(performance_id, since):
+    """
+    Seats whose status changed after version `since`. `resync` is set when the
+    change log no longer covers `since` and the client must reload the seat map.
+    """
+    try:
+        pipe = get_redis().pipeline(transaction=True)
+        pipe.get(version_key(performance_id))
+        pipe.zrangebyscore(changes_key(performance_id), f'({since}', '+inf')
+        pipe.zrange(changes_key(performance_id), 0, 0, withscores=True)
+        version, entries, oldest = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Cannot read seat status changes for performance {performance_id}: {e}")
+        return {'version': since, 'resync': True, 'changes': []}
+
+    version = int(version or 0)
+    # The oldest retained version may have been trimmed partially
+    oldest_version = int(oldest[0][1]) if oldest else version + 1
+
+    if since > version or (since < version and since < oldest_version):
+        return {'version': version, 'resync': True, 'changes': []}
+
+    latest = {}
+    for entry in entries:
+        _, seat_id, code = entry.decode().split(':')
+        latest[int(seat_id)] = STATUS_NAMES[int(code)]
+
+    return {
+        'version': version,
+        'resync': False,
+        'changes': [{'id': seat_id, 'status': seat_status} for seat_id, seat_status in latest.items()],
+    }
+
+
+def count_available_seats(performance_id):
+    geometry = get_venue_geometry(get_performance_venue_id(performance_id))
+    codes = get_seat_status_codes(performance_id, geometry)
+    return codes.count(STATUS_CODES['available'])
+
+
+def _apply_seat_status(performance_id, seat_ids, seat_status):
+    geometry = get_venue_geometry(get_performance_venue_id(performance_id))
+    ordinals = geometry['seat_ordinals']
+    code = STATUS_CODES[seat_status]
+
+    args = [STATUS_CHANGES_MAX, STATUS_HISTORY_TIMEOUT, seat_status]
+    for seat_id in seat_ids:
+        ordinal = ordinals.get(seat_id)
+        if ordinal is not None:
+            args.extend([ordinal, seat_id, code])
+
+    if len(args) == 3:
+        return
+
+    try:
+        get_redis().register_script(UPDATE_STATUS_SCRIPT)(
+            keys=[
+                bitmap_key(performance_id, geometry['layout_version']),
+                version_key(performance_id),
+                changes_key(performance_id),
+                events_channel(performance_id),
+                GLOBAL_VERSION_KEY,
+            ],
+            args=args
+        )
+    except RedisError as e:
+        logger.warning(f"Cannot update seat status bitmap for performance {performance_id}: {e}")
+
+    sync_claims(performance_id, seat_ids, seat_status)
+    if seat_status != 'reserved':
+        unregister_released_seats(performance_id, seat_ids)
+
+
+def record_seat_status(performance_id, seat_ids, seat_status):
+    """
+    Mirror a `SeatReservation` status write into the bitmap (and the seat
+    claims and session registry, see `claims` and `session_registry`) once
+    the current transaction commits.
+    """
+    seat_ids = list(seat_ids)
+    if not seat_ids:
+        return
+    transaction.on_commit(
+        lambda: _apply_seat_status(performance_id, seat_ids, seat_status)
+    )
+
+
+def record_reservations_status(reservations, seat_status):
+    """`record_seat_status` for (performance_id, seat_id) pairs spanning performances"""
+    by_performance = {}
+    for performance_id, seat_id in reservations:
+        by_performance.setdefault(performance_id, []).append(seat_id)
+
+    for performance_id, seat_ids in by_performance.items():
+        record_seat_status(performance_id, seat_ids, seat_status)
@@ -1,18 +1,15 @@
 from django.db.models import Q
-from logzero import logger
 from rest_framework import serializers
 from django.utils import timezone
 from datetime import timedelta
-from decimal import Decimal
 
 from django.conf import settings
 from payments.models import Payment
-from discounts.models import Discount, DiscountUsage
-from discounts.services import validate_and_calculate_discount, DiscountError
+from discounts.models import Discount
 from .models import Booking, SeatReservation
+from .session_registry import get_session_holds
 from venues.models import Seat
 from shows.models import Performance
-from django.db import transaction
 from django.utils import timezone
 import pytz
 
@@ -76,6 +73,16 @@ class ReserveSeatSerializer(serializers.Serializer):
         return value
 
 
+class BestAvailableSerializer(serializers.Serializer):
+    """Serializer for reserving the best block of adjacent seats"""
+    performance_id = serializers.IntegerField()
+    count = serializers.IntegerField(min_value=1, max_value=8)
+    price_category = serializers.CharField(max_length=20, required=False, allow_blank=True)
+    session_id = serializers.CharField(max_length=100)
+
+    validate_performance_id = ReserveSeatSerializer.validate_performance_id
+
+
 class BookingCreateSerializer(serializers.ModelSerializer):
     seat_ids = serializers.ListField(child=serializers.IntegerField(), write_only=True)
     performance_id = serializers.IntegerField(write_only=True)
@@ -95,7 +102,12 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         performance_id = data['performance_id']
         session_id = data['session_id']
 
-        reserved_seats = SeatReservation.objects.filter(
+        holds = get_session_holds(session_id)
+        hold = holds['performances'].get(performance_id) if holds else None
+        if hold and set(seat_ids) <= set(hold['seats']):
+            return data
+
+        reserved_seats = SeatReservation.objects.holding().filter(
             performance_id=performance_id,
             seat_id__in=seat_ids,
             session_id=session_id,
@@ -119,102 +131,8 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        seat_ids = validated_data.pop('seat_ids')
-        performance_id = validated_data.pop('performance_id')
-        session_id = validated_data.pop('session_id')
-        discount_code_str = validated_data.pop('discount_code', None)
-
-        performance = Performance.objects.select_related('show').get(id=performance_id)
-
-        seat_reservations = SeatReservation.objects.filter(
-            performance_id=performance_id,
-            seat_id__in=seat_ids,
-            session_id=session_id,
-            status='reserved',
-            expires_at__gt=timezone.now()
-        )
-
-        if seat_reservations.count() != len(seat_ids):
-            raise serializers.ValidationError({
-                "detail": "Ghế không hợp lệ hoặc đã hết hạn. Vui lòng chọn lại.",
-                "shouldRedirect": True
-            })
-
-        total_amount = sum(sr.price for sr in seat_reservations)
-        service_fee = len(seat_ids) * performance.show.service_fee_per_ticket
-        shipping_fee = performance.shipping_fee
-
-        if total_amount <= 0:
-            raise serializers.ValidationError({
-                "detail": "Lỗi tính tiền. Vui lòng thử lại.",
-                "shouldRedirect": True
-            })
-
-        discount_instance = None
-        discount_amount = Decimal('0')
-
-        temp_booking_for_validation = Booking(
-            total_amount=total_amount,
-            customer_email=validated_data.get('customer_email'),
-            customer_phone=validated_data.get('customer_phone'),
-            **{k: v for k, v in validated_data.items()
-               if k in ['customer_name', 'customer_address', 'shipping_time', 'notes']}
-        )
-
-        if discount_code_str:
-            try:
-                discount_instance, discount_amount = validate_and_calculate_discount(
-                    booking=temp_booking_for_validation,
-                    code=discount_code_str
-                )
-            except DiscountError as e:
-                raise serializers.ValidationError({'discount_code': str(e)})
-
-        final_amount = total_amount + service_fee + shipping_fee - discount_amount
-
-        with transaction.atomic():
-            booking = Booking.objects.create(
-                performance=performance,
-                session_id=session_id,
-                total_amount=total_amount,
-                service_fee=service_fee,
-                shipping_fee=shipping_fee,
-                discount=discount_instance,
-                discount_amount=discount_amount,
-                final_amount=final_amount,
-                **validated_data
-            )
-
-            update_count = seat_reservations.update(booking=booking)
-
-            seat_reservations.update(expires_at=booking.expires_at)
-
-            from .models import BookingHistory
-            BookingHistory.log_action(
-                booking=booking,
-                action='create_booking',
-                request=self.context.get('request'),
-                seats=seat_reservations,
-                extra_data={
-                    'total_amount': float(total_amount),
-                    'service_fee': float(service_fee),
-                    'has_discount': bool(discount_instance)
-                }
-            )
-
-            if update_count != len(seat_ids):
-                logger.error(f"🚨 Update mismatch: expected {len(seat_ids)}, got {update_count}")
-                raise Exception("CRITICAL: Seat update mismatch")
-
-            if discount_instance:
-                DiscountUsage.objects.create(
-                    discount=discount_instance,
-                    booking=booking,
-                    status='PENDING'
-                )
-                logger.info(f"✅ Created pending discount usage for code '{discount_code_str}'")
-
-        return booking
+        from .services import create_booking
+        return create_booking(request=self.context.get('request'), **validated_data)
 
 
 class BookingDetailSerializer(serializers.ModelSerializer):
@@ -276,3 +194,32 @@ class BookingDetailSerializer(serializers.ModelSerializer):
             }
             for sr in obj.seat_reservations.all()
         ]
+
+
+# `BookingDetailSerializer` fields that follow relations, kept in `Booking.snapshot`
+SNAPSHOT_FIELDS = (
+    'show_name', 'performance_datetime', 'venue_name', 'seat_reservations',
+    'showInfo', 'performance', 'selectedSeats', 'discount_code'
+)
+
+
+class BookingSnapshotSerializer(BookingDetailSerializer):
+    """`BookingDetailSerializer` output from the booking row and its snapshot, without joins"""
+    show_name = None
+    performance_datetime = None
+    venue_name = None
+    seat_reservations = None
+    showInfo = None
+    performance = None
+    selectedSeats = None
+    discount_code = None
+
+    class Meta(BookingDetailSerializer.Meta):
+        fields = [field for field in BookingDetailSerializer.Meta.fields if field not in SNAPSHOT_FIELDS]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        return {
+            field: data[field] if field in data else instance.snapshot[field]
+            for field in BookingDetailSerializer.Meta.fields
+        }
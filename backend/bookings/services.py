@@ -0,0 +1,206 @@
+"""
+Booking creation with a fixed query budget.
+
+`create_booking` runs, without a discount code: the performance fetch (with
+show and venue), one aggregate over the session's held seats, the booking
+INSERT, one `UPDATE ... RETURNING` attaching the seats and setting their
+expiry, one seat fetch for the response, the snapshot UPDATE (see
+`read_model`) and the history INSERT. The created booking comes back with
+its reservations built in memory and put in the prefetch cache, so
+`BookingDetailSerializer` renders it without reloading.
+See `tests.BookingCreationQueryBudgetTests`.
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from logzero import logger
+from rest_framework import serializers
+
+from discounts.models import DiscountUsage
+from discounts.services import DiscountError, validate_and_calculate_discount
+from shows.models import Performance
+from venues.models import Seat
+
+from .claims import hold_booked_claims_on_commit
+from .models import Booking, BookingHistory, SeatReservation, generate_booking_code
+from .read_model import build_booking_snapshot
+from .session_registry import unregister_seats_on_commit
+
+ATTACH_SEATS_SQL = """
+UPDATE {table} SET booking_id = %s, expires_at = %s
+WHERE performance_id = %s AND session_id = %s AND status = 'reserved'
+    AND expires_at > %s AND seat_id IN ({seats})
+RETURNING id, seat_id, price
+"""
+
+
+def _supports_update_returning():
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return False
+
+
+def _attach_seats(booking, session_id, seat_ids, now):
+    """
+    Link the session's live holds to `booking` (taking them over from an
+    earlier pending booking of the session, like before), returns
+    (reservation_id, seat_id, price) of the linked rows
+    """
+    held = SeatReservation.objects.filter(
+        performance_id=booking.performance_id,
+        session_id=session_id,
+        status='reserved',
+        expires_at__gt=now,
+        seat_id__in=seat_ids
+    )
+
+    if not _supports_update_returning():
+        rows = list(held.values_list('id', 'seat_id', 'price'))
+        held.update(booking=booking, expires_at=booking.expires_at)
+        return rows
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            ATTACH_SEATS_SQL.format(
+                table=connection.ops.quote_name(SeatReservation._meta.db_table),
+                seats=', '.join(['%s'] * len(seat_ids))
+            ),
+            [
+                booking.id,
+                connection.ops.adapt_datetimefield_value(booking.expires_at),
+                booking.performance_id,
+                session_id,
+                connection.ops.adapt_datetimefield_value(now),
+                *seat_ids,
+            ]
+        )
+        return [(reservation_id, seat_id, Decimal(str(price))) for reservation_id, seat_id, price in cursor.fetchall()]
+
+
+def create_booking(performance_id, seat_ids, session_id, discount_code=None, request=None, **customer_data):
+    """
+    Create a pending booking for seats held by `session_id`. Raises
+    `serializers.ValidationError` when a seat is not held any more or the
+    discount code is refused.
+    """
+    seat_ids = list(dict.fromkeys(seat_ids))
+    now = timezone.now()
+
+    performance = Performance.objects.select_related('show', 'show__venue').get(id=performance_id)
+
+    totals = SeatReservation.objects.filter(
+        performance_id=performance_id,
+        seat_id__in=seat_ids,
+        session_id=session_id,
+        status='reserved',
+        expires_at__gt=now
+    ).aggregate(count=Count('id'), total=Sum('price'))
+
+    if totals['count'] != len(seat_ids):
+        raise serializers.ValidationError({
+            "detail": "Ghế không hợp lệ hoặc đã hết hạn. Vui lòng chọn lại.",
+            "shouldRedirect": True
+        })
+
+    total_amount = totals['total'] or Decimal('0')
+    service_fee = len(seat_ids) * performance.show.service_fee_per_ticket
+    shipping_fee = performance.shipping_fee
+
+    if total_amount <= 0:
+        raise serializers.ValidationError({
+            "detail": "Lỗi tính tiền. Vui lòng thử lại.",
+            "shouldRedirect": True
+        })
+
+    discount_instance = None
+    discount_amount = Decimal('0')
+    if discount_code:
+        try:
+            discount_instance, discount_amount = validate_and_calculate_discount(
+                # Never saved, an empty code skips the allocator
+                booking=Booking(
+                    booking_code='',
+                    total_amount=total_amount,
+                    customer_email=customer_data.get('customer_email'),
+                    customer_phone=customer_data.get('customer_phone'),
+                ),
+                code=discount_code
+            )
+        except DiscountError as e:
+            raise serializers.ValidationError({'discount_code': str(e)})
+
+    with transaction.atomic():
+        booking = Booking.objects.create(
+            booking_code=generate_booking_code(),
+            performance=performance,
+            session_id=session_id,
+            total_amount=total_amount,
+            service_fee=service_fee,
+            shipping_fee=shipping_fee,
+            discount=discount_instance,
+            discount_amount=discount_amount,
+            final_amount=total_amount + service_fee + shipping_fee - discount_amount,
+            **customer_data
+        )
+
+        attached = _attach_seats(booking, session_id, seat_ids, now)
+        if len(attached) != len(seat_ids) or sum(price for _, _, price in attached) != total_amount:
+            # A hold expired or changed since the aggregate
+            logger.error(f"🚨 Update mismatch: expected {len(seat_ids)}, got {len(attached)}")
+            raise serializers.ValidationError({
+                "detail": "Ghế không hợp lệ hoặc đã hết hạn. Vui lòng chọn lại.",
+                "shouldRedirect": True
+            })
+
+        seats = Seat.objects.select_related(
+            'row', 'row__section', 'price_category', 'row__price_category'
+        ).in_bulk([seat_id for _, seat_id, _ in attached])
+        reservations = [
+            SeatReservation(
+                id=reservation_id,
+                booking=booking,
+                performance=performance,
+                seat=seats[seat_id],
+                status='reserved',
+                price=price,
+                session_id=session_id,
+                expires_at=booking.expires_at
+            )
+            for reservation_id, seat_id, price in attached
+        ]
+        # Rendered by BookingDetailSerializer without another query
+        booking._prefetched_objects_cache = {'seat_reservations': reservations}
+
+        booking.snapshot = build_booking_snapshot(booking)
+        Booking.objects.filter(id=booking.id).update(snapshot=booking.snapshot)
+
+        BookingHistory.log_action(
+            booking=booking,
+            action='create_booking',
+            request=request,
+            seats=reservations,
+            extra_data={
+                'total_amount': float(total_amount),
+                'service_fee': float(service_fee),
+                'has_discount': bool(discount_instance)
+            }
+        )
+
+        if discount_instance:
+            DiscountUsage.objects.create(
+                discount=discount_instance,
+                booking=booking,
+                status='PENDING'
+            )
+            logger.info(f"✅ Created pending discount usage for code '{discount_code}'")
+
+        # Booked seats are no longer restored with the session's hold, and
+        # stay claimed past the hold expiry
+        unregister_seats_on_commit(session_id, performance_id, seat_ids)
+        hold_booked_claims_on_commit(performance_id, session_id, seat_ids)
+
+    return booking
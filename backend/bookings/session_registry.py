@@ -0,0 +1,157 @@
+"""
+Redis registry of the seats each booking session holds.
+
+One hash per session: `ip` (client IP of the holds), and per performance
+`{performance_id}:expires` (hold expiry, ms) and `{performance_id}:{seat_id}`
+(held price). It is written after commit: `hold_seats` registers seats and
+booking creation unregisters the seats it books. Every other write that
+frees, sells or blocks a seat goes through `seat_status.record_seat_status`,
+which calls `unregister_released_seats`; the per performance
+`seat_sessions` hash tells which session registered a seat, so releases
+that do not know the holder (admin, booking cancel, payment failure,
+expiry) unregister it too. A hold past its expiry is ignored on read, like
+`SeatReservationQuerySet.holding()`.
+
+It lets ownership checks, hold restores and booking validation skip the
+`SeatReservation` queries by session. `SeatReservation` stays the source of
+truth: readers get None when Redis is unavailable or has no hash for the
+session (never registered, registration failed, evicted or flushed) and
+query the database, and booking creation still locks the rows it books.
+"""
+import time
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import transaction
+from django_redis import get_redis_connection
+from logzero import logger
+from redis.exceptions import RedisError
+
+# Sessions are refreshed on every hold, a stale one just expires
+SESSION_TIMEOUT = 60 * 60 * 2
+
+
+def get_redis():
+    return get_redis_connection('default')
+
+
+def session_key(session_id):
+    return f'booking:session:{session_id}'
+
+
+def seat_sessions_key(performance_id):
+    return f'booking:seat_sessions:{performance_id}'
+
+
+# KEYS[1] seat sessions hash. ARGV: seat ids... Removes the seats and returns
+# the session that registered each one (false when none)
+POP_SEAT_SESSIONS_SCRIPT = """
+local sessions = redis.call('HMGET', KEYS[1], unpack(ARGV))
+redis.call('HDEL', KEYS[1], unpack(ARGV))
+return sessions
+"""
+
+
+def register_hold(session_id, performance_id, seat_prices, expires_at, client_ip=None):
+    """Record seats held by `session_id` until `expires_at`"""
+    mapping = {f'{performance_id}:{seat_id}': str(price) for seat_id, price in seat_prices.items()}
+    mapping[f'{performance_id}:expires'] = int(expires_at.timestamp() * 1000)
+    mapping['ip'] = client_ip or ''
+    try:
+        pipe = get_redis().pipeline()
+        pipe.hset(session_key(session_id), mapping=mapping)
+        pipe.expire(session_key(session_id), SESSION_TIMEOUT)
+        pipe.hset(seat_sessions_key(performance_id), mapping={seat_id: session_id for seat_id in seat_prices})
+        pipe.expire(seat_sessions_key(performance_id), SESSION_TIMEOUT)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Cannot register the hold of session {session_id}: {e}")
+
+
+def unregister_seats(session_id, performance_id, seat_ids):
+    """Seats of `session_id` that are no longer held by it (booked)"""
+    seat_ids = list(seat_ids)
+    if not session_id or not seat_ids:
+        return
+    try:
+        get_redis().hdel(session_key(session_id), *[f'{performance_id}:{seat_id}' for seat_id in seat_ids])
+    except RedisError as e:
+        logger.warning(f"Cannot unregister seats of session {session_id}: {e}")
+
+
+def unregister_released_seats(performance_id, seat_ids):
+    """
+    Seats freed, sold or blocked in the database, whichever session
+    registered them. Called after commit by `seat_status`.
+    """
+    seat_ids = list(seat_ids)
+    if not seat_ids:
+        return
+    try:
+        sessions = get_redis().register_script(POP_SEAT_SESSIONS_SCRIPT)(
+            keys=[seat_sessions_key(performance_id)],
+            args=seat_ids
+        )
+        by_session = {}
+        for seat_id, session_id in zip(seat_ids, sessions):
+            if session_id:
+                by_session.setdefault(session_id.decode(), []).append(f'{performance_id}:{seat_id}')
+        if by_session:
+            pipe = get_redis().pipeline()
+            for session_id, fields in by_session.items():
+                pipe.hdel(session_key(session_id), *fields)
+            pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Cannot unregister released seats of performance {performance_id}: {e}")
+
+
+def register_hold_on_commit(*args, **kwargs):
+    transaction.on_commit(lambda: register_hold(*args, **kwargs))
+
+
+def unregister_seats_on_commit(session_id, performance_id, seat_ids):
+    seat_ids = list(seat_ids)
+    transaction.on_commit(lambda: unregister_seats(session_id, performance_id, seat_ids))
+
+
+def get_session_holds(session_id):
+    """
+    Live holds of a session: `{'ip': ..., 'performances': {performance_id:
+    {'expires_at': datetime, 'seats': {seat_id: price}}}}`. Performances
+    whose hold expired are left out. None when Redis is unavailable or does
+    not know the session, the caller then reads `SeatReservation`.
+    """
+    try:
+        fields = get_redis().hgetall(session_key(session_id))
+    except RedisError as e:
+        logger.warning(f"Cannot read the holds of session {session_id}: {e}")
+        return None
+
+    if not fields:
+        # `register_hold` always writes `ip`, an empty hash is a missing one
+        return None
+
+    now_ms = int(time.time() * 1000)
+    expiry = {}
+    seats = {}
+    client_ip = ''
+    for name, value in fields.items():
+        name, value = name.decode(), value.decode()
+        if name == 'ip':
+            client_ip = value
+            continue
+        performance_id, field = name.split(':', 1)
+        if field == 'expires':
+            expiry[int(performance_id)] = int(value)
+        else:
+            seats.setdefault(int(performance_id), {})[int(field)] = Decimal(value)
+
+    performances = {}
+    for performance_id, expires_ms in expiry.items():
+        if expires_ms > now_ms and seats.get(performance_id):
+            performances[performance_id] = {
+                'expires_at': datetime.fromtimestamp(expires_ms / 1000, tz=dt_timezone.utc),
+                'seats': seats[performance_id],
+            }
+    return {'ip': client_ip, 'performances': performances}
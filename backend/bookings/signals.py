@@ -0,0 +1,19 @@
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+from .models import Booking
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking_status(sender, instance, **kwargs):
+    # Deferred status is not loaded just for this
+    instance._snapshot_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Booking)
+def rebuild_booking_snapshot(sender, instance, created, **kwargs):
+    """Paid, cancelled and expired bookings get their snapshot rebuilt after commit"""
+    from .read_model import write_booking_snapshots_on_commit
+
+    if not created and instance.status != instance._snapshot_status:
+        write_booking_snapshots_on_commit([instance.id])
+    instance._snapshot_status = instance.status
@@ -6,6 +6,8 @@ from datetime import timedelta
 import logging
 
 from .models import SeatReservation, Booking, BookingHistory
+from .seat_status import record_seat_status
+from .hold_expiry import expire_holds
 from discounts.models import DiscountUsage
 from payments.models import Payment
 from payments.ninepay import NinePay
@@ -16,58 +18,40 @@ logger = logging.getLogger(__name__)
 
 @shared_task
 def cleanup_expired_seat_reservations():
+    """
+    Safety net of `run_hold_expiry`: bulk-release the expired holds it
+    missed, then the seats of cancelled or expired bookings.
+    """
     now = timezone.now()
 
+    count = expire_holds(task='celery_cleanup')
+
     expired_reservations = SeatReservation.objects.filter(
         status='reserved',
-        expires_at__lt=now
+        expires_at__lt=now,
+        booking__status__in=['cancelled', 'expired']
     ).select_related('booking')
 
-    count = 0
-
     for reservation in expired_reservations:
-        if not reservation.booking:
-
-            BookingHistory.log_action(
-                booking=None,
-                action='seat_released',
-                request=None,
-                seats=[reservation],
-                session_id=reservation.session_id,
-                extra_data={
-                    'reason': 'expired_reservation',
-                    'task': 'celery_cleanup'
-                }
-            )
-
-            reservation.status = 'available'
-            reservation.session_id = ''
-            reservation.expires_at = None
-            reservation.booking = None
-            reservation.client_ip = None
-            reservation.save()
-            count += 1
-
-        elif reservation.booking.status in ['cancelled', 'expired']:
-
-            BookingHistory.log_action(
-                booking=reservation.booking,
-                action='seat_released',
-                request=None,
-                seats=[reservation],
-                extra_data={
-                    'reason': 'booking_cancelled_or_expired',
-                    'task': 'celery_cleanup'
-                }
-            )
-
-            reservation.status = 'available'
-            reservation.session_id = ''
-            reservation.expires_at = None
-            reservation.booking = None
-            reservation.client_ip = None
-            reservation.save()
-            count += 1
+        BookingHistory.log_action(
+            booking=reservation.booking,
+            action='seat_released',
+            request=None,
+            seats=[reservation],
+            extra_data={
+                'reason': 'booking_cancelled_or_expired',
+                'task': 'celery_cleanup'
+            }
+        )
+
+        reservation.status = 'available'
+        reservation.session_id = ''
+        reservation.expires_at = None
+        reservation.booking = None
+        reservation.client_ip = None
+        reservation.save()
+        record_seat_status(reservation.performance_id, [reservation.seat_id], 'available')
+        count += 1
 
     if count > 0:
         logger.info(f"✅ [Celery] Cleaned {count} expired seat reservations")
@@ -133,6 +117,7 @@ def expire_old_pending_bookings():
                     expires_at=None,
                     booking=None
                 )
+                record_seat_status(booking.performance_id, [sr.seat_id for sr in seats_snapshot], 'available')
 
                 BookingHistory.log_action(
                     booking=booking,
@@ -331,7 +316,9 @@ def update_payment_success(payment, gateway_response):
             booking.save()
 
             # ✅ Update seats
+            sold_seat_ids = list(booking.seat_reservations.values_list('seat_id', flat=True))
             updated_seats = booking.seat_reservations.update(status='sold')
+            record_seat_status(booking.performance_id, sold_seat_ids, 'sold')
             logger.info(f"✅ [Celery] Updated {updated_seats} seats to 'sold'")
 
             BookingHistory.log_action(
@@ -406,6 +393,7 @@ def update_payment_failed(payment, gateway_response):
                 expires_at=None,
                 booking=None
             )
+            record_seat_status(booking.performance_id, [sr.seat_id for sr in seats_snapshot], 'available')
 
             BookingHistory.log_action(
                 booking=booking,
@@ -460,3 +448,82 @@ def send_confirmation_email_async(self, booking_id):
     except Exception as e:
         logger.error(f"❌ [Celery] Email error: {e}")
         raise self.retry(exc=e, countdown=300)  # Retry after 5 min
+
+
+# ============================================================================
+# TASK 5: Seat Map Snapshot
+# ============================================================================
+
+@shared_task
+def build_seat_map_snapshot_task(performance_id):
+    """Render the static seat map snapshot of an on-sale performance"""
+    from django.core.cache import cache
+    from shows.models import Performance
+    from .seat_map_snapshot import build_seat_map_snapshot
+
+    try:
+        performance = Performance.objects.select_related('show').get(id=performance_id)
+        if performance.status != 'on_sale':
+            return False
+        build_seat_map_snapshot(performance)
+        return True
+
+    except Performance.DoesNotExist:
+        logger.error(f"❌ [Celery] Performance {performance_id} not found")
+        return False
+
+    finally:
+        cache.delete(f'seat_map_snapshot_lock:{performance_id}')
+
+
+# ============================================================================
+# TASK 6: Seat Inventory
+# ============================================================================
+
+@shared_task
+def sync_inventory_task(performance_id):
+    """Materialize the available seat rows of an on-sale performance"""
+    from django.core.cache import cache
+    from shows.models import Performance
+    from .inventory import inventory_lock_key, sync_inventory
+
+    try:
+        if not Performance.objects.filter(id=performance_id, status='on_sale').exists():
+            return False
+        return sync_inventory(performance_id)
+
+    finally:
+        cache.delete(inventory_lock_key(performance_id))
+
+
+# ============================================================================
+# TASK 7: Booking Submission
+# ============================================================================
+
+@shared_task(ignore_result=True)
+def process_booking_ticket(ticket, data, request_meta, state):
+    """
+    Create the booking of a queued ticket, see `booking_queue`. Runs on the
+    partition queue of the performance, one booking at a time.
+    """
+    from types import SimpleNamespace
+    from rest_framework import serializers
+    from .booking_queue import set_ticket, start_ticket
+    from .services import create_booking
+
+    if not start_ticket(ticket, state):
+        logger.warning(f"⚠️ [Celery] Skip booking ticket {ticket}, picked up too late")
+        return
+
+    try:
+        booking = create_booking(request=SimpleNamespace(META=request_meta or {}), **data)
+    except serializers.ValidationError as e:
+        set_ticket(ticket, state='failed', errors=e.detail, **state)
+        return
+    except Exception as e:
+        logger.error(f"❌ [Celery] Cannot create booking of ticket {ticket}: {e}", exc_info=True)
+        set_ticket(ticket, state='failed', errors={'error': 'Có lỗi xảy ra khi tạo đơn hàng.'}, **state)
+        return
+
+    set_ticket(ticket, state='done', booking_code=booking.booking_code, **state)
+    logger.info(f"✅ [Celery] Created booking {booking.booking_code} for ticket {ticket}")
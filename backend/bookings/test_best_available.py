@@ -0,0 +1,172 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from . import best_available
+from .best_available import AVAILABLE, TAKEN, build_segments, find_best_blocks
+
+PITCH = 22
+ROW_DEPTH = 30
+
+
+def make_geometry(rows, width=132):
+    """
+    Geometry shaped like `seat_map.build_venue_geometry` for `rows`, a list of
+    dicts with `label`, `numbers` (in physical order) and optionally
+    `numbering_style`, `gaps`, `has_center_aisle`, `category`, `spacing_after`
+    (numbers followed by a spacing) and `categories` (number -> category).
+    """
+    seats = []
+    numbering_info = {}
+    for row_index, row in enumerate(rows):
+        vertical = row.get('numbering_style') == 'vertical'
+        for position, number in enumerate(row['numbers']):
+            seats.append({
+                'id': row_index * 100 + int(number),
+                'section_id': 1,
+                'row': row['label'],
+                'number': str(number),
+                'position_x': 0 if vertical else position * PITCH,
+                'position_y': row_index * ROW_DEPTH + (position * PITCH if vertical else 0),
+                'spacing_after': 1 if number in row.get('spacing_after', ()) else 0,
+                'price_category': row.get('categories', {}).get(number, row.get('category', 'vip')),
+            })
+        numbering_info[f"1-{row['label']}"] = {
+            'numbering_style': row.get('numbering_style', 'left_to_right'),
+            'gaps': row.get('gaps', []),
+            'has_center_aisle': row.get('has_center_aisle', True),
+            'center_x': width // 2,
+        }
+    return {
+        'layout_version': 1,
+        'venue': {'width': width},
+        'seats': seats,
+        'seat_ordinals': {seat['id']: ordinal for ordinal, seat in enumerate(seats)},
+        'numbering_info': numbering_info,
+    }
+
+
+def segment_numbers(geometry):
+    seats = geometry['seats']
+    return sorted(
+        sorted((seats[ordinal]['row'], int(seats[ordinal]['number'])) for ordinal in segment['ordinals'])
+        for segment in build_segments(geometry)['segments']
+    )
+
+
+class BuildSegmentsTests(SimpleTestCase):
+
+    def test_full_row_is_one_segment(self):
+        geometry = make_geometry([{'label': 'A', 'numbers': [1, 2, 3, 4]}])
+        self.assertEqual(segment_numbers(geometry), [[('A', 1), ('A', 2), ('A', 3), ('A', 4)]])
+
+    def test_hidden_gap_seat_splits_the_row(self):
+        geometry = make_geometry([{'label': 'A', 'numbers': [1, 2, 3, 5, 6], 'gaps': ['4']}])
+        self.assertEqual(segment_numbers(geometry), [[('A', 1), ('A', 2), ('A', 3)], [('A', 5), ('A', 6)]])
+
+    def test_center_aisle_splits_center_out_rows(self):
+        row = {'label': 'A', 'numbers': [5, 3, 1, 2, 4, 6], 'numbering_style': 'center_out'}
+        self.assertEqual(
+            segment_numbers(make_geometry([row])),
+            [[('A', 1), ('A', 3), ('A', 5)], [('A', 2), ('A', 4), ('A', 6)]]
+        )
+
+        without_aisle = make_geometry([dict(row, has_center_aisle=False)])
+        self.assertEqual(len(segment_numbers(without_aisle)), 1)
+
+    def test_center_out_gap_only_splits_its_side(self):
+        row = {'label': 'A', 'numbers': [7, 3, 1, 2, 4, 6], 'numbering_style': 'center_out', 'gaps': ['5']}
+        self.assertEqual(
+            segment_numbers(make_geometry([row])),
+            [[('A', 1), ('A', 3)], [('A', 2), ('A', 4), ('A', 6)], [('A', 7)]]
+        )
+
+    def test_spacing_after_splits_the_row(self):
+        geometry = make_geometry([{'label': 'A', 'numbers': [1, 2, 3, 4], 'spacing_after': [2]}])
+        self.assertEqual(segment_numbers(geometry), [[('A', 1), ('A', 2)], [('A', 3), ('A', 4)]])
+
+    def test_price_category_change_splits_the_row(self):
+        geometry = make_geometry([{'label': 'A', 'numbers': [1, 2, 3], 'categories': {3: 'std'}}])
+        self.assertEqual(segment_numbers(geometry), [[('A', 1), ('A', 2)], [('A', 3)]])
+
+    def test_position_jump_is_an_aisle(self):
+        geometry = make_geometry([{'label': 'A', 'numbers': [1, 2, 3, 4]}])
+        for seat in geometry['seats'][2:]:
+            seat['position_x'] += 2 * PITCH
+        self.assertEqual(segment_numbers(geometry), [[('A', 1), ('A', 2)], [('A', 3), ('A', 4)]])
+
+    def test_vertical_rows_follow_position_y(self):
+        geometry = make_geometry([{'label': 'A', 'numbers': [1, 2, 3, 4], 'numbering_style': 'vertical'}])
+        # Listed out of order, the physical order is along y
+        geometry['seats'].reverse()
+        geometry['seat_ordinals'] = {seat['id']: ordinal for ordinal, seat in enumerate(geometry['seats'])}
+
+        segments = build_segments(geometry)['segments']
+        self.assertEqual(len(segments), 1)
+        self.assertEqual(
+            [geometry['seats'][ordinal]['number'] for ordinal in segments[0]['ordinals']],
+            ['1', '2', '3', '4']
+        )
+
+    def test_segments_are_sorted_front_to_back(self):
+        geometry = make_geometry([
+            {'label': 'A', 'numbers': [1, 2]},
+            {'label': 'B', 'numbers': [1, 2]},
+        ])
+        geometry['seats'].reverse()
+        geometry['seat_ordinals'] = {seat['id']: ordinal for ordinal, seat in enumerate(geometry['seats'])}
+
+        layout = build_segments(geometry)
+        self.assertEqual([segment['depth'] for segment in layout['segments']], [0, ROW_DEPTH])
+        for index, segment in enumerate(layout['segments']):
+            for ordinal in segment['ordinals']:
+                self.assertEqual(layout['seat_segments'][ordinal], index)
+
+
+class FindBestBlocksTests(SimpleTestCase):
+    performance_id = 1
+
+    def setUp(self):
+        patcher = mock.patch.dict(best_available._free_run_indexes, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def find(self, geometry, count, taken=(), **kwargs):
+        codes = [TAKEN if seat['id'] in taken else AVAILABLE for seat in geometry['seats']]
+        with mock.patch('bookings.best_available.get_seat_status_snapshot', return_value=(codes, 1)):
+            return find_best_blocks(self.performance_id, geometry, count, **kwargs)
+
+    def rows(self, *labels, **row):
+        return make_geometry([dict({'label': label, 'numbers': list(range(1, 8))}, **row) for label in labels])
+
+    def test_center_of_the_front_row_first(self):
+        geometry = self.rows('A', 'B')
+        self.assertEqual(self.find(geometry, 3), [[3, 4, 5], [103, 104, 105]])
+
+    def test_blocks_avoid_taken_seats(self):
+        geometry = self.rows('A', 'B')
+        blocks = self.find(geometry, 3, taken={4}, limit=2)
+        self.assertEqual(sorted(blocks), [[1, 2, 3], [5, 6, 7]])
+
+    def test_orphan_seats_are_penalized(self):
+        # Free run 2-6: 3-5 is centered but leaves seats 2 and 6 alone
+        geometry = self.rows('A')
+        self.assertEqual(self.find(geometry, 3, taken={1, 7}), [[2, 3, 4]])
+
+    def test_category_filter(self):
+        geometry = make_geometry([
+            {'label': 'A', 'numbers': list(range(1, 8))},
+            {'label': 'B', 'numbers': list(range(1, 8)), 'category': 'std'},
+        ])
+        self.assertEqual(self.find(geometry, 2, category='std', limit=1), [[103, 104]])
+
+    def test_no_block_when_no_run_is_long_enough(self):
+        geometry = self.rows('A')
+        self.assertEqual(self.find(geometry, 3, taken={3, 6}), [])
+
+    def test_stops_before_rows_that_cannot_score_better(self):
+        geometry = self.rows('A', 'B', 'C')
+        with mock.patch('bookings.best_available._best_window', wraps=best_available._best_window) as best_window:
+            self.assertEqual(self.find(geometry, 2, limit=1), [[3, 4]])
+
+        self.assertEqual(best_window.call_count, 1)
@@ -0,0 +1,139 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .booking_codes import (
+    ALPHABET,
+    CODE_BLOCK_SIZE,
+    CODE_SPACE,
+    HALF_BITS,
+    HALF_MASK,
+    PAYLOAD_LENGTH,
+    PREFIX,
+    RANDOM_CODE_LENGTH,
+    ROUNDS,
+    BlockAllocator,
+    BookingCodeSpaceExhausted,
+    _permutation_key,
+    _round,
+    check_character,
+    encode_booking_code,
+    is_valid_booking_code,
+    permute,
+)
+
+
+def unpermute(value, key):
+    """Inverse of `permute`: the Feistel rounds backwards, cycle-walked the same way"""
+    def inverse(value):
+        left, right = value >> HALF_BITS, value & HALF_MASK
+        for round_number in reversed(range(ROUNDS)):
+            left, right = right ^ _round(key, round_number, left), left
+        return (left << HALF_BITS) | right
+
+    value = inverse(value)
+    while value >= CODE_SPACE:
+        value = inverse(value)
+    return value
+
+
+@override_settings(BOOKING_CODE_SECRET='test-secret')
+class PermutationTests(SimpleTestCase):
+
+    def test_permute_stays_in_the_code_space(self):
+        key = _permutation_key()
+        for number in [*range(2000), CODE_SPACE - 1]:
+            self.assertTrue(0 <= permute(number, key) < CODE_SPACE)
+
+    def test_permute_is_a_bijection(self):
+        key = _permutation_key()
+        numbers = [*range(5000), *range(CODE_SPACE - 100, CODE_SPACE)]
+        values = [permute(number, key) for number in numbers]
+
+        self.assertEqual(len(set(values)), len(numbers))
+        self.assertEqual([unpermute(value, key) for value in values], numbers)
+
+    def test_key_changes_the_permutation(self):
+        numbers = range(100)
+        first = [permute(number, _permutation_key()) for number in numbers]
+        with override_settings(BOOKING_CODE_SECRET='other-secret'):
+            second = [permute(number, _permutation_key()) for number in numbers]
+        self.assertNotEqual(first, second)
+
+
+@override_settings(BOOKING_CODE_SECRET='test-secret')
+class BookingCodeTests(SimpleTestCase):
+
+    def test_codes_have_the_expected_shape(self):
+        for number in (0, 1, 12345, CODE_SPACE - 1):
+            code = encode_booking_code(number)
+            self.assertEqual(len(code), len(PREFIX) + PAYLOAD_LENGTH + 1)
+            self.assertTrue(code.startswith(PREFIX))
+            self.assertTrue(is_valid_booking_code(code))
+            self.assertTrue(is_valid_booking_code(code.lower()))
+
+    def test_allocated_codes_cannot_match_random_codes(self):
+        # Random codes (and all codes from before the allocator) are shorter
+        self.assertNotEqual(len(encode_booking_code(0)), len(PREFIX) + RANDOM_CODE_LENGTH)
+
+    def test_numbers_outside_the_code_space_are_refused(self):
+        for number in (-1, CODE_SPACE, CODE_SPACE + 1):
+            with self.assertRaises(BookingCodeSpaceExhausted):
+                encode_booking_code(number)
+
+    def test_consecutive_numbers_give_distinct_codes(self):
+        codes = [encode_booking_code(number) for number in range(1000)]
+        self.assertEqual(len(set(codes)), len(codes))
+
+    def test_check_character_catches_neighbour_swaps(self):
+        payload = encode_booking_code(42)[len(PREFIX):-1]
+        check = check_character(payload)
+        for position in range(PAYLOAD_LENGTH - 1):
+            swapped = list(payload)
+            swapped[position], swapped[position + 1] = swapped[position + 1], swapped[position]
+            if swapped != list(payload):
+                self.assertNotEqual(check_character(''.join(swapped)), check)
+
+    def test_check_character_catches_a_mistyped_first_character(self):
+        payload = 'AB3XZ7'
+        check = check_character(payload)
+        for char in ALPHABET.replace('A', ''):
+            self.assertNotEqual(check_character(char + payload[1:]), check)
+
+    def test_invalid_codes(self):
+        code = encode_booking_code(7)
+        wrong_check = ALPHABET[(ALPHABET.index(code[-1]) + 1) % len(ALPHABET)]
+        for invalid in ('', None, code[:-1], code + 'A', 'XX' + code[2:], code[:-1] + wrong_check, code[:-1] + '-'):
+            self.assertFalse(is_valid_booking_code(invalid), invalid)
+
+
+class BlockAllocatorTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('bookings.booking_codes.connection')
+        connection = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cursor = connection.cursor.return_value.__enter__.return_value
+        self.cursor.fetchone.side_effect = [(1,), (1 + CODE_BLOCK_SIZE,), (1 + 2 * CODE_BLOCK_SIZE,)]
+
+    def test_numbers_come_from_the_block(self):
+        allocator = BlockAllocator()
+        numbers = [allocator.allocate() for _ in range(CODE_BLOCK_SIZE)]
+
+        self.assertEqual(numbers, list(range(1, CODE_BLOCK_SIZE + 1)))
+        self.assertEqual(self.cursor.execute.call_count, 1)
+
+    def test_next_block_is_taken_when_the_block_runs_out(self):
+        allocator = BlockAllocator()
+        numbers = [allocator.allocate() for _ in range(CODE_BLOCK_SIZE + 1)]
+
+        self.assertEqual(numbers[-1], 1 + CODE_BLOCK_SIZE)
+        self.assertEqual(self.cursor.execute.call_count, 2)
+
+    def test_forked_process_takes_its_own_block(self):
+        allocator = BlockAllocator()
+        with mock.patch('bookings.booking_codes.os.getpid', return_value=1000):
+            self.assertEqual(allocator.allocate(), 1)
+        with mock.patch('bookings.booking_codes.os.getpid', return_value=1001):
+            self.assertEqual(allocator.allocate(), 1 + CODE_BLOCK_SIZE)
+        self.assertEqual(self.cursor.execute.call_count, 2)
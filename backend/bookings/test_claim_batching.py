@@ -0,0 +1,153 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from shows.models import Performance, Show
+from venues.models import PriceCategory, Row, Seat, Section, Venue
+
+from .claim_batching import _now_ms, process_batch, reply_key, resolve_batch
+from .models import SeatReservation
+
+
+def make_claim(request_id, session_id, seat_ids, performance_id=1, deadline_in_ms=2000):
+    return {
+        'id': request_id,
+        'performance_id': performance_id,
+        'session_id': session_id,
+        'seats': [[seat_id, '500000'] for seat_id in seat_ids],
+        'expires_at': int((timezone.now() + timedelta(minutes=5)).timestamp() * 1000),
+        'client_ip': None,
+        'deadline': _now_ms() + deadline_in_ms,
+    }
+
+
+class ResolveBatchTests(SimpleTestCase):
+
+    def test_first_claim_wins(self):
+        first = make_claim('r1', 'session-a', [1, 2])
+        second = make_claim('r2', 'session-b', [2, 3])
+        third = make_claim('r3', 'session-c', [3])
+
+        winners, losers = resolve_batch([first, second, third])
+
+        self.assertEqual([claim['id'] for claim in winners], ['r1', 'r3'])
+        self.assertEqual(losers, {'r2': [2]})
+
+    def test_same_session_claims_do_not_conflict(self):
+        first = make_claim('r1', 'session-a', [1, 2])
+        second = make_claim('r2', 'session-a', [2, 3])
+
+        winners, losers = resolve_batch([first, second])
+
+        self.assertEqual([claim['id'] for claim in winners], ['r1', 'r2'])
+        self.assertEqual(losers, {})
+
+    def test_losing_claim_takes_no_seat(self):
+        first = make_claim('r1', 'session-a', [1])
+        second = make_claim('r2', 'session-b', [1, 2])
+        third = make_claim('r3', 'session-c', [2])
+
+        winners, losers = resolve_batch([first, second, third])
+
+        # The seat of the losing claim stays free for later claims
+        self.assertEqual([claim['id'] for claim in winners], ['r1', 'r3'])
+        self.assertEqual(losers, {'r2': [1]})
+
+
+@override_settings(SEAT_CLAIM_ENGINE='database')
+class ProcessBatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        venue = Venue.objects.create(name='Nhà hát Lớn', address='1 Tràng Tiền')
+        category = PriceCategory.objects.create(name='VIP', code='vip-batching', base_price=Decimal('500000'))
+        section = Section.objects.create(venue=venue, name='Tầng 1', code='T1')
+        row = Row.objects.create(section=section, label='A', seat_count=4, price_category=category)
+        cls.seat_ids = [Seat.objects.create(row=row, number=str(number)).id for number in range(1, 5)]
+
+        show = Show.objects.create(
+            name='Vở diễn',
+            slug='vo-dien-batching',
+            category='Kịch',
+            duration_minutes=90,
+            description='Mô tả',
+            venue=venue,
+            service_fee_per_ticket=Decimal('10000')
+        )
+        cls.performance = Performance.objects.create(
+            show=show,
+            datetime=timezone.now() + timedelta(days=7),
+            status='on_sale'
+        )
+
+    def setUp(self):
+        patcher = mock.patch('bookings.claim_batching.get_redis')
+        self.redis = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pipe = self.redis.return_value.pipeline.return_value
+
+    def claim(self, request_id, session_id, seat_ids, **kwargs):
+        return make_claim(request_id, session_id, seat_ids, performance_id=self.performance.id, **kwargs)
+
+    def replies(self):
+        return {
+            call.args[0]: json.loads(call.args[1])['conflicts']
+            for call in self.pipe.rpush.call_args_list
+        }
+
+    def holders(self):
+        return dict(
+            SeatReservation.objects.filter(
+                performance=self.performance,
+                status='reserved'
+            ).values_list('seat_id', 'session_id')
+        )
+
+    def test_writes_winners_and_answers_every_caller(self):
+        first, second, third, _ = self.seat_ids
+
+        results = process_batch([
+            self.claim('r1', 'session-a', [first, second]),
+            self.claim('r2', 'session-b', [second, third]),
+            self.claim('r3', 'session-c', [third]),
+        ])
+
+        self.assertEqual(results, {'r1': [], 'r2': [second], 'r3': []})
+        self.assertEqual(self.holders(), {first: 'session-a', second: 'session-a', third: 'session-c'})
+        self.assertEqual(self.replies(), {reply_key('r1'): [], reply_key('r2'): [second], reply_key('r3'): []})
+        self.pipe.execute.assert_called_once()
+
+    def test_database_refuses_seats_held_before_the_batch(self):
+        first, second, _, _ = self.seat_ids
+        SeatReservation.objects.create(
+            performance=self.performance,
+            seat_id=first,
+            status='reserved',
+            price=Decimal('500000'),
+            session_id='session-earlier',
+            expires_at=timezone.now() + timedelta(minutes=5)
+        )
+
+        results = process_batch([
+            self.claim('r1', 'session-a', [first]),
+            self.claim('r2', 'session-b', [second]),
+        ])
+
+        self.assertEqual(results, {'r1': [first], 'r2': []})
+        self.assertEqual(self.holders(), {first: 'session-earlier', second: 'session-b'})
+
+    def test_skips_claims_past_their_deadline(self):
+        first, second, _, _ = self.seat_ids
+
+        results = process_batch([
+            self.claim('r1', 'session-a', [first], deadline_in_ms=-1),
+            self.claim('r2', 'session-b', [second]),
+        ])
+
+        self.assertEqual(results, {'r2': []})
+        self.assertEqual(self.holders(), {second: 'session-b'})
+        self.assertEqual(list(self.replies()), [reply_key('r2')])
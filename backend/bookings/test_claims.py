@@ -0,0 +1,173 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.test import TestCase
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from shows.models import Performance, Show
+from venues.models import PriceCategory, Row, Seat, Section, Venue
+
+from .claims import (
+    BOOKED_EXPIRES_MS,
+    claim_seats,
+    claims_key,
+    hold_booked_claims_on_commit,
+    release_claims,
+    seed_claims,
+    sync_claims,
+)
+from .models import Booking, SeatReservation
+
+
+def redis_available():
+    try:
+        return get_redis_connection('default').ping()
+    except RedisError:
+        return False
+
+
+@skipUnless(redis_available(), 'Redis is not reachable')
+class SeatClaimTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        venue = Venue.objects.create(name='Nhà hát Lớn', address='1 Tràng Tiền')
+        category = PriceCategory.objects.create(name='VIP', code='vip-claims', base_price=Decimal('500000'))
+        section = Section.objects.create(venue=venue, name='Tầng 1', code='T1')
+        row = Row.objects.create(section=section, label='A', seat_count=6, price_category=category)
+        cls.seat_ids = [Seat.objects.create(row=row, number=str(number)).id for number in range(1, 7)]
+
+        show = Show.objects.create(
+            name='Vở diễn',
+            slug='vo-dien-claims',
+            category='Kịch',
+            duration_minutes=90,
+            description='Mô tả',
+            venue=venue,
+            service_fee_per_ticket=Decimal('10000')
+        )
+        cls.performance = Performance.objects.create(
+            show=show,
+            datetime=timezone.now() + timedelta(days=7),
+            status='on_sale'
+        )
+
+    def setUp(self):
+        self.redis = get_redis_connection('default')
+        self.key = claims_key(self.performance.id)
+        self.redis.delete(self.key)
+        self.addCleanup(self.redis.delete, self.key)
+        self.expires_at = timezone.now() + timedelta(minutes=10)
+
+    def holder(self, seat_id):
+        value = self.redis.hget(self.key, seat_id)
+        return value.decode() if value is not None else None
+
+    def claim(self, session_id, seat_ids, expires_at=None):
+        return claim_seats(self.performance.id, session_id, seat_ids, expires_at or self.expires_at)
+
+    def test_claim_is_all_or_nothing(self):
+        first, second, third = self.seat_ids[:3]
+        self.assertEqual(self.claim('session-a', [first, second]), [])
+
+        self.assertEqual(self.claim('session-b', [second, third]), [second])
+        self.assertTrue(self.holder(second).startswith('session-a|'))
+        self.assertIsNone(self.holder(third))
+
+    def test_claim_takes_own_and_expired_holds(self):
+        first, second = self.seat_ids[:2]
+        self.claim('session-a', [first])
+        self.claim('session-b', [second], expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.claim('session-a', [first, second]), [])
+        self.assertTrue(self.holder(second).startswith('session-a|'))
+
+    def test_claim_refuses_sold_seats(self):
+        self.claim('session-a', self.seat_ids[1:2])
+        sync_claims(self.performance.id, self.seat_ids[:1], 'sold')
+
+        self.assertEqual(self.holder(self.seat_ids[0]), 'sold')
+        self.assertEqual(self.claim('session-b', self.seat_ids[:1]), self.seat_ids[:1])
+
+    def test_release_keeps_live_holds_of_others(self):
+        first, second, third = self.seat_ids[:3]
+        self.claim('session-a', [first])
+        self.claim('session-b', [second])
+        self.claim('session-c', [third], expires_at=timezone.now() - timedelta(seconds=1))
+
+        release_claims(self.performance.id, [first, second, third], 'session-a')
+
+        self.assertIsNone(self.holder(first))
+        self.assertTrue(self.holder(second).startswith('session-b|'))
+        self.assertIsNone(self.holder(third))
+
+    def test_available_status_drops_any_holder(self):
+        first, second = self.seat_ids[:2]
+        self.claim('session-a', [first])
+        with self.captureOnCommitCallbacks(execute=True):
+            hold_booked_claims_on_commit(self.performance.id, 'session-b', [second])
+
+        sync_claims(self.performance.id, [first, second], 'available')
+
+        self.assertIsNone(self.holder(first))
+        self.assertIsNone(self.holder(second))
+        self.assertEqual(self.claim('session-c', [first, second]), [])
+
+    def test_booked_seats_stay_claimed_past_the_hold(self):
+        seat_id = self.seat_ids[0]
+        self.claim('session-a', [seat_id], expires_at=timezone.now() + timedelta(milliseconds=1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            hold_booked_claims_on_commit(self.performance.id, 'session-a', [seat_id])
+
+        self.assertEqual(self.holder(seat_id), f'session-a|{BOOKED_EXPIRES_MS}')
+        self.assertEqual(self.claim('session-b', [seat_id]), [seat_id])
+
+    def test_seed_loads_the_holding_rows(self):
+        booking = Booking.objects.create(
+            booking_code='BKCLAIMS',
+            performance=self.performance,
+            customer_name='Nguyễn Văn A',
+            customer_email='a@example.com',
+            customer_phone='0900000000',
+            total_amount=Decimal('500000'),
+            final_amount=Decimal('510000'),
+            session_id='session-booked',
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        held, booked, sold, blocked, expired, free = self.seat_ids
+        rows = [
+            (held, 'reserved', 'session-a', self.expires_at, None),
+            (booked, 'reserved', 'session-booked', booking.expires_at, booking),
+            (sold, 'sold', '', None, None),
+            (blocked, 'reserved', '', None, None),
+            (expired, 'reserved', 'session-b', timezone.now() - timedelta(minutes=1), None),
+            (free, 'available', '', None, None),
+        ]
+        for seat_id, seat_status, session_id, expires_at, seat_booking in rows:
+            SeatReservation.objects.create(
+                performance=self.performance,
+                seat_id=seat_id,
+                status=seat_status,
+                price=Decimal('500000'),
+                session_id=session_id,
+                expires_at=expires_at,
+                booking=seat_booking
+            )
+
+        seed_claims(self.performance.id)
+
+        self.assertEqual(self.holder(held), f'session-a|{int(self.expires_at.timestamp() * 1000)}')
+        self.assertEqual(self.holder(booked), f'session-booked|{BOOKED_EXPIRES_MS}')
+        self.assertEqual(self.holder(sold), 'sold')
+        self.assertEqual(self.holder(blocked), 'blocked')
+        self.assertIsNone(self.holder(expired))
+        self.assertIsNone(self.holder(free))
+
+        # Seeding once only, later claims are not overwritten
+        self.claim('session-c', [free])
+        seed_claims(self.performance.id)
+        self.assertTrue(self.holder(free).startswith('session-c|'))
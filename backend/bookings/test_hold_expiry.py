@@ -0,0 +1,129 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from shows.models import Performance, Show
+from venues.models import PriceCategory, Row, Seat, Section, Venue
+
+from . import hold_expiry
+from .hold_expiry import expire_holds
+from .models import Booking, BookingHistory, SeatReservation
+
+
+class ExpireHoldsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        venue = Venue.objects.create(name='Nhà hát Lớn', address='1 Tràng Tiền')
+        category = PriceCategory.objects.create(name='VIP', code='vip-expiry', base_price=Decimal('500000'))
+        section = Section.objects.create(venue=venue, name='Tầng 1', code='T1')
+        row = Row.objects.create(section=section, label='A', seat_count=6, price_category=category)
+        cls.seats = [Seat.objects.create(row=row, number=str(number)) for number in range(1, 7)]
+
+        show = Show.objects.create(
+            name='Vở diễn',
+            slug='vo-dien-hold-expiry',
+            category='Kịch',
+            duration_minutes=90,
+            description='Mô tả',
+            venue=venue,
+            service_fee_per_ticket=Decimal('10000')
+        )
+        cls.performance = Performance.objects.create(
+            show=show,
+            datetime=timezone.now() + timedelta(days=7),
+            status='on_sale'
+        )
+
+    def hold(self, seat, session_id, expires_in, booking=None):
+        return SeatReservation.objects.create(
+            performance=self.performance,
+            seat=seat,
+            status='reserved',
+            price=Decimal('500000'),
+            session_id=session_id,
+            expires_at=timezone.now() + expires_in,
+            booking=booking
+        )
+
+    def test_releases_expired_holds_in_bulk(self):
+        expired = [
+            self.hold(self.seats[0], 'session-a', timedelta(minutes=-1)),
+            self.hold(self.seats[1], 'session-a', timedelta(minutes=-1)),
+            self.hold(self.seats[2], 'session-b', timedelta(seconds=-1)),
+        ]
+
+        self.assertEqual(expire_holds(batch_size=2), 3)
+
+        for reservation in expired:
+            reservation.refresh_from_db()
+            self.assertEqual(reservation.status, 'available')
+            self.assertEqual(reservation.session_id, '')
+            self.assertIsNone(reservation.expires_at)
+
+    def test_logs_one_history_entry_per_session(self):
+        self.hold(self.seats[0], 'session-a', timedelta(minutes=-1))
+        self.hold(self.seats[1], 'session-a', timedelta(minutes=-1))
+        self.hold(self.seats[2], 'session-b', timedelta(minutes=-1))
+
+        expire_holds(task='test')
+
+        history = {entry.session_id: entry for entry in BookingHistory.objects.filter(action='seat_released')}
+        self.assertEqual(set(history), {'session-a', 'session-b'})
+        self.assertEqual(
+            sorted(seat['seat_id'] for seat in history['session-a'].seats_snapshot),
+            [self.seats[0].id, self.seats[1].id]
+        )
+        self.assertEqual(history['session-a'].seats_snapshot[0]['row'], 'A')
+        self.assertEqual(history['session-b'].extra_data, {
+            'reason': 'expired_reservation',
+            'task': 'test',
+            'performance_id': self.performance.id,
+        })
+
+    def test_reads_the_geometry_once_per_performance(self):
+        for seat in self.seats[:4]:
+            self.hold(seat, f'session-{seat.id}', timedelta(minutes=-1))
+
+        with mock.patch('bookings.hold_expiry.get_venue_geometry', wraps=hold_expiry.get_venue_geometry) as geometry:
+            self.assertEqual(expire_holds(), 4)
+
+        geometry.assert_called_once()
+
+    def test_keeps_live_and_booked_holds(self):
+        booking = Booking.objects.create(
+            booking_code='BKEXPIRY',
+            performance=self.performance,
+            customer_name='Nguyễn Văn A',
+            customer_email='a@example.com',
+            customer_phone='0900000000',
+            total_amount=Decimal('500000'),
+            final_amount=Decimal('510000'),
+            session_id='session-booked',
+            expires_at=timezone.now() + timedelta(minutes=10)
+        )
+        live = self.hold(self.seats[0], 'session-live', timedelta(minutes=5))
+        booked = self.hold(self.seats[1], 'session-booked', timedelta(minutes=-1), booking=booking)
+
+        self.assertEqual(expire_holds(), 0)
+
+        live.refresh_from_db()
+        booked.refresh_from_db()
+        self.assertEqual(live.status, 'reserved')
+        self.assertEqual(booked.status, 'reserved')
+        self.assertFalse(BookingHistory.objects.filter(action='seat_released').exists())
+
+    def test_only_releases_the_given_holds(self):
+        released = self.hold(self.seats[0], 'session-a', timedelta(minutes=-1))
+        other = self.hold(self.seats[1], 'session-b', timedelta(minutes=-1))
+
+        self.assertEqual(expire_holds([(self.performance.id, 'session-a')]), 1)
+        self.assertEqual(expire_holds([]), 0)
+
+        released.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(released.status, 'available')
+        self.assertEqual(other.status, 'reserved')
@@ -1,3 +1,103 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
 from django.test import TestCase
+from django.utils import timezone
+
+from shows.models import Performance, Show
+from venues.models import PriceCategory, Row, Seat, Section, Venue
+
+from .models import Booking, BookingHistory, SeatReservation
+from .serializers import BookingDetailSerializer, BookingSnapshotSerializer
+from .services import create_booking
+
+
+class BookingCreationQueryBudgetTests(TestCase):
+    session_id = 'session-query-budget'
+
+    @classmethod
+    def setUpTestData(cls):
+        venue = Venue.objects.create(name='Nhà hát Lớn', address='1 Tràng Tiền')
+        category = PriceCategory.objects.create(name='VIP', code='vip-budget', base_price=Decimal('500000'))
+        section = Section.objects.create(venue=venue, name='Tầng 1', code='T1')
+        row = Row.objects.create(section=section, label='A', seat_count=4, price_category=category)
+        cls.seats = [Seat.objects.create(row=row, number=str(number)) for number in range(1, 5)]
+
+        show = Show.objects.create(
+            name='Vở diễn',
+            slug='vo-dien-query-budget',
+            category='Kịch',
+            duration_minutes=90,
+            description='Mô tả',
+            venue=venue,
+            service_fee_per_ticket=Decimal('10000')
+        )
+        cls.performance = Performance.objects.create(
+            show=show,
+            datetime=timezone.now() + timedelta(days=7),
+            status='on_sale'
+        )
+
+    def setUp(self):
+        self.codes = (f'BKTEST{number:02d}' for number in range(100))
+        for seat in self.seats:
+            SeatReservation.objects.create(
+                performance=self.performance,
+                seat=seat,
+                status='reserved',
+                price=Decimal('500000'),
+                session_id=self.session_id,
+                expires_at=timezone.now() + timedelta(minutes=5)
+            )
+
+    def create(self, seat_ids):
+        # The code allocator takes a sequence block once per process, keep it out of the count
+        with mock.patch('bookings.services.generate_booking_code', side_effect=lambda: next(self.codes)):
+            return create_booking(
+                performance_id=self.performance.id,
+                seat_ids=seat_ids,
+                session_id=self.session_id,
+                customer_name='Nguyễn Văn A',
+                customer_email='a@example.com',
+                customer_phone='0900000000'
+            )
+
+    def test_query_count_is_fixed(self):
+        # performance, aggregate, savepoint, booking insert, UPDATE ... RETURNING,
+        # seats, snapshot update, history insert, savepoint release
+        with self.assertNumQueries(9):
+            self.create([seat.id for seat in self.seats[:2]])
+
+        # Taking the seats over from the first booking costs the same
+        with self.assertNumQueries(9):
+            self.create([seat.id for seat in self.seats])
+
+    def test_response_needs_no_queries(self):
+        booking = self.create([seat.id for seat in self.seats[:2]])
+
+        with self.assertNumQueries(0):
+            data = BookingDetailSerializer(booking).data
+
+        self.assertEqual(len(data['seat_reservations']), 2)
+        self.assertEqual(booking.total_amount, Decimal('1000000'))
+        self.assertEqual(booking.final_amount, Decimal('1020000'))
+
+    def test_seats_are_attached(self):
+        booking = self.create([seat.id for seat in self.seats[:2]])
+
+        attached = SeatReservation.objects.filter(booking=booking)
+        self.assertEqual(attached.count(), 2)
+        self.assertTrue(all(reservation.expires_at == booking.expires_at for reservation in attached))
+        self.assertEqual(BookingHistory.objects.filter(booking=booking, action='create_booking').count(), 1)
+
+    def test_snapshot_renders_like_the_serializer(self):
+        booking = self.create([seat.id for seat in self.seats[:2]])
+        expected = BookingDetailSerializer(booking).data
+
+        stored = Booking.objects.get(id=booking.id)
+        with self.assertNumQueries(0):
+            data = BookingSnapshotSerializer(stored).data
 
-# Create your tests here.
+        self.assertEqual(list(data), list(expected))
+        self.assertEqual(data, expected)
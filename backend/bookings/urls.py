@@ -3,7 +3,11 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     BookingViewSet,
     performance_seat_map,
+    performance_seat_map_changes,
+    performance_seat_map_status,
+    performance_queue,
     reserve_seats,
+    reserve_best_available,
     release_seats,
     search_bookings,
     get_session_reservations,
@@ -15,7 +19,11 @@ router.register('bookings', BookingViewSet, basename='booking')
 urlpatterns = [
     path('bookings/search/', search_bookings, name='booking-search'),
     path('performances/<int:performance_id>/seat-map/', performance_seat_map, name='seat-map'),
+    path('performances/<int:performance_id>/seat-map/changes/', performance_seat_map_changes, name='seat-map-changes'),
+    path('performances/<int:performance_id>/seat-map/status/', performance_seat_map_status, name='seat-map-status'),
+    path('performances/<int:performance_id>/queue/', performance_queue, name='performance-queue'),
     path('seats/reserve/', reserve_seats, name='reserve-seats'),
+    path('seats/best-available/', reserve_best_available, name='best-available'),
     path('seats/release/', release_seats, name='release-seats'),
     path('seats/session-reservations/', get_session_reservations, name='session-reservations'),
     path('', include(router.urls)),
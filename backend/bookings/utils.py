@@ -19,16 +19,24 @@ def generate_secure_session_id(request):
 def validate_session_ownership(session_id, request):
     """Validate that session belongs to current user"""
     from .models import SeatReservation
+    from .session_registry import get_session_holds
 
-    existing = SeatReservation.objects.filter(
-        session_id=session_id,
-        status='reserved'
-    ).first()
+    holds = get_session_holds(session_id)
+    if holds is not None:
+        if not holds['performances']:
+            return True
+        stored_ip = holds['ip']
+    else:
+        existing = SeatReservation.objects.holding().filter(
+            session_id=session_id,
+            status='reserved'
+        ).first()
 
-    if not existing:
-        return True
+        if not existing:
+            return True
+
+        stored_ip = getattr(existing, 'client_ip', None)
 
-    stored_ip = getattr(existing, 'client_ip', None)
     current_ip = request.META.get('REMOTE_ADDR')
 
     if stored_ip and stored_ip != current_ip:
@@ -1,19 +1,49 @@
+import base64
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from .email_service import send_booking_confirmation
 from logzero import logger
-from shows.models import Performance, PerformancePrice
-from venues.models import Seat
+from redis.exceptions import RedisError
+from shows.models import Performance
+from core.idempotency import idempotent
+from core.conditional import make_etag, etag_matches, not_modified, set_etag
+from core.versioning import get_versions
+from core.renderers import COLUMNAR_RENDERER_CLASSES, is_columnar, render_json
+from core.throttling import BookingCreateThrottle, ReleaseSeatsThrottle, ReserveSeatsThrottle
+from .seat_map import get_venue_geometry, get_columnar_geometry, layout_version_name
+from .seat_map_snapshot import get_current_snapshot
+from .pricing import get_price_table, get_seat_prices
+from .claims import SeatClaimConflict, claim_and_persist, release_claims
+from .claim_batching import batching_enabled, submit_claim
+from .session_registry import get_session_holds, register_hold_on_commit
+from .hold_expiry import schedule_hold_expiry_on_commit
+from .booking_queue import async_submission_enabled, expire_ticket, get_ticket, is_ticket_late, submit_booking
+from .read_model import has_snapshot, prefetch_missing_snapshots, serialize_booking
+from .best_available import find_best_blocks, mark_taken
+from .waiting_room import get_queue_status, get_request_queue_token, is_admitted, join_queue
+from .seat_status import (
+    STATUS_NAMES,
+    get_performance_venue_id,
+    get_status_bitmap,
+    get_status_version,
+    get_seat_status_snapshot,
+    get_seat_status_changes,
+    record_seat_status,
+    record_reservations_status,
+)
 from .serializers import (
     BookingDetailSerializer,
+    BookingSnapshotSerializer,
     BookingCreateSerializer,
+    BestAvailableSerializer,
     ReserveSeatSerializer,
 )
 from .models import Booking, SeatReservation, BookingHistory
 from django.conf import settings
 from django.db.models import Prefetch, Q
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view
+from rest_framework.decorators import action, api_view, renderer_classes, throttle_classes
+from rest_framework.settings import api_settings
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
@@ -22,47 +52,30 @@ from datetime import timezone as dt_timezone
 from datetime import timedelta
 
 
-def get_performance_seat_map(performance):
-    """Get complete seat map for a performance - OPTIMIZED"""
-    venue = performance.show.venue
-    seats = Seat.objects.filter(
-        row__section__venue=venue,
-        status='active'
-    ).select_related(
-        'row',
-        'row__section',
-        'row__price_category',
-        'price_category'
-    ).prefetch_related(
-        Prefetch(
-            'reservations',
-            queryset=SeatReservation.objects.filter(
-                performance=performance,
-                status__in=['reserved', 'sold', 'blocked']
-            ).only('seat_id', 'status'),
-            to_attr='active_reservations'
-        )
-    )
+def get_performance_seat_map(performance, columnar=False):
+    """
+    Get complete seat map for a performance.
+
+    The venue geometry comes from the per-venue cache in `seat_map`, the
+    seat statuses from the Redis bitmap in `seat_status` and the prices from
+    the compiled price table in `pricing`. `status_version` is the version to
+    pass as `since` to the seat map changes endpoint.
 
-    performance_prices = PerformancePrice.objects.filter(
-        performance=performance
-    ).values('price_category_id', 'price')
-    price_map = {pp['price_category_id']: pp['price'] for pp in performance_prices}
+    With `columnar` the seats are sent as parallel arrays referencing
+    lookup tables (see `seat_map.build_columnar_geometry`) instead of one
+    dict per seat.
+    """
+    geometry = get_venue_geometry(performance.show.venue_id)
+
+    status_codes, status_version = get_seat_status_snapshot(performance.id, geometry)
+    price_table = get_price_table(performance.id, geometry)
+    category_prices = price_table['category_price_values']
 
     utc_plus_7 = dt_timezone(timedelta(hours=7))
     datetime_in_utc7 = performance.datetime.astimezone(utc_plus_7)
 
     seat_map_data = {
-        'venue': {
-            'name': venue.name,
-            'address': venue.address,
-            'phone': venue.phone,
-            'hotline': venue.hotline_display,
-            'layout_image_url': venue.layout_image.url if venue.layout_image else None,
-            'checkin_minutes_before': venue.checkin_minutes_before,
-            'width': 800,
-            'height': 900
-        },
+        'venue': geometry['venue'],
         'show': {
             'name': performance.show.name,
             'description': performance.show.description,
@@ -75,269 +88,276 @@ def get_performance_seat_map(performance):
             'time': datetime_in_utc7.strftime('%H:%M'),
             'day_of_week': ['Thứ Hai', 'Thứ Ba', 'Thứ Tư', 'Thứ Năm', 'Thứ Sáu', 'Thứ Bảy', 'Chủ Nhật'][datetime_in_utc7.weekday()],
         },
-        'sections': [],
+        'sections': geometry['sections'],
         'seats': [],
-        'numbering_info': {}
+        'numbering_info': geometry['numbering_info'],
+        'status_version': status_version,
     }
 
-    sections_dict = {}
-    rows_dict = {}
-
-    for seat in seats:
-        section = seat.row.section
-        row = seat.row
-
-        # Add section if not exists
-        if section.id not in sections_dict:
-            sections_dict[section.id] = {
-                'id': section.code,
-                'name': section.name,
-                'position': {
-                    'x': section.position_x,
-                    'y': section.position_y
-                }
-            }
-            seat_map_data['sections'].append(sections_dict[section.id])
+    if columnar:
+        columnar_geometry = get_columnar_geometry(geometry)
+        seat_map_data['format'] = 'columnar'
+        seat_map_data['lookups'] = {
+            'sections': columnar_geometry['sections'],
+            'rows': columnar_geometry['rows'],
+            'categories': [
+                dict(category, price=category_prices.get(price_category_id, float(base_price)))
+                for category, (price_category_id, base_price) in zip(
+                    columnar_geometry['categories'], columnar_geometry['category_prices']
+                )
+            ],
+            'statuses': [STATUS_NAMES[code] for code in sorted(STATUS_NAMES)],
+        }
+        seat_map_data['seats'] = dict(columnar_geometry['seats'], status=status_codes)
+        seat_map_data['seat_images'] = columnar_geometry['seat_images']
+    else:
+        for seat, seat_price, status_code in zip(
+            geometry['seats'], price_table['seat_price_values'], status_codes
+        ):
+            seat_data = dict(seat)
+            seat_data['status'] = STATUS_NAMES[status_code]
+            seat_data['price'] = seat_price
+            seat_map_data['seats'].append(seat_data)
 
-        # Track row info
-        if row.id not in rows_dict:
-            rows_dict[row.id] = {
-                'row': row,
-                'seats': []
-            }
-        rows_dict[row.id]['seats'].append(seat)
+    seat_map_data['price_categories'] = {}
+    for pc in geometry['price_categories']:
+        seat_map_data['price_categories'][pc['code']] = {
+            'name': pc['name'],
+            'price': category_prices[pc['id']],
+            'color': pc['color']
+        }
 
-        # ✅ Determine seat status from prefetched data (NO extra query)
-        seat_status = (
-            seat.active_reservations[0].status
-            if seat.active_reservations
-            else 'available'
-        )
+    return seat_map_data
 
-        # Get price per seat
-        effective_pc = seat.effective_price_category
-        price_category_id = effective_pc.id if effective_pc else None
 
-        seat_price = price_map.get(
-            price_category_id,
-            effective_pc.base_price if effective_pc else 0
-        )
+def get_seat_map_etag(performance_id, representation='json'):
+    """
+    ETag of the seat map: venue layout, show/performance data (incl. prices)
+    and seat status versions. Needs no ORM query once the venue is known.
+    """
+    venue_id = get_performance_venue_id(performance_id)
+    if venue_id is None:
+        return None
+    layout_name = layout_version_name(venue_id)
+    versions = get_versions(layout_name, 'shows')
+    return make_etag(
+        versions[layout_name], versions['shows'], get_status_version(performance_id), representation
+    )
 
-        # Safe number conversion
-        try:
-            seat_number = int(seat.number)
-            remainder = seat_number % 2
-            is_odd_number = remainder == 1
-            is_even_number = remainder == 0
-            seat_side = 'left' if is_odd_number else 'right'
-        except (ValueError, TypeError):
-            seat_number = seat.display_label
-            is_odd_number = False
-            is_even_number = False
-            seat_side = 'center'
-
-        # Build seat data
-        seat_data = {
-            'id': seat.id,
-            'section_id': section.code,
-            'section_name': section.name,
-            'row': seat.row.label,
-            'row_position_y': seat.row.position_y,
-            'row_spacing_after': seat.row.spacing_after,
-            'number': seat.number,
-            'display_number': seat.display_label,
-            'full_label': seat.full_display_label,
-            'position_x': seat.position_x,
-            'position_y': seat.position_y,
-            'spacing_after': seat.spacing_after,
-            'status': seat_status,
-
-            # Price & Category
-            'price': float(seat_price),
-            'price_category': effective_pc.code if effective_pc else 'standard',
-            'price_category_color': effective_pc.color if effective_pc else '#10B981',
-            'effective_price_category_name': effective_pc.name if effective_pc else 'Standard',
-
-            'seat_image_url': seat.seat_image.url if seat.seat_image else None,
-            'is_accessible': seat.is_accessible,
-            'numbering_style': safe_getattr(seat.row, 'numbering_style', 'left_to_right'),
-            'is_odd': is_odd_number,
-            'is_even': is_even_number,
-            'side': seat_side
-        }
 
-        seat_map_data['seats'].append(seat_data)
-
-    for row_id, row_data in rows_dict.items():
-        row = row_data['row']
-        row_key = f"{row.section.code}-{row.label}"
-
-        seat_map_data['numbering_info'][row_key] = {
-            'numbering_style': safe_getattr(row, 'numbering_style', 'left_to_right'),
-            'center_x': safe_getattr(row, 'center_x', 400),
-            'aisle_width': safe_getattr(row, 'aisle_width', 60),
-            'has_center_aisle': safe_getattr(row, 'has_center_aisle', True),
-            'gaps': safe_getattr(row, 'gaps', []),
-            'total_seats': row.seat_count,
-            'actual_seats': len(row_data['seats']),
-            'actual_seat_numbers': [s.number for s in row_data['seats']],
-        }
+def queue_admission_required(request, performance_id):
+    """403 for visitors the waiting room has not admitted yet, None otherwise"""
+    if is_admitted(performance_id, get_request_queue_token(request)):
+        return None
+    return Response(
+        {'error': 'Vui lòng chờ đến lượt trong phòng chờ.', 'queue_required': True},
+        status=status.HTTP_403_FORBIDDEN
+    )
 
-    from venues.models import PriceCategory
-    all_categories = PriceCategory.objects.all().order_by('base_price')
 
-    seat_map_data['price_categories'] = {}
-    for pc in all_categories:
-        performance_price = price_map.get(pc.id, pc.base_price)
-        seat_map_data['price_categories'][pc.code] = {
-            'name': pc.name,
-            'price': float(performance_price),
-            'color': pc.color
-        }
+# Formats whose renderer passes pre-rendered JSON bytes through
+RAW_SEAT_MAP_FORMATS = {'json', 'columnar'}
+RENDERED_SEAT_MAPS_MAX = 64
 
-    return seat_map_data
+# (performance_id, format) -> (etag, rendered body), bodies repeat between status changes
+_rendered_seat_maps = {}
 
 
-def safe_getattr(obj, attr_name, default_value):
-    """Safely get attribute with fallback"""
-    try:
-        return getattr(obj, attr_name, default_value)
-    except (AttributeError, TypeError):
-        return default_value
+def render_performance_seat_map(request, performance_id, etag):
+    """
+    Seat map response body. JSON formats are rendered once per ETag and
+    returned as bytes, skipping serialization for repeated requests.
+    """
+    representation = request.accepted_renderer.format
+    raw = etag is not None and representation in RAW_SEAT_MAP_FORMATS
+    cache_key = (performance_id, representation)
+
+    if raw:
+        rendered = _rendered_seat_maps.get(cache_key)
+        if rendered and rendered[0] == etag:
+            return rendered[1]
+
+    performance = get_object_or_404(
+        Performance.objects.select_related('show'), id=performance_id
+    )
+    seat_map_data = get_performance_seat_map(performance, columnar=is_columnar(request))
+    if not raw:
+        return seat_map_data
+
+    content = render_json(seat_map_data)
+    if len(_rendered_seat_maps) >= RENDERED_SEAT_MAPS_MAX:
+        _rendered_seat_maps.clear()
+    _rendered_seat_maps[cache_key] = (etag, content)
+    return content
 
 
 @api_view(['GET'])
+@renderer_classes(api_settings.DEFAULT_RENDERER_CLASSES + COLUMNAR_RENDERER_CLASSES)
 def performance_seat_map(request, performance_id):
-    """API endpoint to get seat map"""
-    performance = get_object_or_404(Performance, id=performance_id)
-    seat_map_data = get_performance_seat_map(performance)
-    return Response(seat_map_data)
+    """API endpoint to get seat map, `?format=columnar|msgpack` for the compact form"""
+    denied = queue_admission_required(request, performance_id)
+    if denied:
+        return denied
 
+    etag = get_seat_map_etag(performance_id, request.accepted_renderer.format)
+    if etag_matches(request, etag):
+        return not_modified(etag)
 
-@api_view(['POST'])
-@csrf_exempt
-def reserve_seats(request):
-    """Reserve seats temporarily"""
-    from .utils import validate_session_ownership
-    serializer = ReserveSeatSerializer(data=request.data)
-    serializer.is_valid(raise_exception=True)
+    return set_etag(Response(render_performance_seat_map(request, performance_id, etag)), etag)
 
-    performance_id = serializer.validated_data['performance_id']
-    seat_ids = serializer.validated_data['seat_ids']
-    session_id = serializer.validated_data['session_id']
 
-    if not validate_session_ownership(session_id, request):
-        logger.warning(f"⚠️ Potential session hijacking: {session_id}")
+@api_view(['GET'])
+def performance_seat_map_status(request, performance_id):
+    """
+    API endpoint for the seat status overlay of a prebuilt seat map snapshot.
+    `status_bitmap` is base64 of 2 bits per seat in snapshot seat order
+    (codes index `statuses`); `snapshot_url` is None while no current
+    snapshot exists and the regular seat map endpoint must be used.
+    """
+    denied = queue_admission_required(request, performance_id)
+    if denied:
+        return denied
+
+    venue_id = get_performance_venue_id(performance_id)
+    if venue_id is None:
         return Response(
-            {'error': 'Session không hợp lệ'},
-            status=status.HTTP_403_FORBIDDEN
+            {'error': 'Không tìm thấy suất diễn'},
+            status=status.HTTP_404_NOT_FOUND
         )
-    performance = Performance.objects.get(id=performance_id)
-    client_ip = request.META.get('REMOTE_ADDR')
-    with transaction.atomic():
-        # Release expired reservations that are not linked to any booking yet
-        expired_reservations = SeatReservation.objects.filter(
-            performance=performance,
-            status='reserved',
-            expires_at__lt=timezone.now(),
-            booking__isnull=True
-        )
-        expired_reservations.update(status='available', session_id='', expires_at=None, client_ip=None)
 
-        existing_session_reservations = SeatReservation.objects.filter(
-            performance=performance,
-            session_id=session_id,
-            status='reserved',
-            expires_at__gt=timezone.now()
+    snapshot = get_current_snapshot(performance_id, venue_id)
+    snapshot_name = snapshot['url'].rsplit('/', 1)[1] if snapshot else 'none'
+    etag = get_seat_map_etag(performance_id, f'status-{snapshot_name}')
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    geometry = get_venue_geometry(venue_id)
+    bitmap, status_version = get_status_bitmap(performance_id, geometry)
+
+    return set_etag(Response({
+        'snapshot_url': snapshot['url'] if snapshot else None,
+        'layout_version': geometry['layout_version'],
+        'status_version': status_version,
+        'seat_count': len(geometry['seats']),
+        'statuses': [STATUS_NAMES[code] for code in sorted(STATUS_NAMES)],
+        'status_bitmap': base64.b64encode(bitmap).decode(),
+    }), etag)
+
+
+@api_view(['GET'])
+def performance_seat_map_changes(request, performance_id):
+    """
+    API endpoint to get seat status changes since a seat map version.
+    Served from Redis only, clients poll it instead of reloading the seat map.
+    """
+    try:
+        since = int(request.query_params.get('since', ''))
+    except ValueError:
+        return Response(
+            {'error': 'Tham số since không hợp lệ'},
+            status=status.HTTP_400_BAD_REQUEST
         )
 
-        existing_seat_ids = set(existing_session_reservations.values_list('seat_id', flat=True))
-        new_seat_ids = set(seat_ids)
-        total_seat_ids = existing_seat_ids | new_seat_ids  # Union of both sets
+    return Response(get_seat_status_changes(performance_id, since))
 
-        if len(total_seat_ids) > 8:
-            return Response(
-                {
-                    'error': f'Không thể giữ quá 8 ghế. Bạn đang có {len(existing_seat_ids)} ghế, yêu cầu thêm {len(new_seat_ids)} ghế.',
-                    'current_count': len(existing_seat_ids),
-                    'requested_count': len(new_seat_ids),
-                    'max_allowed': 8
-                },
-                status=status.HTTP_400_BAD_REQUEST
-            )
 
-        # Check if any requested seats are already reserved (by another session) or sold
-        conflicting_reservations = SeatReservation.objects.filter(
-            performance=performance,
-            seat_id__in=seat_ids,
-            status__in=['reserved', 'sold']
-        ).exclude(session_id=session_id)
+@api_view(['GET', 'POST'])
+@csrf_exempt
+def performance_queue(request, performance_id):
+    """
+    Waiting room of a performance. POST joins the queue (a valid token keeps
+    its place), GET polls the position. Both return the admission state;
+    `admitted` is always true while the queue is disabled.
+    """
+    token = get_request_queue_token(request)
+    queue_status = get_queue_status(performance_id, token)
 
-        if conflicting_reservations.exists():
-            return Response(
-                {'error': 'Một số ghế đã được đặt hoặc đang được giữ bởi người khác. Vui lòng tải lại trang.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+    if request.method == 'POST' and not queue_status['admitted'] and queue_status['token'] is None:
+        queue_status = get_queue_status(performance_id, join_queue(performance_id, token))
 
-        seats = Seat.objects.filter(id__in=seat_ids).select_related(
-            'row', 'row__section', 'row__price_category', 'price_category'
-        )
-        seat_dict = {seat.id: seat for seat in seats}
+    return Response(queue_status)
 
-        if len(seat_dict) != len(set(seat_ids)):
-            return Response({'error': 'Một hoặc nhiều ghế không hợp lệ.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Get performance prices
-        performance_prices = PerformancePrice.objects.filter(
-            performance=performance
-        ).values('price_category_id', 'price')
-        price_map = {pp['price_category_id']: pp['price'] for pp in performance_prices}
+def hold_seats(request, performance, session_id, seat_ids):
+    """
+    Hold `seat_ids` for `session_id`, all or none, on top of the seats the
+    session already holds. Raises `SeatClaimConflict` (with the taken
+    `seat_ids`) when another session holds or bought one of them.
 
-        reserved_seats = []
-        timeout_minutes = getattr(settings, 'SEAT_RESERVATION_TIMEOUT_MINUTES', 5)
-        existing_reservation = SeatReservation.objects.filter(
-            performance=performance,
-            session_id=session_id,
-            status='reserved',
-            expires_at__isnull=False
-        ).first()
+    The claim commits on its own (or in the coordinator, see
+    `claim_batching`) before the bookkeeping transaction opens, so no
+    transaction stays open while the request waits for the coordinator.
+    """
+    client_ip = request.META.get('REMOTE_ADDR')
+    existing_seat_ids = set(SeatReservation.objects.filter(
+        performance=performance,
+        session_id=session_id,
+        status='reserved',
+        expires_at__gt=timezone.now()
+    ).values_list('seat_id', flat=True))
+    new_seat_ids = set(seat_ids)
+    total_seat_ids = existing_seat_ids | new_seat_ids  # Union of both sets
 
-        if existing_reservation and existing_reservation.expires_at:
-            expires_at = existing_reservation.expires_at
-        else:
-            expires_at = timezone.now() + timedelta(minutes=timeout_minutes)
+    if len(total_seat_ids) > 8:
+        return Response(
+            {
+                'error': f'Không thể giữ quá 8 ghế. Bạn đang có {len(existing_seat_ids)} ghế, yêu cầu thêm {len(new_seat_ids)} ghế.',
+                'current_count': len(existing_seat_ids),
+                'requested_count': len(new_seat_ids),
+                'max_allowed': 8
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-        for seat_id in seat_ids:
-            seat = seat_dict[seat_id]
-            effective_pc = seat.effective_price_category
-            price_category_id = effective_pc.id if effective_pc else None
-            seat_price = price_map.get(
-                price_category_id,
-                effective_pc.base_price if effective_pc else 0
-            )
+    geometry = get_venue_geometry(get_performance_venue_id(performance.id))
+    seat_prices = get_seat_prices(performance.id, seat_ids, geometry)
 
-            reservation, created = SeatReservation.objects.update_or_create(
-                performance=performance,
-                seat_id=seat_id,
-                defaults={
-                    'status': 'reserved',
-                    'session_id': session_id,
-                    'price': seat_price,
-                    'expires_at': expires_at,
-                    'client_ip': client_ip,
-                    'booking': None
-                }
-            )
+    if len(seat_prices) != len(set(seat_ids)):
+        return Response({'error': 'Một hoặc nhiều ghế không hợp lệ.'}, status=status.HTTP_400_BAD_REQUEST)
 
+    timeout_minutes = getattr(settings, 'SEAT_RESERVATION_TIMEOUT_MINUTES', 5)
+    # Expired holds are available again, see `SeatReservationQuerySet`
+    existing_reservation = SeatReservation.objects.filter(
+        performance=performance,
+        session_id=session_id,
+        status='reserved',
+        expires_at__gt=timezone.now()
+    ).first()
+
+    if existing_reservation and existing_reservation.expires_at:
+        expires_at = existing_reservation.expires_at
+    else:
+        expires_at = timezone.now() + timedelta(minutes=timeout_minutes)
+
+    # All seats or none: Redis claim first, then one conditional bulk write
+    claim = submit_claim if batching_enabled() else claim_and_persist
+    try:
+        conflicts = claim(performance.id, session_id, seat_prices, expires_at, client_ip)
+    except Exception:
+        # The Redis claim does not roll back with the database write
+        release_claims(performance.id, seat_ids, session_id)
+        raise
+    if conflicts:
+        raise SeatClaimConflict('Seats are held by another session', seat_ids=conflicts)
+
+    # The rows are committed, the claims stay until the hold is released or expires
+    with transaction.atomic():
+        reserved_seats = []
+        for seat_id in seat_ids:
+            seat = geometry['seats'][geometry['seat_ordinals'][seat_id]]
             reserved_seats.append({
-                'id': seat.id,
-                'row': seat.row.label,
-                'number': seat.display_label,
-                'full_label': seat.full_display_label,
-                'section_name': seat.row.section.name,
-                'price': float(seat_price)
+                'id': seat['id'],
+                'row': seat['row'],
+                'number': seat['display_number'],
+                'full_label': seat['full_label'],
+                'section_name': seat['section_name'],
+                'price': float(seat_prices[seat_id])
             })
 
+        record_seat_status(performance.id, seat_ids, 'reserved')
+        register_hold_on_commit(session_id, performance.id, seat_prices, expires_at, client_ip)
+        schedule_hold_expiry_on_commit(performance.id, session_id, expires_at)
+
         BookingHistory.log_action(
             booking=None,
             action='reserve_seat',
@@ -349,7 +369,7 @@ def reserve_seats(request):
             ),
             session_id=session_id,
             extra_data={
-                'performance_id': performance_id,
+                'performance_id': performance.id,
                 'seat_count': len(seat_ids)
             }
         )
@@ -362,6 +382,87 @@ def reserve_seats(request):
 
 
 @api_view(['POST'])
+@throttle_classes([ReserveSeatsThrottle])
+@csrf_exempt
+def reserve_seats(request):
+    """Reserve seats temporarily"""
+    from .utils import validate_session_ownership
+    serializer = ReserveSeatSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    performance_id = serializer.validated_data['performance_id']
+    seat_ids = serializer.validated_data['seat_ids']
+    session_id = serializer.validated_data['session_id']
+
+    denied = queue_admission_required(request, performance_id)
+    if denied:
+        return denied
+
+    if not validate_session_ownership(session_id, request):
+        logger.warning(f"⚠️ Potential session hijacking: {session_id}")
+        return Response(
+            {'error': 'Session không hợp lệ'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    performance = Performance.objects.get(id=performance_id)
+    try:
+        return hold_seats(request, performance, session_id, seat_ids)
+    except SeatClaimConflict:
+        return Response(
+            {'error': 'Một số ghế đã được đặt hoặc đang được giữ bởi người khác. Vui lòng tải lại trang.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+
+# Blocks tried before giving up when other sessions take the best ones first
+BEST_AVAILABLE_ATTEMPTS = 3
+
+
+@api_view(['POST'])
+@throttle_classes([ReserveSeatsThrottle])
+@csrf_exempt
+def reserve_best_available(request):
+    """Reserve the best block of `count` adjacent seats, optionally in one price category"""
+    from .utils import validate_session_ownership
+    serializer = BestAvailableSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    performance_id = serializer.validated_data['performance_id']
+    count = serializer.validated_data['count']
+    price_category = serializer.validated_data.get('price_category')
+    session_id = serializer.validated_data['session_id']
+
+    denied = queue_admission_required(request, performance_id)
+    if denied:
+        return denied
+
+    if not validate_session_ownership(session_id, request):
+        logger.warning(f"⚠️ Potential session hijacking: {session_id}")
+        return Response(
+            {'error': 'Session không hợp lệ'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    performance = Performance.objects.get(id=performance_id)
+    geometry = get_venue_geometry(get_performance_venue_id(performance.id))
+
+    for _ in range(BEST_AVAILABLE_ATTEMPTS):
+        blocks = find_best_blocks(performance.id, geometry, count, price_category, limit=1)
+        if not blocks:
+            break
+        try:
+            return hold_seats(request, performance, session_id, blocks[0])
+        except SeatClaimConflict as e:
+            # Taken since the last status change reached this process
+            mark_taken(performance.id, geometry, e.seat_ids or blocks[0])
+
+    return Response(
+        {'error': f'Không còn {count} ghế liền nhau phù hợp. Vui lòng chọn ghế trên sơ đồ.'},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+@api_view(['POST'])
+@throttle_classes([ReleaseSeatsThrottle])
 @csrf_exempt
 def release_seats(request):
     """
@@ -377,20 +478,24 @@ def release_seats(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # CRITICAL FIX: Only release seats that are temporarily reserved and NOT yet part of a booking.
-    reservations_to_release = SeatReservation.objects.filter(
-        session_id=session_id,
-        seat_id__in=seat_ids,
-        status='reserved',
-        booking__isnull=True  # This ensures we don't release seats for a pending payment.
-    )
+    with transaction.atomic():
+        # CRITICAL FIX: Only release seats that are temporarily reserved and NOT yet part of a booking.
+        reservations_to_release = SeatReservation.objects.filter(
+            session_id=session_id,
+            seat_id__in=seat_ids,
+            status='reserved',
+            booking__isnull=True  # This ensures we don't release seats for a pending payment.
+        )
+        released = list(reservations_to_release.select_for_update().values_list('performance_id', 'seat_id'))
 
-    count = reservations_to_release.update(
-        status='available',
-        session_id='',
-        expires_at=None,
-        client_ip=None
-    )
+        count = reservations_to_release.update(
+            status='available',
+            session_id='',
+            expires_at=None,
+            client_ip=None
+        )
+        # Also drops the seat claims and the session registry entries
+        record_reservations_status(released, 'available')
 
     if count > 0:
         BookingHistory.log_action(
@@ -427,24 +532,13 @@ def search_bookings(request):
         Q(booking_code__iexact=search_query) | Q(customer_phone__exact=search_query),
         status='paid',
         performance__datetime__date__gte=cutoff_date
-    ).select_related(
-        'performance',
-        'performance__show',
-        'performance__show__venue'
-    ).prefetch_related(
-        Prefetch(
-            'seat_reservations',
-            queryset=SeatReservation.objects.select_related(
-                'seat', 'seat__row', 'seat__row__section'
-            )
-        )
     ).order_by('-performance__datetime')
 
     if not bookings.exists():
         return Response([], status=status.HTTP_200_OK)
 
-    serializer = BookingDetailSerializer(bookings, many=True)
-    return Response(serializer.data)
+    # Rendered from the booking snapshots, see `read_model`
+    return Response([serialize_booking(booking) for booking in prefetch_missing_snapshots(bookings)])
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -476,26 +570,85 @@ class BookingViewSet(viewsets.ModelViewSet):
             return BookingCreateSerializer
         return BookingDetailSerializer
 
+    def get_throttles(self):
+        if self.action == 'create':
+            return [BookingCreateThrottle()]
+        return super().get_throttles()
+
+    @method_decorator(idempotent('booking_create'))
     def create(self, request, *args, **kwargs):
         """Create a new booking"""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        with transaction.atomic():
-            booking = serializer.save()
+        if async_submission_enabled():
+            ticket = submit_booking(serializer.validated_data, request)
+            if ticket:
+                return Response(
+                    {'ticket': ticket, 'state': 'queued'},
+                    status=status.HTTP_202_ACCEPTED
+                )
+
+        # `bookings.services.create_booking`, comes back with its seats loaded
+        booking = serializer.save()
+        return self.created_response(booking)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Booking detail from the booking row and its snapshot, without joins"""
+        booking = get_object_or_404(Booking, booking_code=kwargs[self.lookup_field])
+        if not has_snapshot(booking):
+            return super().retrieve(request, *args, **kwargs)
+        self.check_object_permissions(request, booking)
+        return Response(BookingSnapshotSerializer(booking).data)
 
-        optimized_booking = self.get_queryset().get(pk=booking.pk)
-        detail_serializer = BookingDetailSerializer(optimized_booking)
-        response_data = detail_serializer.data
+    def created_response(self, booking):
+        response_data = serialize_booking(booking)
 
-        response_data['expires_at'] = optimized_booking.expires_at.isoformat()
-        response_data['timeout_seconds'] = int((optimized_booking.expires_at - timezone.now()).total_seconds())
+        response_data['expires_at'] = booking.expires_at.isoformat()
+        response_data['timeout_seconds'] = int((booking.expires_at - timezone.now()).total_seconds())
 
         return Response(
             response_data,
             status=status.HTTP_201_CREATED
         )
 
+    @action(detail=False, methods=['get'], url_path=r'tickets/(?P<ticket>[\w-]+)')
+    def ticket(self, request, ticket=None):
+        """
+        State of an asynchronous booking submission: 202 while queued or
+        processing, then the response the synchronous create would have given
+        """
+        try:
+            state = get_ticket(ticket)
+        except RedisError as e:
+            logger.warning(f"Cannot read booking ticket {ticket}: {e}")
+            return Response(
+                {'error': 'Không thể kiểm tra trạng thái đơn hàng. Vui lòng thử lại.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        if state is not None and state['state'] == 'queued' and is_ticket_late(state):
+            try:
+                # Unless the worker started it meanwhile, see `booking_queue`
+                expire_ticket(ticket, state)
+                state = get_ticket(ticket)
+            except RedisError as e:
+                logger.warning(f"Cannot expire booking ticket {ticket}: {e}")
+
+        if state is None:
+            return Response(
+                {'error': 'Không tìm thấy yêu cầu đặt vé hoặc yêu cầu đã hết hạn.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if state['state'] == 'failed':
+            return Response(state['errors'], status=status.HTTP_400_BAD_REQUEST)
+        if state['state'] == 'done':
+            return self.created_response(Booking.objects.get(booking_code=state['booking_code']))
+
+        response = Response({'ticket': ticket, 'state': state['state']}, status=status.HTTP_202_ACCEPTED)
+        response['Retry-After'] = '1'
+        return response
+
     @action(detail=True, methods=['post'])
     def cancel(self, request, booking_code=None):
         """Cancel a booking"""
@@ -520,6 +673,7 @@ class BookingViewSet(viewsets.ModelViewSet):
                 expires_at=None,
                 booking=None
             )
+            record_seat_status(booking.performance_id, [sr.seat_id for sr in seats_to_log], 'available')
 
             BookingHistory.log_action(
                 booking=booking,
@@ -583,6 +737,35 @@ def get_session_reservations(request):
         return Response(empty_response)
 
     try:
+        holds = get_session_holds(session_id)
+        if holds is not None:
+            # Held seats from the session registry, seat details from the geometry
+            hold = holds['performances'].get(int(performance_id))
+            if not hold:
+                return Response(empty_response)
+
+            geometry = get_venue_geometry(get_performance_venue_id(int(performance_id)))
+            reserved_seats = []
+            for seat_id, price in hold['seats'].items():
+                ordinal = geometry['seat_ordinals'].get(seat_id)
+                if ordinal is None:
+                    continue
+                seat = geometry['seats'][ordinal]
+                reserved_seats.append({
+                    'id': seat['id'],
+                    'row': seat['row'],
+                    'number': seat['display_number'],
+                    'full_label': seat['full_label'],
+                    'section_name': seat['section_name'],
+                    'price': float(price)
+                })
+
+            return Response({
+                'seats': reserved_seats,
+                'expires_at': hold['expires_at'].isoformat(),
+                'count': len(reserved_seats)
+            })
+
         performance = Performance.objects.get(id=performance_id)
 
         # We only care about reservations not yet linked to a final booking
@@ -0,0 +1,301 @@
+"""
+Virtual waiting room for high-demand on-sales.
+
+When `Performance.queue_enabled` is set, the seat selection APIs (seat map,
+status overlay, `reserve_seats`) only accept visitors holding an admitted
+queue token. Visitors join a per-performance FIFO (a Redis sorted set
+scored by arrival order) and get a signed token; every status poll runs the
+admission script, which moves the head of the queue to the active set at
+`queue_admission_rate` per minute while fewer than `queue_max_active`
+visitors are admitted. An admission lasts `WAITING_ROOM_ADMISSION_MINUTES`.
+
+The queue settings of a performance are mirrored into a Redis hash on save
+(see `shows.signals`) so the admission check is a single script call. When
+Redis is unavailable the gate stays open, the throttles still apply.
+"""
+import secrets
+import time
+
+from django.conf import settings
+from django.core import signing
+from django_redis import get_redis_connection
+from logzero import logger
+from redis.exceptions import RedisError
+
+TOKEN_SALT = 'bookings.waiting_room'
+TOKEN_MAX_AGE = 60 * 60 * 24
+QUEUE_TIMEOUT = 60 * 60 * 24
+ADMISSION_HISTORY_TIMEOUT = 60 * 60
+
+# KEYS: config, active. ARGV: queue_id, now_ms
+# 1 admitted (or queue disabled), 0 not admitted, -1 config not loaded
+CHECK_ADMISSION_SCRIPT = """
+local enabled = redis.call('HGET', KEYS[1], 'enabled')
+if not enabled then
+    return -1
+end
+if enabled ~= '1' then
+    return 1
+end
+local expires = redis.call('ZSCORE', KEYS[2], ARGV[1])
+if expires and tonumber(expires) > tonumber(ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+# KEYS: waiting, sequence, active. ARGV: queue_id, ttl
+JOIN_SCRIPT = """
+if redis.call('ZSCORE', KEYS[3], ARGV[1]) or redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], redis.call('INCR', KEYS[2]), ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+# KEYS: config, waiting, active, pacer, admitted, admitted in this minute
+# ARGV: now_ms, admission_ms, ttl, history_ttl
+# Token bucket refilled at `rate` per minute with ~5s of burst, capped by the
+# free active slots; returns how many visitors were admitted
+ADMIT_SCRIPT = """
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate') or '0')
+local max_active = tonumber(redis.call('HGET', KEYS[1], 'max_active') or '0')
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+
+local tokens = tonumber(redis.call('HGET', KEYS[4], 'tokens') or '0')
+local last = tonumber(redis.call('HGET', KEYS[4], 'ts') or ARGV[1])
+tokens = math.min(math.max(1, rate / 12), tokens + (now - last) * rate / 60000)
+
+local slots = math.floor(tokens)
+if max_active > 0 then
+    slots = math.min(slots, max_active - redis.call('ZCARD', KEYS[3]))
+end
+
+local admitted = 0
+if slots > 0 then
+    local popped = redis.call('ZPOPMIN', KEYS[2], slots)
+    for i = 1, #popped, 2 do
+        redis.call('ZADD', KEYS[3], now + tonumber(ARGV[2]), popped[i])
+        admitted = admitted + 1
+    end
+end
+
+redis.call('HSET', KEYS[4], 'tokens', tostring(tokens - admitted), 'ts', ARGV[1])
+redis.call('EXPIRE', KEYS[4], ARGV[3])
+if admitted > 0 then
+    redis.call('EXPIRE', KEYS[3], ARGV[3])
+    redis.call('INCRBY', KEYS[5], admitted)
+    redis.call('EXPIRE', KEYS[5], ARGV[3])
+    redis.call('INCRBY', KEYS[6], admitted)
+    redis.call('EXPIRE', KEYS[6], ARGV[4])
+end
+return admitted
+"""
+
+
+def get_redis():
+    return get_redis_connection('default')
+
+
+def queue_key(performance_id, name):
+    return f'booking:queue:{performance_id}:{name}'
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def admission_seconds():
+    return getattr(settings, 'WAITING_ROOM_ADMISSION_MINUTES', 10) * 60
+
+
+def make_queue_token(performance_id, queue_id):
+    return signing.dumps({'performance': performance_id, 'queue': queue_id}, salt=TOKEN_SALT)
+
+
+def read_queue_token(performance_id, token):
+    """Queue ID of a token issued for `performance_id`, None when invalid"""
+    if not token:
+        return None
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if data.get('performance') != performance_id:
+        return None
+    return data.get('queue')
+
+
+def get_request_queue_token(request):
+    """Token sent by the client: `X-Queue-Token` header or `queue_token` parameter"""
+    token = request.META.get('HTTP_X_QUEUE_TOKEN')
+    if not token:
+        token = request.GET.get('queue_token')
+    if not token and isinstance(getattr(request, 'data', None), dict):
+        token = request.data.get('queue_token')
+    return token
+
+
+def _queue_config(performance):
+    return {
+        'enabled': int(performance.queue_enabled),
+        'rate': performance.queue_admission_rate,
+        'max_active': performance.queue_max_active,
+    }
+
+
+def sync_queue_config(performance):
+    """Mirror the queue settings of a performance into Redis"""
+    try:
+        get_redis().hset(queue_key(performance.id, 'config'), mapping=_queue_config(performance))
+    except RedisError as e:
+        logger.warning(f"Cannot store queue settings of performance {performance.id}: {e}")
+
+
+def load_queue_config(performance_id):
+    """Queue settings from the database, mirrored into Redis. None for an unknown performance"""
+    from shows.models import Performance
+
+    performance = Performance.objects.filter(id=performance_id).only(
+        'id', 'queue_enabled', 'queue_admission_rate', 'queue_max_active'
+    ).first()
+    if performance is None:
+        return None
+    sync_queue_config(performance)
+    return _queue_config(performance)
+
+
+def get_queue_config(performance_id):
+    """Queue settings of a performance, read from Redis"""
+    config = get_redis().hgetall(queue_key(performance_id, 'config'))
+    if not config:
+        return load_queue_config(performance_id)
+    return {name.decode(): int(value) for name, value in config.items()}
+
+
+def is_admitted(performance_id, token):
+    """Whether the holder of `token` may use the seat selection APIs"""
+    queue_id = read_queue_token(performance_id, token) or ''
+    script = get_redis().register_script(CHECK_ADMISSION_SCRIPT)
+    keys = [queue_key(performance_id, 'config'), queue_key(performance_id, 'active')]
+
+    try:
+        result = script(keys=keys, args=[queue_id, _now_ms()])
+        if result == -1:
+            if load_queue_config(performance_id) is None:
+                return True
+            result = script(keys=keys, args=[queue_id, _now_ms()])
+    except RedisError as e:
+        logger.warning(f"Cannot check queue admission for performance {performance_id}: {e}")
+        return True
+
+    return result != 0
+
+
+def admit(performance_id):
+    """Move visitors from the head of the queue to the active set"""
+    return get_redis().register_script(ADMIT_SCRIPT)(
+        keys=[
+            queue_key(performance_id, 'config'),
+            queue_key(performance_id, 'waiting'),
+            queue_key(performance_id, 'active'),
+            queue_key(performance_id, 'pacer'),
+            queue_key(performance_id, 'admitted'),
+            queue_key(performance_id, f'admitted:{int(time.time()) // 60}'),
+        ],
+        args=[_now_ms(), admission_seconds() * 1000, QUEUE_TIMEOUT, ADMISSION_HISTORY_TIMEOUT]
+    )
+
+
+def join_queue(performance_id, token=None):
+    """Enter the queue, keeping the place of a still valid `token`"""
+    queue_id = read_queue_token(performance_id, token) or secrets.token_urlsafe(16)
+    try:
+        get_redis().register_script(JOIN_SCRIPT)(
+            keys=[
+                queue_key(performance_id, 'waiting'),
+                queue_key(performance_id, 'sequence'),
+                queue_key(performance_id, 'active'),
+            ],
+            args=[queue_id, QUEUE_TIMEOUT]
+        )
+    except RedisError as e:
+        logger.warning(f"Cannot join the queue of performance {performance_id}: {e}")
+    return make_queue_token(performance_id, queue_id)
+
+
+def get_queue_status(performance_id, token):
+    """Admission state of a token, runs an admission round first"""
+    try:
+        config = get_queue_config(performance_id)
+    except RedisError as e:
+        logger.warning(f"Cannot read queue settings of performance {performance_id}: {e}")
+        config = None
+    if not config or not config['enabled']:
+        return {'enabled': False, 'admitted': True}
+
+    queue_id = read_queue_token(performance_id, token)
+    status = {'enabled': True, 'admitted': False, 'token': token if queue_id else None}
+    if queue_id is None:
+        return status
+
+    try:
+        admit(performance_id)
+        pipe = get_redis().pipeline()
+        pipe.zscore(queue_key(performance_id, 'active'), queue_id)
+        pipe.zrank(queue_key(performance_id, 'waiting'), queue_id)
+        pipe.zcard(queue_key(performance_id, 'waiting'))
+        admitted_until, rank, waiting = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Cannot read queue status of performance {performance_id}: {e}")
+        return {'enabled': True, 'admitted': True, 'token': token}
+
+    if admitted_until is not None and admitted_until > _now_ms():
+        status.update(admitted=True, admitted_until=int(admitted_until))
+    elif rank is not None:
+        rate = config['rate']
+        status.update(
+            position=rank + 1,
+            waiting=waiting,
+            eta_seconds=int((rank + 1) * 60 / rate) if rate else None,
+        )
+    else:
+        # Admission expired or the queue was reset, join again
+        status['token'] = None
+    return status
+
+
+def get_queue_metrics(performance_id):
+    """Queue depth, admitted visitors and the admission rate of the last minute"""
+    minute = int(time.time()) // 60
+    try:
+        pipe = get_redis().pipeline()
+        pipe.zcard(queue_key(performance_id, 'waiting'))
+        pipe.zcount(queue_key(performance_id, 'active'), _now_ms(), '+inf')
+        pipe.get(queue_key(performance_id, 'admitted'))
+        pipe.get(queue_key(performance_id, f'admitted:{minute - 1}'))
+        waiting, active, admitted, last_minute = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Cannot read queue metrics of performance {performance_id}: {e}")
+        return None
+
+    return {
+        'waiting': waiting,
+        'active': active,
+        'admitted_total': int(admitted or 0),
+        'admitted_last_minute': int(last_minute or 0),
+    }
+
+
+def reset_queue(performance_id):
+    """Drop the waiting and admitted visitors of a performance"""
+    try:
+        get_redis().delete(*[
+            queue_key(performance_id, name)
+            for name in ('waiting', 'sequence', 'active', 'pacer', 'admitted')
+        ])
+    except RedisError as e:
+        logger.warning(f"Cannot reset the queue of performance {performance_id}: {e}")
@@ -3,14 +3,41 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Besides the regular Django application it serves the realtime seat events
+(see ``bookings.realtime``) on ``/ws/performances/<id>/seats/``, as a
+WebSocket or as Server-Sent Events for plain GET requests.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
 import os
+import re
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from bookings.realtime import seat_events_sse, seat_events_websocket  # noqa: E402
+
+SEAT_EVENTS_PATH = re.compile(r'^/ws/performances/(?P<performance_id>\d+)/seats/$')
+
+
+async def application(scope, receive, send):
+    if scope['type'] in ('http', 'websocket'):
+        match = SEAT_EVENTS_PATH.match(scope['path'])
+        if match:
+            performance_id = int(match.group('performance_id'))
+            if scope['type'] == 'websocket':
+                return await seat_events_websocket(scope, receive, send, performance_id)
+            return await seat_events_sse(scope, receive, send, performance_id)
+
+    if scope['type'] == 'websocket':
+        # Django does not handle websockets, reject the handshake
+        await receive()
+        await send({'type': 'websocket.close'})
+        return
+
+    return await django_application(scope, receive, send)
@@ -0,0 +1,49 @@
+"""
+Conditional GET helpers.
+
+Views derive an ETag from content versions (see `core.versioning`) before
+touching the ORM, answer `If-None-Match` hits with 304 and attach the same
+ETag to full responses. The ETag is computed before the body is built, so a
+body is never older than its ETag; at worst a client re-downloads once.
+"""
+from django.http import HttpResponseNotModified
+
+# Browsers must revalidate, which is a cheap 304 while nothing changed
+CACHE_CONTROL = 'no-cache'
+
+
+def make_etag(*parts):
+    """Strong ETag from version parts; None when a part is unknown"""
+    if any(part is None for part in parts):
+        return None
+    return '"' + '-'.join(str(part) for part in parts) + '"'
+
+
+def etag_matches(request, etag):
+    """`If-None-Match` check, using the weak comparison RFC 9110 requires for it"""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header or etag is None:
+        return False
+    if header.strip() == '*':
+        return True
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def not_modified(etag):
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
+
+
+def set_etag(response, etag):
+    if etag is not None:
+        response['ETag'] = etag
+        response['Cache-Control'] = CACHE_CONTROL
+    return response
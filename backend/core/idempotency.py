@@ -0,0 +1,148 @@
+"""
+`Idempotency-Key` support for non-idempotent POST endpoints.
+
+The first request with a key claims it in Redis (`SET NX`) together with a
+fingerprint of the request (method, path, body), runs the view and stores
+its response for `RESPONSE_TIMEOUT`. Retries with the same key get the
+stored response back (`Idempotent-Replayed: true`) without running the view
+again; retries arriving while the first execution is still running wait for
+it up to `WAIT_TIMEOUT` seconds, then get 409. Reusing a key for another
+request is refused with 422.
+
+Server errors and throttled responses are not stored, the key is released
+so the client can retry. Requests without a key, and all requests while
+Redis is unavailable, run as before.
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django_redis import get_redis_connection
+from logzero import logger
+from redis.exceptions import RedisError
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+RESPONSE_TIMEOUT = 60 * 60 * 24
+# Longer than a request may run (gunicorn --timeout)
+LOCK_TIMEOUT = 150
+WAIT_TIMEOUT = 10
+WAIT_INTERVAL = 0.1
+MAX_KEY_LENGTH = 255
+
+
+def idempotency_key(scope, key):
+    return f'booking:idempotency:{scope}:{key}'
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, cls=JSONEncoder) if request.data else ''
+    return hashlib.sha256(f'{request.method}\n{request.get_full_path()}\n{body}'.encode()).hexdigest()
+
+
+def _replay(entry):
+    response = Response(entry['data'], status=entry['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _wait_for(redis, key):
+    """Stored entry once the first execution finishes, None if it did not in time"""
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        raw = redis.get(key)
+        if raw is None:
+            # First execution failed and released the key
+            return None
+        entry = json.loads(raw)
+        if entry['state'] == 'done':
+            return entry
+        time.sleep(WAIT_INTERVAL)
+    return None
+
+
+def idempotent(scope):
+    """
+    Decorator for DRF views (inside `@api_view`, or through
+    `method_decorator` on viewset actions) honouring `Idempotency-Key`.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request.META.get('HTTP_IDEMPOTENCY_KEY', '').strip()
+            if not key:
+                return view(request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response({'error': 'Idempotency-Key quá dài.'}, status=status.HTTP_400_BAD_REQUEST)
+
+            redis_key = idempotency_key(scope, key)
+            fingerprint = request_fingerprint(request)
+            try:
+                redis = get_redis_connection('default')
+                claimed = redis.set(
+                    redis_key,
+                    json.dumps({'state': 'running', 'fingerprint': fingerprint}),
+                    nx=True,
+                    ex=LOCK_TIMEOUT
+                )
+                if not claimed:
+                    raw = redis.get(redis_key)
+                    entry = json.loads(raw) if raw else None
+                    if entry and entry['fingerprint'] != fingerprint:
+                        return Response(
+                            {'error': 'Idempotency-Key đã được dùng cho một yêu cầu khác.'},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                        )
+                    if entry and entry['state'] == 'running':
+                        entry = _wait_for(redis, redis_key)
+                    if entry and entry['state'] == 'done':
+                        return _replay(entry)
+                    response = Response(
+                        {'error': 'Yêu cầu đang được xử lý. Vui lòng thử lại sau giây lát.'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                    response['Retry-After'] = '1'
+                    return response
+            except RedisError as e:
+                logger.warning(f"Cannot check idempotency key for {scope}: {e}")
+                return view(request, *args, **kwargs)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                _release(redis, redis_key)
+                raise
+
+            if response.status_code >= 500 or response.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+                _release(redis, redis_key)
+                return response
+
+            try:
+                redis.set(
+                    redis_key,
+                    json.dumps(
+                        {
+                            'state': 'done',
+                            'fingerprint': fingerprint,
+                            'status': response.status_code,
+                            'data': response.data,
+                        },
+                        cls=JSONEncoder
+                    ),
+                    ex=RESPONSE_TIMEOUT
+                )
+            except RedisError as e:
+                logger.warning(f"Cannot store idempotent response for {scope}: {e}")
+            return response
+
+        return wrapper
+    return decorator
+
+
+def _release(redis, key):
+    try:
+        redis.delete(key)
+    except RedisError as e:
+        logger.warning(f"Cannot release idempotency key {key}: {e}")
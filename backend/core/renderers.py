@@ -0,0 +1,94 @@
+import datetime
+import decimal
+
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def _orjson_default(obj):
+    # DRF's encoder turns bare Decimals (not DecimalField output) into floats
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, Promise):
+        return str(obj)
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f'Type is not JSON serializable: {type(obj).__name__}')
+
+
+def render_json(data, indent=False):
+    """Encode `data` like `JSONRenderer` would, using orjson when installed"""
+    if orjson is None:
+        return JSONRenderer().render(data, renderer_context={'indent': 2 if indent else None})
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, default=_orjson_default, option=option)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in `JSONRenderer` backed by orjson (native datetime/UUID handling,
+    Decimal as float). Already encoded `bytes` are passed through, which is
+    the raw path of views that cache their rendered body.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, (bytes, bytearray)):
+            return bytes(data)
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        return render_json(data, indent=bool(indent))
+
+
+class ColumnarJSONRenderer(ORJSONRenderer):
+    """
+    JSON for `?format=columnar`. Views serving it check
+    `request.accepted_renderer.format` and return their compact columnar data.
+    """
+    format = 'columnar'
+
+
+class MsgPackRenderer(BaseRenderer):
+    """Binary encoding of the columnar data, `?format=msgpack`"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, use_bin_type=True)
+
+
+# Renderers whose views send the columnar representation; msgpack is optional
+COLUMNAR_RENDERER_CLASSES = [ColumnarJSONRenderer]
+if msgpack is not None:
+    COLUMNAR_RENDERER_CLASSES.append(MsgPackRenderer)
+
+COLUMNAR_FORMATS = {renderer.format for renderer in COLUMNAR_RENDERER_CLASSES}
+
+
+def is_columnar(request):
+    renderer = getattr(request, 'accepted_renderer', None)
+    return renderer is not None and renderer.format in COLUMNAR_FORMATS
@@ -1,3 +1,4 @@
+from corsheaders.defaults import default_headers
 from logzero import logger
 import os
 from pathlib import Path
@@ -220,6 +221,7 @@ CSRF_TRUSTED_ORIGINS = [FRONTEND_URL, BACKEND_URL]
 
 logger.info(f"CSRF_TRUSTED_ORIGINS: {CSRF_TRUSTED_ORIGINS}")
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key', 'x-queue-token')
 
 STATICFILES_FINDERS = [
     'django.contrib.staticfiles.finders.FileSystemFinder',
@@ -236,18 +238,62 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'core.renderers.ORJSONRenderer',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    # nginx appends the client address to X-Forwarded-For (throttle idents)
+    'NUM_PROXIES': 1,
+}
+
+# Token bucket throttles of the booking write endpoints (core.throttling):
+# scope -> {session|ip|performance|booking: (burst, sustained rate)}
+BOOKING_THROTTLES = {
+    'reserve_seats': {
+        'session': (10, '30/min'),
+        'ip': (30, '120/min'),
+        'performance': (500, '6000/min'),
+    },
+    'release_seats': {
+        'session': (20, '60/min'),
+        'ip': (60, '240/min'),
+    },
+    'booking_create': {
+        'session': (5, '10/min'),
+        'ip': (20, '60/min'),
+        'performance': (200, '2000/min'),
+    },
+    'payment_create': {
+        'booking': (5, '10/min'),
+        'ip': (20, '60/min'),
+    },
 }
 
 # Booking settings
 SEAT_RESERVATION_TIMEOUT_MINUTES = 5
 PAYMENT_TIMEOUT_MINUTES = 30
 BOOKING_EXPIRATION_BUFFER_MINUTES = 2
+# 'redis': seats are claimed in Redis before the database write (see bookings.claims),
+# 'database': the conditional database write alone decides
+SEAT_CLAIM_ENGINE = os.getenv('SEAT_CLAIM_ENGINE', 'redis')
+# Send seat claims to the claim coordinator (run_claim_coordinator command),
+# which writes them in group commits, see bookings.claim_batching
+SEAT_CLAIM_BATCHING = os.getenv('SEAT_CLAIM_BATCHING', 'False') == 'True'
+SEAT_CLAIM_BATCH_WINDOW_MS = 5
+# Seconds to wait for the coordinator before claiming directly
+SEAT_CLAIM_BATCH_TIMEOUT = 2
+# Create bookings on the partitioned Celery booking queues and answer 202
+# with a ticket to poll, see bookings.booking_queue
+BOOKING_ASYNC_SUBMISSION = os.getenv('BOOKING_ASYNC_SUBMISSION', 'False') == 'True'
+# Number of bookings-N queues, each needs a worker with concurrency 1
+BOOKING_QUEUE_PARTITIONS = int(os.getenv('BOOKING_QUEUE_PARTITIONS', '2'))
+# Key of the booking code permutation (defaults to SECRET_KEY). Set it once:
+# with another key new codes may repeat old ones, see bookings.booking_codes
+BOOKING_CODE_SECRET = os.getenv('BOOKING_CODE_SECRET', '')
+# How long a visitor admitted by the waiting room may select seats
+WAITING_ROOM_ADMISSION_MINUTES = 10
 
 # 9Pay Settings
 NINEPAY_MERCHANT_KEY = os.getenv('NINEPAY_MERCHANT_KEY', '')
@@ -0,0 +1,123 @@
+"""
+Token bucket throttles for the booking write endpoints.
+
+Each scope of `settings.BOOKING_THROTTLES` limits requests per session,
+client IP, performance and/or booking with a (burst, sustained rate) bucket,
+e.g. `'session': (10, '30/min')`. All buckets of a request are checked and
+charged by one Redis script: a request is let through only when every
+bucket has a token, otherwise nothing is charged and the longest refill
+time becomes `Retry-After` (DRF's `Throttled` handling).
+
+The client IP comes from DRF's `get_ident`, which trusts the
+`X-Forwarded-For` entry added by nginx (`NUM_PROXIES`). When Redis is
+unavailable requests are let through.
+"""
+import math
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from logzero import logger
+from redis.exceptions import RedisError
+from rest_framework.throttling import BaseThrottle
+
+# KEYS: buckets. ARGV: now_ms, then (capacity, tokens per ms) per bucket
+# Returns 0 when a token was taken from every bucket, otherwise the ms
+# until all buckets have one again
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local wait = 0
+local levels = {}
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local bucket = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local last = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - last) * rate)
+    levels[i] = tokens
+    if tokens < 1 then
+        wait = math.max(wait, math.ceil((1 - tokens) / rate))
+    end
+end
+if wait > 0 then
+    return wait
+end
+for i = 1, #KEYS do
+    redis.call('HSET', KEYS[i], 'tokens', tostring(levels[i] - 1), 'ts', ARGV[1])
+    redis.call('PEXPIRE', KEYS[i], math.ceil(tonumber(ARGV[i * 2]) / tonumber(ARGV[i * 2 + 1])) + 1000)
+end
+return 0
+"""
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+def parse_rate(rate):
+    """'30/min' -> tokens per millisecond, DRF rate syntax"""
+    num, period = rate.split('/')
+    return int(num) / (PERIODS[period[0]] * 1000)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+
+    def __init__(self):
+        self.buckets = getattr(settings, 'BOOKING_THROTTLES', {}).get(self.scope, {})
+        self.retry_after = None
+
+    def get_idents(self, request, view):
+        data = request.data if isinstance(request.data, dict) else {}
+        kwargs = getattr(view, 'kwargs', {}) or {}
+        return {
+            'session': data.get('session_id'),
+            'ip': self.get_ident(request),
+            'performance': data.get('performance_id'),
+            'booking': kwargs.get('booking_code'),
+        }
+
+    def allow_request(self, request, view):
+        idents = self.get_idents(request, view)
+        keys = []
+        args = [int(time.time() * 1000)]
+
+        for kind, (burst, rate) in self.buckets.items():
+            ident = idents.get(kind)
+            if ident in (None, ''):
+                continue
+            keys.append(f'booking:throttle:{self.scope}:{kind}:{ident}')
+            args.extend([burst, parse_rate(rate)])
+
+        if not keys:
+            return True
+
+        try:
+            wait = get_redis_connection('default').register_script(TOKEN_BUCKET_SCRIPT)(keys=keys, args=args)
+        except RedisError as e:
+            logger.warning(f"Cannot check throttle {self.scope}: {e}")
+            return True
+
+        if wait:
+            self.retry_after = math.ceil(wait / 1000)
+            logger.warning(f"Throttled {self.scope}: {idents}")
+            return False
+        return True
+
+    def wait(self):
+        return self.retry_after
+
+
+class ReserveSeatsThrottle(TokenBucketThrottle):
+    scope = 'reserve_seats'
+
+
+class ReleaseSeatsThrottle(TokenBucketThrottle):
+    scope = 'release_seats'
+
+
+class BookingCreateThrottle(TokenBucketThrottle):
+    scope = 'booking_create'
+
+
+class PaymentCreateThrottle(TokenBucketThrottle):
+    scope = 'payment_create'
@@ -0,0 +1,39 @@
+import time
+from django.core.cache import cache
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def _new_version():
+    # Time based so a version lost with a Redis eviction is never reused
+    return format(time.time_ns(), 'x')
+
+
+def bump_version(name):
+    """Start a new version for `name`, invalidating everything keyed by the old one"""
+    version = _new_version()
+    cache.set(_version_key(name), version, None)
+    return version
+
+
+def get_version(name):
+    """Current version token for `name`, created on first use"""
+    version = cache.get(_version_key(name))
+    if version is None:
+        version = bump_version(name)
+    return version
+
+
+def get_versions(*names):
+    """Current version tokens for several names in one cache round trip"""
+    keys = {_version_key(name): name for name in names}
+    found = cache.get_many(list(keys))
+    versions = {}
+    for key, name in keys.items():
+        version = found.get(key)
+        if version is None:
+            version = bump_version(name)
+        versions[name] = version
+    return versions
@@ -1,5 +1,5 @@
 import uuid
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404, redirect
@@ -11,10 +11,15 @@ from logzero import logger
 from .models import Payment
 from .ninepay import NinePay
 from bookings.models import Booking, SeatReservation, BookingHistory
+from bookings.seat_status import record_seat_status
 from discounts.models import DiscountUsage
+from core.idempotency import idempotent
+from core.throttling import PaymentCreateThrottle
 
 
 @api_view(['POST'])
+@throttle_classes([PaymentCreateThrottle])
+@idempotent('payment_create')
 def create_payment(request, booking_code):
     """Create payment for booking with 9Pay"""
     with transaction.atomic():
@@ -50,13 +55,15 @@ def create_payment(request, booking_code):
             logger.error(f"🚨 Seat mismatch: {seat_reservations.count()} valid vs {expected_seat_count} total")
             booking.status = 'cancelled'
             booking.save()
+            release_seat_ids = list(seat_reservations.values_list('seat_id', flat=True))
             seat_reservations.update(status='available', session_id=None, expires_at=None)
+            record_seat_status(booking.performance_id, release_seat_ids, 'available')
             return Response(
                 {'error': 'Có ghế không hợp lệ. Vui lòng đặt lại.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        duplicate_check = SeatReservation.objects.filter(
+        duplicate_check = SeatReservation.objects.holding().filter(
             seat_id__in=seat_reservations.values_list('seat_id', flat=True),
             performance=booking.performance,
             status__in=['reserved', 'sold']
@@ -66,14 +73,18 @@ def create_payment(request, booking_code):
             logger.error(f"🚨 CRITICAL: Booking {booking_code} has duplicate seats")
             booking.status = 'cancelled'
             booking.save()
+            release_seat_ids = list(seat_reservations.values_list('seat_id', flat=True))
             seat_reservations.update(status='available', session_id=None, expires_at=None)
+            record_seat_status(booking.performance_id, release_seat_ids, 'available')
             return Response(
                 {'error': 'Có ghế bị trùng. Vui lòng đặt lại.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        calculated_ticket_amount = sum(sr.price for sr in seat_reservations)
-        calculated_service_fee = seat_reservations.count() * booking.performance.show.service_fee_per_ticket
+        # The prices the seats were held at, later price table edits do not apply
+        reserved_prices = list(seat_reservations.values_list('price', flat=True))
+        calculated_ticket_amount = sum(reserved_prices)
+        calculated_service_fee = len(reserved_prices) * booking.performance.show.service_fee_per_ticket
         calculated_shipping_fee = booking.shipping_fee
         calculated_final = calculated_ticket_amount + calculated_shipping_fee + calculated_service_fee - booking.discount_amount
 
@@ -90,7 +101,9 @@ def create_payment(request, booking_code):
             logger.error(f"🚨 Booking {booking_code} expired at {booking.expires_at}")
             booking.status = 'expired'
             booking.save()
+            release_seat_ids = list(seat_reservations.values_list('seat_id', flat=True))
             seat_reservations.update(status='available', session_id=None, expires_at=None)
+            record_seat_status(booking.performance_id, release_seat_ids, 'available')
             return Response(
                 {'error': 'Booking đã hết hạn. Vui lòng đặt lại.'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -229,8 +242,10 @@ def ninepay_return(request):
                     status='reserved'
                 )
 
-                seat_count = seat_reservations.count()
+                sold_seat_ids = list(seat_reservations.values_list('seat_id', flat=True))
+                seat_count = len(sold_seat_ids)
                 updated = seat_reservations.update(status='sold')
+                record_seat_status(booking.performance_id, sold_seat_ids, 'sold')
 
                 logger.info(f"Seats: {seat_count}, Updated: {updated}")
 
@@ -281,7 +296,9 @@ def ninepay_return(request):
                 if booking.status == 'pending':
                     booking.status = 'cancelled'
                     booking.save()
+                    release_seat_ids = list(booking.seat_reservations.values_list('seat_id', flat=True))
                     booking.seat_reservations.update(status='available', session_id=None, expires_at=None)
+                    record_seat_status(booking.performance_id, release_seat_ids, 'available')
 
                 try:
                     usage = DiscountUsage.objects.select_for_update().get(booking=booking, status='PENDING')
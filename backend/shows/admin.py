@@ -4,6 +4,7 @@ from django import forms
 from datetime import datetime, timedelta
 from django.utils import timezone
 from .models import Show, Performance, PerformancePrice, Poster
+from .signals import bump_shows_version, schedule_seat_map_snapshots, schedule_inventory_syncs
 from venues.models import PriceCategory
 from markdownx.admin import MarkdownxModelAdmin
 
@@ -81,10 +82,11 @@ class ShowAdmin(MarkdownxModelAdmin):
 
 @admin.register(Performance)
 class SimplePerformanceAdmin(admin.ModelAdmin):
-    list_display = ['show', 'datetime', 'status', 'available_seats_count', 'quick_actions']
-    list_filter = ['show', 'status', 'datetime']
+    list_display = ['show', 'datetime', 'status', 'available_seats_count', 'queue_status', 'quick_actions']
+    list_filter = ['show', 'status', 'datetime', 'queue_enabled']
     list_editable = ['status']
     date_hierarchy = 'datetime'
+    readonly_fields = ['queue_metrics']
 
     def quick_actions(self, obj):
         return format_html(
@@ -94,16 +96,74 @@ class SimplePerformanceAdmin(admin.ModelAdmin):
         )
     quick_actions.short_description = 'Thao tác'
 
-    actions = ['set_on_sale', 'set_sold_out', 'duplicate_performance']
+    def queue_status(self, obj):
+        if not obj.queue_enabled:
+            return '-'
+        from bookings.waiting_room import get_queue_metrics
+        metrics = get_queue_metrics(obj.id)
+        if metrics is None:
+            return 'Không đọc được'
+        return f"{metrics['waiting']} chờ / {metrics['active']} đang chọn"
+    queue_status.short_description = 'Phòng chờ'
+
+    def queue_metrics(self, obj):
+        from bookings.waiting_room import get_queue_metrics
+        metrics = get_queue_metrics(obj.id) if obj.pk else None
+        if metrics is None:
+            return '-'
+        return format_html(
+            'Đang chờ: <b>{}</b><br>Đang chọn ghế: <b>{}</b><br>'
+            'Đã vào (tổng): <b>{}</b><br>Vào trong phút trước: <b>{}</b>',
+            metrics['waiting'], metrics['active'],
+            metrics['admitted_total'], metrics['admitted_last_minute']
+        )
+    queue_metrics.short_description = 'Số liệu phòng chờ'
+
+    actions = [
+        'set_on_sale', 'set_sold_out', 'duplicate_performance',
+        'enable_queue', 'disable_queue', 'reset_queue',
+    ]
 
     def set_on_sale(self, request, queryset):
-        queryset.update(status='on_sale')
+        # Read before the update, the changelist filters (e.g. status) apply again after it
+        performance_ids = list(queryset.values_list('id', flat=True))
+        Performance.objects.filter(id__in=performance_ids).update(status='on_sale')
+        bump_shows_version()
+        schedule_seat_map_snapshots(performance_ids)
+        schedule_inventory_syncs(performance_ids)
     set_on_sale.short_description = "Mở bán"
 
     def set_sold_out(self, request, queryset):
         queryset.update(status='sold_out')
+        bump_shows_version()
     set_sold_out.short_description = "Hết vé"
 
+    def enable_queue(self, request, queryset):
+        from bookings.waiting_room import sync_queue_config
+        # Loaded before the update, `queue_enabled` is a changelist filter
+        performances = list(queryset)
+        Performance.objects.filter(id__in=[performance.id for performance in performances]).update(queue_enabled=True)
+        for performance in performances:
+            performance.queue_enabled = True
+            sync_queue_config(performance)
+    enable_queue.short_description = "Bật phòng chờ"
+
+    def disable_queue(self, request, queryset):
+        from bookings.waiting_room import sync_queue_config
+        # Loaded before the update, `queue_enabled` is a changelist filter
+        performances = list(queryset)
+        Performance.objects.filter(id__in=[performance.id for performance in performances]).update(queue_enabled=False)
+        for performance in performances:
+            performance.queue_enabled = False
+            sync_queue_config(performance)
+    disable_queue.short_description = "Tắt phòng chờ"
+
+    def reset_queue(self, request, queryset):
+        from bookings.waiting_room import reset_queue
+        for performance_id in queryset.values_list('id', flat=True):
+            reset_queue(performance_id)
+    reset_queue.short_description = "Xóa hàng đợi phòng chờ"
+
     def duplicate_performance(self, request, queryset):
         """Duplicate selected performances to next day"""
         for perf in queryset:
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shows', '0006_alter_show_description_markdown'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='performance',
+            name='queue_enabled',
+            field=models.BooleanField(default=False, verbose_name='Bật phòng chờ'),
+        ),
+        migrations.AddField(
+            model_name='performance',
+            name='queue_admission_rate',
+            field=models.PositiveIntegerField(default=60, verbose_name='Số người vào mỗi phút'),
+        ),
+        migrations.AddField(
+            model_name='performance',
+            name='queue_max_active',
+            field=models.PositiveIntegerField(default=500, help_text='0 = không giới hạn', verbose_name='Số người chọn ghế cùng lúc tối đa'),
+        ),
+    ]
@@ -85,6 +85,18 @@ class Performance(models.Model):
         verbose_name='Phí vận chuyển'
     )
 
+    # Waiting room for high-demand on-sales, see bookings.waiting_room
+    queue_enabled = models.BooleanField(default=False, verbose_name='Bật phòng chờ')
+    queue_admission_rate = models.PositiveIntegerField(
+        default=60,
+        verbose_name='Số người vào mỗi phút'
+    )
+    queue_max_active = models.PositiveIntegerField(
+        default=500,
+        verbose_name='Số người chọn ghế cùng lúc tối đa',
+        help_text='0 = không giới hạn'
+    )
+
     class Meta:
         verbose_name = 'Suất diễn'
         verbose_name_plural = 'Suất diễn'
@@ -99,17 +111,9 @@ class Performance(models.Model):
 
     @property
     def available_seats_count(self):
-        from bookings.models import SeatReservation
-        total_seats = self.show.venue.sections.aggregate(
-            total=models.Count('rows__seats')
-        )['total'] or 0
-
-        reserved_seats = SeatReservation.objects.filter(
-            performance=self,
-            status__in=['reserved', 'sold']
-        ).count()
-
-        return total_seats - reserved_seats
+        """Active seats not reserved, sold or blocked, read from the seat status bitmap"""
+        from bookings.seat_status import count_available_seats
+        return count_available_seats(self.id)
 
 
 class PerformancePrice(models.Model):
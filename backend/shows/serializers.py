@@ -1,4 +1,6 @@
+from decimal import Decimal
 from rest_framework import serializers
+from django.db.models import Min, Max
 from django.utils import timezone
 from .models import Show, Performance, PerformancePrice, Poster
 from venues.serializers import VenueSerializer
@@ -38,6 +40,54 @@ class ShowListSerializer(serializers.ModelSerializer):
         return obj._price_range[1]
 
 
+def _file_url(file, request):
+    # Same output as the serializer `ImageField`
+    if not file:
+        return None
+    url = file.url
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def show_list_data(shows, request=None):
+    """
+    Plain dict equivalent of `ShowListSerializer(shows, many=True).data` for
+    the hot show list: no serializer fields, and the price range of all shows
+    from one aggregate query instead of one query per show.
+    """
+    shows = list(shows)
+    price_ranges = {
+        row['performance__show_id']: (row['min_price'], row['max_price'])
+        for row in PerformancePrice.objects.filter(
+            performance__show__in=shows,
+            performance__datetime__gte=timezone.now()
+        ).values('performance__show_id').annotate(
+            min_price=Min('price'),
+            max_price=Max('price')
+        )
+    }
+
+    data = []
+    for show in shows:
+        min_price, max_price = price_ranges.get(show.id, (0, 0))
+        service_fee = show.service_fee_per_ticket
+        data.append({
+            'id': show.id,
+            'name': show.name,
+            'slug': show.slug,
+            'category': show.category,
+            'duration_minutes': show.duration_minutes,
+            'description': show.description,
+            'poster': _file_url(show.poster, request),
+            'venue_name': show.venue.name,
+            'min_price': min_price,
+            'max_price': max_price,
+            'service_fee_per_ticket': f'{service_fee.quantize(Decimal(1)):f}' if service_fee is not None else None,
+            'trailer_url': show.trailer_url,
+            'description_markdown': show.description_markdown,
+        })
+    return data
+
+
 class PerformancePriceSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='price_category.name', read_only=True)
     category_code = serializers.CharField(source='price_category.code', read_only=True)
@@ -1,19 +1,84 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.core.cache import cache
-from .models import Show, Performance
+from core.versioning import bump_version
+from .models import Show, Performance, PerformancePrice, Poster
 from logzero import logger
 
 
-@receiver(post_save, sender=Show)
+def bump_shows_version():
+    """New generation for show/performance responses and their caches"""
+    transaction.on_commit(lambda: bump_version('shows'))
+
+
+def schedule_seat_map_snapshots(performance_ids):
+    """Rebuild the static seat map snapshots of on-sale performances"""
+    from bookings.seat_map_snapshot import schedule_seat_map_snapshot
+
+    def schedule():
+        for performance_id in performance_ids:
+            schedule_seat_map_snapshot(performance_id)
+
+    if performance_ids:
+        transaction.on_commit(schedule)
+
+
+def schedule_inventory_syncs(performance_ids):
+    """Materialize the available seat rows of on-sale performances"""
+    from bookings.inventory import schedule_inventory_sync
+
+    def schedule():
+        for performance_id in performance_ids:
+            schedule_inventory_sync(performance_id)
+
+    if performance_ids:
+        transaction.on_commit(schedule)
+
+
+@receiver([post_save, post_delete], sender=Show)
 def clear_show_cache(sender, instance, **kwargs):
     logger.info(f"Delete cache for show ID: {instance.id}")
-    cache.delete('shows_list')
-    cache.delete(f'show_detail_{instance.id}')
+    bump_shows_version()
+    if kwargs.get('signal') is post_save:
+        from bookings.seat_status import forget_performance_venues
+        # The venue may have changed, other processes re-read it after a minute
+        forget_performance_venues(instance.performances.values_list('id', flat=True))
+        performance_ids = list(instance.performances.filter(status='on_sale').values_list('id', flat=True))
+        schedule_seat_map_snapshots(performance_ids)
+        schedule_inventory_syncs(performance_ids)
 
 
-@receiver(post_save, sender=Performance)
+@receiver([post_save, post_delete], sender=Performance)
 def clear_performance_related_cache(sender, instance, **kwargs):
     logger.info(f"Delete cache Performance ID: {instance.id}")
-    if instance.show:
-        clear_show_cache(sender=Show, instance=instance.show)
+    bump_shows_version()
+    if kwargs.get('signal') is post_save:
+        from bookings.seat_status import forget_performance_venues
+        from bookings.waiting_room import sync_queue_config
+        forget_performance_venues([instance.id])
+        transaction.on_commit(lambda: sync_queue_config(instance))
+        if instance.status == 'on_sale':
+            schedule_seat_map_snapshots([instance.id])
+            schedule_inventory_syncs([instance.id])
+
+
+@receiver([post_save, post_delete], sender=PerformancePrice)
+def clear_performance_price_cache(sender, instance, **kwargs):
+    from bookings.pricing import bump_price_version
+    logger.info(f"Delete cache for prices of performance ID: {instance.performance_id}")
+    performance_id = instance.performance_id
+    transaction.on_commit(lambda: bump_price_version(performance_id))
+    bump_shows_version()
+    performance_ids = list(
+        Performance.objects.filter(
+            id=instance.performance_id, status='on_sale'
+        ).values_list('id', flat=True)
+    )
+    schedule_seat_map_snapshots(performance_ids)
+    schedule_inventory_syncs(performance_ids)
+
+
+@receiver([post_save, post_delete], sender=Poster)
+def clear_poster_cache(sender, instance, **kwargs):
+    logger.info(f"Delete cache for poster ID: {instance.id}")
+    transaction.on_commit(lambda: bump_version('posters'))
@@ -1,15 +1,21 @@
-from django.db.models import Q, Count, Prefetch
+from django.db.models import Prefetch
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
 from django.core.cache import cache
+from django.http import Http404
+from rest_framework.settings import api_settings
+from core.conditional import make_etag, etag_matches, not_modified, set_etag
+from core.renderers import COLUMNAR_RENDERER_CLASSES, render_json
+from core.versioning import get_version
 from .models import Show, Performance, Poster, PerformancePrice
 from .serializers import (
     ShowListSerializer,
     ShowDetailSerializer,
     PerformanceSerializer,
-    PosterSerializer
+    PosterSerializer,
+    show_list_data,
 )
 
 from venues.models import Section, Row
@@ -70,25 +76,41 @@ class ShowViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset
 
     def list(self, request, *args, **kwargs):
-        cache_key = 'shows_list'
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return Response(cached_data)
-
-        response = super().list(request, *args, **kwargs)
-        cache.set(cache_key, response.data, 3600)  # Cache 1 giờ
-        return response
+        generation = get_version('shows')
+        etag = make_etag('shows', generation)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        # Rendered bytes are cached and passed through the renderer as is
+        cache_key = f'shows_list:{generation}:{request.GET.urlencode()}'
+        content = cache.get(cache_key)
+        if content is None:
+            queryset = self.filter_queryset(self.get_queryset().select_related('venue'))
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                data = self.get_paginated_response(show_list_data(page, request)).data
+            else:
+                data = show_list_data(queryset, request)
+            content = render_json(data)
+            cache.set(cache_key, content, 3600)  # Cache 1 giờ
+
+        return set_etag(Response(content), etag)
 
     def retrieve(self, request, *args, **kwargs):
         show_id = kwargs.get('pk')
-        cache_key = f'show_detail_{show_id}'
+        generation = get_version('shows')
+        etag = make_etag('show', generation)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        cache_key = f'show_detail:{generation}:{show_id}'
         cached_data = cache.get(cache_key)
         if cached_data:
-            return Response(cached_data)
+            return set_etag(Response(cached_data), etag)
 
         response = super().retrieve(request, *args, **kwargs)
         cache.set(cache_key, response.data, 3600)  # Cache 1 giờ
-        return response
+        return set_etag(response, etag)
 
     @action(detail=True, methods=['get'])
     def performances(self, request, pk=None):
@@ -113,7 +135,7 @@ class PerformanceViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = PerformanceSerializer
 
     def get_queryset(self):
-        """✅ Optimized queryset with prefetch"""
+        """✅ Optimized queryset with prefetch, seat availability comes from the status bitmap"""
         return Performance.objects.select_related(
             'show',
             'show__venue'
@@ -122,20 +144,46 @@ class PerformanceViewSet(viewsets.ReadOnlyModelViewSet):
                 'prices',
                 queryset=PerformancePrice.objects.select_related('price_category')
             )
-        ).annotate(
-            available_seats=Count('show__venue__sections__rows__seats') - Count(
-                'seat_reservations',
-                filter=Q(seat_reservations__status__in=['reserved', 'sold'])
-            )
         )
 
-    @action(detail=True, methods=['get'])
+    def list(self, request, *args, **kwargs):
+        # Available seat counts of all performances, validated by the global status version
+        from bookings.seat_status import get_status_version
+        etag = make_etag('performances', get_version('shows'), get_status_version())
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        response = super().list(request, *args, **kwargs)
+        return set_etag(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        from bookings.seat_status import get_status_version
+        etag = make_etag('performance', get_version('shows'), get_status_version(kwargs.get('pk')))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        response = super().retrieve(request, *args, **kwargs)
+        return set_etag(response, etag)
+
+    @action(
+        detail=True,
+        methods=['get'],
+        renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + COLUMNAR_RENDERER_CLASSES
+    )
     def seat_map(self, request, pk=None):
         """Get seat map for a performance"""
-        from bookings.views import get_performance_seat_map
-        performance = self.get_object()
-        seat_map_data = get_performance_seat_map(performance)
-        return Response(seat_map_data)
+        from bookings.views import render_performance_seat_map, get_seat_map_etag, queue_admission_required
+        if not pk.isdigit():
+            raise Http404
+        denied = queue_admission_required(request, int(pk))
+        if denied:
+            return denied
+
+        etag = get_seat_map_etag(int(pk), request.accepted_renderer.format)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        return set_etag(Response(render_performance_seat_map(request, int(pk), etag)), etag)
 
 
 class PosterViewSet(viewsets.ReadOnlyModelViewSet):
@@ -143,14 +191,19 @@ class PosterViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = PosterSerializer
 
     def list(self, request, *args, **kwargs):
-        cache_key = 'posters_list'
+        generation = get_version('posters')
+        etag = make_etag('posters', generation)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        cache_key = f'posters_list:{generation}'
         cached_data = cache.get(cache_key)
         if cached_data:
-            return Response(cached_data)
+            return set_etag(Response(cached_data), etag)
 
         response = super().list(request, *args, **kwargs)
         cache.set(cache_key, response.data, 3600 * 6)
-        return response
+        return set_etag(response, etag)
 
     def get_queryset(self):
         return Poster.objects.filter(
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from logzero import logger
+from core.versioning import bump_version
+from .models import Venue, Section, Row, Seat, PriceCategory
+
+
+def _bump_layout_versions(venue_id):
+    from bookings.inventory import schedule_inventory_sync
+    from bookings.seat_map import bump_layout_version
+    from shows.models import Performance
+    bump_layout_version(venue_id)
+    # Show details embed the venue sections and rows
+    bump_version('shows')
+    # Added seats need inventory rows, broken ones lose theirs
+    for performance_id in Performance.objects.filter(
+        show__venue_id=venue_id,
+        status='on_sale'
+    ).values_list('id', flat=True):
+        schedule_inventory_sync(performance_id)
+
+
+def _bump_layout_on_commit(venue_id):
+    if venue_id:
+        transaction.on_commit(lambda: _bump_layout_versions(venue_id))
+
+
+@receiver([post_save, post_delete], sender=Venue)
+def venue_layout_changed(sender, instance, **kwargs):
+    _bump_layout_on_commit(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Section)
+def section_layout_changed(sender, instance, **kwargs):
+    _bump_layout_on_commit(instance.venue_id)
+
+
+@receiver([post_save, post_delete], sender=Row)
+def row_layout_changed(sender, instance, **kwargs):
+    _bump_layout_on_commit(
+        Section.objects.filter(id=instance.section_id).values_list('venue_id', flat=True).first()
+    )
+
+
+@receiver([post_save, post_delete], sender=Seat)
+def seat_layout_changed(sender, instance, **kwargs):
+    _bump_layout_on_commit(
+        Row.objects.filter(id=instance.row_id).values_list('section__venue_id', flat=True).first()
+    )
+
+
+@receiver([post_save, post_delete], sender=PriceCategory)
+def price_category_changed(sender, instance, **kwargs):
+    # Price categories are global, every venue geometry embeds them
+    logger.info(f"Price category {instance.code} changed, bump all venue layouts")
+    for venue_id in Venue.objects.values_list('id', flat=True):
+        _bump_layout_on_commit(venue_id)
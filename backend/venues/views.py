@@ -41,7 +41,14 @@ class PerformanceViewSet(viewsets.ReadOnlyModelViewSet):
         return Performance.objects.annotate(
             available_seats=Count('show__venue__sections__rows__seats') - Count(
                 'seat_reservations',
-                filter=Q(seat_reservations__status__in=['reserved', 'sold'])
+                # Expired holds without a booking are available again
+                filter=Q(seat_reservations__status='sold') | Q(
+                    seat_reservations__status='reserved',
+                    seat_reservations__expires_at__gte=timezone.now()
+                ) | Q(
+                    seat_reservations__status='reserved',
+                    seat_reservations__booking__isnull=False
+                )
             )
         )
 
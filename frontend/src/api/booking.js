@@ -1,4 +1,24 @@
 import api from './index'
+import { rehydrateSeatMap, applyStatusOverlay } from '../utils/seatMapCodec'
+
+const idempotencyHeaders = (key) => (key ? { headers: { 'Idempotency-Key': key } } : {})
+
+export const newIdempotencyKey = () =>
+    window.crypto?.randomUUID?.() || `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+
+const TICKET_POLL_INTERVAL = 500
+const TICKET_POLL_TIMEOUT = 60000
+
+// Queued submissions answer 202 with a ticket, poll it until the booking is created
+const waitForBooking = async (response) => {
+    const deadline = Date.now() + TICKET_POLL_TIMEOUT
+    while (response.status === 202) {
+        if (Date.now() > deadline) throw new Error('BOOKING_TICKET_TIMEOUT')
+        await new Promise(resolve => setTimeout(resolve, TICKET_POLL_INTERVAL))
+        response = await api.get(`/bookings/tickets/${response.data.ticket}/`)
+    }
+    return response
+}
 
 export const bookingAPI = {
     // Get all shows
@@ -18,7 +38,49 @@ export const bookingAPI = {
 
     // Get seat map for performance
     getSeatMap(performanceId) {
-        return api.get(`/performances/${performanceId}/seat-map/`)
+        return api.get(`/performances/${performanceId}/seat-map/`, {
+            params: { format: 'columnar' }
+        }).then(response => ({ ...response, data: rehydrateSeatMap(response.data) }))
+    },
+
+    // Get seat map from the prebuilt static snapshot plus the status overlay,
+    // falling back to the regular endpoint while no snapshot is current
+    async getSeatMapFromSnapshot(performanceId) {
+        const overlay = await api.get(`/performances/${performanceId}/seat-map/status/`)
+        const { snapshot_url, layout_version } = overlay.data
+        if (snapshot_url) {
+            const snapshotResponse = await fetch(snapshot_url)
+            if (snapshotResponse.ok) {
+                const snapshot = await snapshotResponse.json()
+                if (snapshot.layout_version === layout_version) {
+                    return { data: applyStatusOverlay(snapshot, overlay.data) }
+                }
+            }
+        }
+        return this.getSeatMap(performanceId)
+    },
+
+    // Get seat status changes since a seat map version
+    getSeatMapChanges(performanceId, since) {
+        return api.get(`/performances/${performanceId}/seat-map/changes/`, {
+            params: { since }
+        })
+    },
+
+    // WebSocket / SSE url pushing seat status events of a performance
+    getSeatEventsUrl(performanceId) {
+        const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws'
+        return `${protocol}://${window.location.host}/ws/performances/${performanceId}/seats/`
+    },
+
+    // Waiting room: join the queue of a performance (keeps the place of a valid token)
+    joinQueue(performanceId) {
+        return api.post(`/performances/${performanceId}/queue/`, {})
+    },
+
+    // Waiting room: position / admission state
+    getQueueStatus(performanceId) {
+        return api.get(`/performances/${performanceId}/queue/`)
     },
 
     // Reserve seats
@@ -30,6 +92,16 @@ export const bookingAPI = {
         })
     },
 
+    // Reserve the best block of adjacent seats, optionally in one price category
+    reserveBestAvailable(performanceId, count, sessionId, priceCategory = '') {
+        return api.post('/seats/best-available/', {
+            performance_id: performanceId,
+            count,
+            price_category: priceCategory,
+            session_id: sessionId
+        })
+    },
+
     // Release seats
     releaseSeats(seatIds, sessionId) {
         return api.post('/seats/release/', {
@@ -38,9 +110,9 @@ export const bookingAPI = {
         })
     },
 
-    // Create booking
-    createBooking(data) {
-        return api.post('/bookings/', data)
+    // Create booking, retries of the same attempt reuse `idempotencyKey`
+    createBooking(data, idempotencyKey = null) {
+        return api.post('/bookings/', data, idempotencyHeaders(idempotencyKey)).then(waitForBooking)
     },
 
     // Get booking detail
@@ -57,11 +129,11 @@ export const bookingAPI = {
         })
     },
 
-    // Create payment
-    createPayment(bookingCode, paymentMethod) {
+    // Create payment, retries of the same attempt reuse `idempotencyKey`
+    createPayment(bookingCode, paymentMethod, idempotencyKey = null) {
         return api.post(`/bookings/${bookingCode}/payment/`, {
             payment_method: paymentMethod
-        })
+        }, idempotencyHeaders(idempotencyKey))
     },
 
     // Check payment status
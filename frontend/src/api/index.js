@@ -15,6 +15,12 @@ const api = axios.create({
 // Request interceptor
 api.interceptors.request.use(
     config => {
+        // Waiting room admission for queued on-sales
+        const queueToken = sessionStorage.getItem('queue_token')
+        if (queueToken) {
+            config.headers['X-Queue-Token'] = queueToken
+        }
+
         // Add session ID for seat reservation
         const sessionId = sessionStorage.getItem('session_id')
         if (sessionId) {
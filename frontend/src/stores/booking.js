@@ -1,6 +1,6 @@
 import { ref, computed } from 'vue'
 import { defineStore } from 'pinia'
-import { bookingAPI } from '@/api/booking'
+import { bookingAPI, newIdempotencyKey } from '@/api/booking'
 import { useToast } from 'vue-toastification'
 
 export const useBookingStore = defineStore('booking', () => {
@@ -37,6 +37,9 @@ export const useBookingStore = defineStore('booking', () => {
     const bookingCode = ref(null)
     const currentTransaction = ref(null)
     const loading = ref(false)
+    // Kept until the server answers, so a retry after a timeout is not run twice
+    let bookingRequestKey = null
+    let paymentRequestKey = null
 
     // Discount related state - Simplified
     const discountMessage = ref('');
@@ -134,7 +137,9 @@ export const useBookingStore = defineStore('booking', () => {
                 ...customerInfo.value
             }
 
-            const response = await bookingAPI.createBooking(bookingData)
+            bookingRequestKey = bookingRequestKey || newIdempotencyKey()
+            const response = await bookingAPI.createBooking(bookingData, bookingRequestKey)
+            bookingRequestKey = null
 
             if (!response.data.seat_reservations?.length) {
                 throw new Error('NO_SEATS_IN_BOOKING')
@@ -151,6 +156,7 @@ export const useBookingStore = defineStore('booking', () => {
 
             return response.data
         } catch (error) {
+            if (error.response) bookingRequestKey = null
             clearBooking()
             let errorMessage = 'Có lỗi xảy ra khi tạo đơn hàng.'
             if (error.response?.data?.error) {
@@ -168,7 +174,9 @@ export const useBookingStore = defineStore('booking', () => {
     const processPayment = async (paymentMethod) => {
         try {
             loading.value = true
-            const response = await bookingAPI.createPayment(bookingCode.value, paymentMethod)
+            paymentRequestKey = paymentRequestKey || newIdempotencyKey()
+            const response = await bookingAPI.createPayment(bookingCode.value, paymentMethod, paymentRequestKey)
+            paymentRequestKey = null
             currentTransaction.value = response.data.transaction_id
 
             // ** CRITICAL FIX **
@@ -181,6 +189,7 @@ export const useBookingStore = defineStore('booking', () => {
 
             return response.data
         } catch (error) {
+            if (error.response) paymentRequestKey = null
             console.error('Failed to process payment:', error)
             throw error
         } finally {
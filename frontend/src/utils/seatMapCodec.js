@@ -0,0 +1,70 @@
+// Rehydrate the columnar seat map (`?format=columnar`) into the regular
+// shape: one object per seat, as returned by the default seat map format.
+export const rehydrateSeatMap = (data) => {
+    if (!data || data.format !== 'columnar') return data
+
+    const { sections, rows, categories, statuses } = data.lookups
+    const columns = data.seats
+    const images = data.seat_images || {}
+    const seats = new Array(columns.id.length)
+
+    for (let i = 0; i < seats.length; i++) {
+        const row = rows[columns.row[i]]
+        const section = sections[row.section]
+        const category = categories[columns.category[i]]
+        const parity = columns.parity[i]
+        const displayNumber = columns.display_number[i] ?? columns.number[i]
+
+        seats[i] = {
+            id: columns.id[i],
+            section_id: section.id,
+            section_name: section.name,
+            row: row.label,
+            row_position_y: row.position_y,
+            row_spacing_after: row.spacing_after,
+            number: columns.number[i],
+            display_number: displayNumber,
+            full_label: `${row.label}${displayNumber}`,
+            position_x: columns.position_x[i],
+            position_y: columns.position_y[i],
+            spacing_after: columns.spacing_after[i],
+            status: statuses[columns.status[i]],
+            price: category.price,
+            price_category: category.code,
+            price_category_color: category.color,
+            effective_price_category_name: category.name,
+            seat_image_url: images[i] ?? null,
+            is_accessible: columns.is_accessible[i] === 1,
+            numbering_style: row.numbering_style,
+            is_odd: parity === 1,
+            is_even: parity === 2,
+            side: parity === 1 ? 'left' : parity === 2 ? 'right' : 'center',
+        }
+    }
+
+    const { format, lookups, seat_images, ...rest } = data
+    return { ...rest, seats }
+}
+
+// Decode the base64 2-bit status bitmap of the seat map status overlay
+export const decodeStatusBitmap = (bitmap, seatCount) => {
+    const bytes = atob(bitmap)
+    const codes = new Array(seatCount)
+    for (let i = 0; i < seatCount; i++) {
+        codes[i] = (bytes.charCodeAt(i >> 2) >> (6 - ((i & 3) << 1))) & 3
+    }
+    return codes
+}
+
+// Merge a prebuilt seat map snapshot with its status overlay
+export const applyStatusOverlay = (snapshot, overlay) => {
+    const seats = {
+        ...snapshot.seats,
+        status: decodeStatusBitmap(overlay.status_bitmap, overlay.seat_count),
+    }
+    return rehydrateSeatMap({
+        ...snapshot,
+        seats,
+        status_version: overlay.status_version,
+    })
+}